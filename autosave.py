@@ -0,0 +1,248 @@
+"""
+Recovery drafts for the notes editor.
+
+While a unit has unsaved edits, NotesAutosave writes a draft of it to
+data/drafts/ every now and then; pressing "Save notes" (or deleting the
+unit) removes the draft again. Drafts still lying around on the next
+start belong to a session that ended without saving, and NotesPage
+offers to restore them.
+
+The cost stays bounded however big the note is:
+
+- A draft is the editor's snapshot() (see note_editor.py). For the
+  sharded notes store that is only the segments that changed, plus the
+  positions of the unchanged ones; other stores get the whole text.
+- Taking the snapshot is the only part that runs on the UI thread.
+  Encoding and writing happen on a background thread, which keeps only
+  the newest draft per unit if it falls behind.
+- Drafts are at least AUTOSAVE_INTERVAL_MS apart, and further apart
+  when snapshot and write are slow: autosave gets at most DUTY_CYCLE of
+  the time.
+
+Draft file, one per unit (name = sha1 of subject and unit):
+
+{
+    "version": 1,
+    "subject": "...",
+    "unit": "...",
+    "saved": unix time,
+    "base": ["<segment file>", ...],          # sharded store, or
+            "<sha1 of the unit body>",        # any other store
+    "items": [0, "changed text", 2, ...]      # or ["whole text"]
+}
+
+A draft is only restored while its base still matches the unit, so a
+stale draft never overwrites notes saved after it was taken.
+"""
+
+import os
+import json
+import time
+import atexit
+import hashlib
+import threading
+
+from PyQt5.QtCore import QObject, QTimer
+
+from data_manager import DATA_DIR
+from note_editor import segment_base, content_sha1
+
+DRAFTS_DIR = os.path.join(DATA_DIR, "drafts")
+
+AUTOSAVE_INTERVAL_MS = 5000
+DUTY_CYCLE = 0.05
+
+
+def _draft_path(subject, unit):
+    key = u"{0}\x1f{1}".format(subject, unit).encode("utf-8")
+    return os.path.join(DRAFTS_DIR, hashlib.sha1(key).hexdigest() + ".json")
+
+
+def write_draft(subject, unit, base, items):
+    os.makedirs(DRAFTS_DIR, exist_ok=True)
+    path = _draft_path(subject, unit)
+    tmp = path + ".tmp"
+    draft = {
+        "version": 1,
+        "subject": subject,
+        "unit": unit,
+        "saved": int(time.time()),
+        "base": base,
+        "items": items,
+    }
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(draft, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def discard_draft(subject, unit):
+    try:
+        os.remove(_draft_path(subject, unit))
+    except OSError:
+        pass
+
+
+def list_drafts():
+    """
+    Every readable draft, oldest first.
+    """
+    try:
+        names = os.listdir(DRAFTS_DIR)
+    except OSError:
+        return []
+    drafts = []
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(DRAFTS_DIR, name), "r", encoding="utf-8") as f:
+                draft = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if isinstance(draft, dict) and draft.get("version") == 1:
+            drafts.append(draft)
+    drafts.sort(key=lambda d: d.get("saved", 0))
+    return drafts
+
+
+def restore_draft(repo, draft):
+    """
+    Save a draft into its unit and remove it. Returns False if the unit
+    is gone or was saved since the draft was taken.
+    """
+    subject, unit = draft["subject"], draft["unit"]
+    if unit not in repo.units(subject):
+        return False
+    base, items = draft.get("base"), draft["items"]
+    if isinstance(base, list) and segment_base(repo, subject, unit) == base:
+        repo.save_unit_segments(subject, unit, items)
+    elif isinstance(base, str) and (
+        content_sha1(repo.unit_content(subject, unit)) == base
+    ):
+        repo.save_unit(subject, unit, items[0] if items else "")
+    else:
+        return False  # includes drafts without a base, which can't be checked
+    discard_draft(subject, unit)
+    return True
+
+
+class _DraftWriter(threading.Thread):
+    """
+    Writes drafts in the background; the newest request per unit wins.
+    """
+
+    def __init__(self):
+        super().__init__(name="note-drafts", daemon=True)
+        self._cond = threading.Condition()
+        self._pending = {}  # (subject, unit) -> (base, items) or None = discard
+        self._stopping = False
+        self.last_cost = 0.0  # seconds the last write took
+
+    def submit(self, subject, unit, draft):
+        with self._cond:
+            self._pending[(subject, unit)] = draft
+            self._cond.notify()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                key = next(iter(self._pending))
+                draft = self._pending.pop(key)
+            started = time.perf_counter()
+            try:
+                if draft is None:
+                    discard_draft(*key)
+                else:
+                    write_draft(key[0], key[1], *draft)
+            except OSError:
+                pass  # a missed draft is retried with the next edit
+            self.last_cost = time.perf_counter() - started
+
+    def stop(self):
+        """
+        Finish what is queued, then end the thread.
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self.join(5.0)
+
+
+_writer = None
+
+
+def _get_writer():
+    global _writer
+    if _writer is None:
+        _writer = _DraftWriter()
+        _writer.start()
+        atexit.register(_writer.stop)
+    return _writer
+
+
+class NotesAutosave(QObject):
+    """
+    Drafts for the unit shown by a ChunkedNoteLoader.
+    """
+
+    def __init__(self, loader, parent=None):
+        super().__init__(parent or loader)
+        self.loader = loader
+        self.writer = _get_writer()
+        self.subject = None
+        self.unit = None
+        self.dirty = False
+        self._snapshot_cost = 0.0
+        self._next_allowed = 0.0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.write_now)
+        loader.edited.connect(self._on_edited)
+
+    def set_unit(self, subject, unit):
+        """
+        Call before the editor switches units; keeps the old unit's edits.
+        """
+        self.write_now()
+        self.subject = subject
+        self.unit = unit
+
+    def interval(self):
+        """
+        Seconds between drafts: at least AUTOSAVE_INTERVAL_MS, more when
+        a draft is expensive to take.
+        """
+        cost = self._snapshot_cost + self.writer.last_cost
+        return max(AUTOSAVE_INTERVAL_MS / 1000.0, cost / DUTY_CYCLE)
+
+    def _on_edited(self):
+        if self.unit is None:
+            return
+        self.dirty = True
+        if not self._timer.isActive():
+            wait = max(0.0, self._next_allowed - time.monotonic())
+            self._timer.start(int(max(wait, AUTOSAVE_INTERVAL_MS / 1000.0) * 1000))
+
+    def write_now(self):
+        self._timer.stop()
+        if not self.dirty or self.unit is None:
+            return
+        started = time.perf_counter()
+        base, items = self.loader.snapshot()
+        self._snapshot_cost = time.perf_counter() - started
+        self.writer.submit(self.subject, self.unit, (base, items))
+        self.dirty = False
+        self._next_allowed = time.monotonic() + self.interval()
+
+    def saved(self):
+        """
+        The unit was saved (or deleted): its draft is no longer needed.
+        """
+        self._timer.stop()
+        self.dirty = False
+        if self.unit is not None:
+            self.writer.submit(self.subject, self.unit, None)
@@ -0,0 +1,458 @@
+"""
+Startup benchmark.
+
+Builds a synthetic workspace of the requested size, starts MainWindow
+in a fresh interpreter on the offscreen Qt platform (so it runs on CI
+and over ssh), and records wall time and RSS for each startup phase:
+
+    import_qt            PyQt5 import
+    import_app           main / pages / themes / data_manager import
+    qapplication         QApplication()
+    ensure_all_defaults  }
+    load_handwriting_font} inside MainWindow.__init__
+    populate_theme_combo }
+    apply_theme          }
+    page:<key>           building one page (inside switch_to or prewarm)
+    window_init          the whole MainWindow.__init__
+    first_frame          show() until the first paintEvent
+    prewarm              first frame until every page is built
+
+Nested phases are also part of their parent (page:dashboard is part of
+window_init), so the phases don't add up to the total.
+
+    python bench_startup.py run --tasks 20000 --repeat 5 -o report.json
+    python bench_startup.py compare before.json after.json
+
+Every run is a new process, so caches and RSS start from zero each time.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SIZES = {
+    "tasks": 1000,
+    "cards": 1000,
+    "subjects": 20,
+    "units": 10,
+    "body_bytes": 2000,
+    "days": 365,
+    "links": 5,
+}
+
+
+# -------------------------------------------------------------------
+# Synthetic workspace
+# -------------------------------------------------------------------
+
+
+def _write(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+
+
+def make_workspace(path, sizes, prewarm=True):
+    """
+    Fill path with data files of the given sizes (see DEFAULT_SIZES)
+    and a logged-in user, so startup lands on the dashboard.
+    """
+    os.makedirs(path, exist_ok=True)
+    priorities = ("High", "Medium", "Low")
+
+    _write(os.path.join(path, "todos.json"), [
+        {
+            "text": "Task {0}".format(i),
+            "priority": priorities[i % 3],
+            "done": i % 4 == 0,
+        }
+        for i in range(sizes["tasks"])
+    ])
+    _write(os.path.join(path, "flashcards.json"), [
+        {
+            "front": "Question {0}".format(i),
+            "back": "Answer {0}".format(i),
+            "known": i % 5 == 0,
+        }
+        for i in range(sizes["cards"])
+    ])
+
+    line = "Lorem ipsum dolor sit amet, consectetur adipiscing elit.\n"
+    body = (line * (sizes["body_bytes"] // len(line) + 1))[: sizes["body_bytes"]]
+    _write(os.path.join(path, "notes.json"), {
+        "folders": {
+            "Subject {0}".format(s): {
+                "complete": s % 2 == 0,
+                "units": {
+                    "Unit {0}".format(u): {"content": body}
+                    for u in range(sizes["units"])
+                },
+            }
+            for s in range(sizes["subjects"])
+        }
+    })
+    _write(os.path.join(path, "resources.json"), {
+        "subjects": {
+            "Subject {0}".format(s): {
+                "units": {
+                    "Unit {0}".format(u): [
+                        "https://example.com/{0}/{1}/{2}".format(s, u, k)
+                        for k in range(sizes["links"])
+                    ]
+                    for u in range(sizes["units"])
+                }
+            }
+            for s in range(sizes["subjects"])
+        }
+    })
+
+    start = time.time()
+    schedule = {}
+    for d in range(sizes["days"]):
+        day = time.strftime("%Y-%m-%d", time.localtime(start + d * 86400))
+        schedule[day] = ["Study block {0}".format(d), "Review"]
+    _write(os.path.join(path, "schedule.json"), schedule)
+
+    _write(os.path.join(path, "users.json"), {"bench": "bench"})
+    _write(os.path.join(path, "settings.json"), {
+        "theme": "Pink",
+        "dark": False,
+        "last_user": "bench",
+        "font": "Avenir",
+        "save_delay_ms": 500,
+        "prewarm_pages": prewarm,
+    })
+
+
+# -------------------------------------------------------------------
+# Measurement (runs inside the child process)
+# -------------------------------------------------------------------
+
+
+def _rss_kb():
+    """
+    Current resident set size in KiB (peak RSS where /proc is missing).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, KiB elsewhere
+        return peak // 1024 if sys.platform == "darwin" else peak
+    except ImportError:
+        return None
+
+
+class _Recorder:
+    def __init__(self):
+        self.phases = {}
+        self.rss = {}
+
+    def add(self, name, started):
+        ms = (time.perf_counter() - started) * 1000.0
+        self.phases[name] = self.phases.get(name, 0.0) + ms
+        self.rss[name] = _rss_kb()
+
+    def wrap(self, owner, attr, name=None):
+        original = getattr(owner, attr)
+        recorder = self
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                label = name
+                if label is None:
+                    # get_page(self, key)
+                    label = "page:{0}".format(args[-1])
+                recorder.add(label, started)
+
+        setattr(owner, attr, timed)
+
+
+def _wait_for(app, done, timeout):
+    deadline = time.perf_counter() + timeout
+    while not done():
+        if time.perf_counter() > deadline:
+            return False
+        app.processEvents()
+        time.sleep(0.001)
+    return True
+
+
+def measure(timeout=60.0):
+    """
+    Start the app once and return {"phases": {...}, "rss_kb": {...}}.
+    Expects QT_QPA_PLATFORM and STUDY_HELPER_DATA_DIR to be set.
+    """
+    rec = _Recorder()
+    rss_start = _rss_kb()
+
+    started = time.perf_counter()
+    from PyQt5.QtWidgets import QApplication
+
+    rec.add("import_qt", started)
+
+    started = time.perf_counter()
+    sys.path.insert(0, BASE_DIR)
+    import main
+
+    rec.add("import_app", started)
+
+    started = time.perf_counter()
+    app = QApplication([sys.argv[0]])
+    rec.add("qapplication", started)
+
+    rec.wrap(main, "ensure_all_defaults", "ensure_all_defaults")
+    for attr in ("load_handwriting_font", "populate_theme_combo", "apply_theme"):
+        rec.wrap(main.MainWindow, attr, attr)
+    rec.wrap(main.MainWindow, "get_page")
+
+    started = time.perf_counter()
+    window = main.MainWindow()
+    rec.add("window_init", started)
+
+    started = time.perf_counter()
+    window.show()
+    painted = _wait_for(app, lambda: window.first_frame_ms is not None, timeout)
+    rec.add("first_frame", started)
+
+    started = time.perf_counter()
+    prewarmed = _wait_for(
+        app,
+        lambda: len(window.pages) == len(window.page_factories)
+        or not window.settings.get("prewarm_pages", True),
+        timeout,
+    )
+    rec.add("prewarm", started)
+
+    result = {
+        "phases": rec.phases,
+        "rss_kb": rec.rss,
+        "rss_start_kb": rss_start,
+        "first_frame_ms": window.first_frame_ms,
+        "painted": painted,
+        "prewarmed": prewarmed,
+    }
+    window.close()
+    return result
+
+
+# -------------------------------------------------------------------
+# Driver
+# -------------------------------------------------------------------
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _run_child(workspace, timeout):
+    env = dict(os.environ)
+    env["QT_QPA_PLATFORM"] = "offscreen"
+    env["STUDY_HELPER_DATA_DIR"] = workspace
+    env.pop("STUDY_HELPER_TIMING", None)
+
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "_child", str(timeout)],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall = (time.perf_counter() - started) * 1000.0
+    if proc.returncode != 0:
+        raise RuntimeError(
+            "benchmark run failed:\n{0}".format(proc.stderr.strip())
+        )
+    # The result is the last line; Qt may print warnings before it
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process_ms"] = wall
+    return result
+
+
+def _summarise(runs):
+    names = []
+    for run in runs:
+        for name in run["phases"]:
+            if name not in names:
+                names.append(name)
+    names.append("process")
+
+    summary = {}
+    for name in names:
+        if name == "process":
+            values = [run["process_ms"] for run in runs]
+        else:
+            values = [run["phases"].get(name, 0.0) for run in runs]
+        summary[name] = {
+            "min": round(min(values), 2),
+            "median": round(statistics.median(values), 2),
+            "max": round(max(values), 2),
+        }
+
+    peaks = []
+    for run in runs:
+        values = [v for v in run["rss_kb"].values() if v is not None]
+        if values:
+            peaks.append(max(values))
+    return summary, (int(statistics.median(peaks)) if peaks else None)
+
+
+def run_benchmark(sizes, repeat=3, prewarm=True, workspace=None, timeout=60.0):
+    """
+    Run the startup benchmark repeat times and return the report dict.
+    A fresh copy of the workspace is used for each run, so saves made
+    during one run never leak into the next.
+    """
+    template = tempfile.mkdtemp(prefix="study_helper_bench_")
+    try:
+        make_workspace(template, sizes, prewarm=prewarm)
+        runs = []
+        for _ in range(repeat):
+            work = workspace or tempfile.mkdtemp(prefix="study_helper_run_")
+            shutil.copytree(template, work, dirs_exist_ok=True)
+            try:
+                runs.append(_run_child(work, timeout))
+            finally:
+                if workspace is None:
+                    shutil.rmtree(work, ignore_errors=True)
+    finally:
+        shutil.rmtree(template, ignore_errors=True)
+
+    summary, rss_kb = _summarise(runs)
+    return {
+        "commit": _git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sizes": sizes,
+        "prewarm": prewarm,
+        "repeat": repeat,
+        "summary_ms": summary,
+        "rss_kb_median": rss_kb,
+        "runs": runs,
+    }
+
+
+def compare(before, after, threshold=10.0, min_ms=5.0):
+    """
+    Print median phase times of two reports side by side. Returns the
+    phases that got slower by more than threshold percent (and min_ms).
+    """
+    slower = []
+    names = list(before["summary_ms"])
+    names += [n for n in after["summary_ms"] if n not in names]
+    print("{0:<24} {1:>10} {2:>10} {3:>8}".format(
+        "phase", before.get("commit") or "before", after.get("commit") or "after", "change"
+    ))
+    for name in names:
+        a = before["summary_ms"].get(name, {}).get("median")
+        b = after["summary_ms"].get(name, {}).get("median")
+        if a is None or b is None:
+            print("{0:<24} {1:>10} {2:>10}".format(name, a or "-", b or "-"))
+            continue
+        change = (b - a) / a * 100.0 if a else 0.0
+        flag = ""
+        if change > threshold and b - a > min_ms:
+            slower.append(name)
+            flag = "  slower"
+        print("{0:<24} {1:>10.1f} {2:>10.1f} {3:>+7.1f}%{4}".format(
+            name, a, b, change, flag
+        ))
+    rss_a, rss_b = before.get("rss_kb_median"), after.get("rss_kb_median")
+    if rss_a and rss_b:
+        print("{0:<24} {1:>10} {2:>10} {3:>+7.1f}%".format(
+            "rss_kb", rss_a, rss_b, (rss_b - rss_a) / rss_a * 100.0
+        ))
+    return slower
+
+
+def main(argv):
+    if len(argv) >= 2 and argv[1] == "_child":
+        timeout = float(argv[2]) if len(argv) > 2 else 60.0
+        print(json.dumps(measure(timeout)))
+        return 0
+
+    parser = argparse.ArgumentParser(prog="python bench_startup.py")
+    sub = parser.add_subparsers(dest="command")
+
+    run = sub.add_parser("run", help="measure startup")
+    for key, value in DEFAULT_SIZES.items():
+        run.add_argument("--" + key.replace("_", "-"), type=int, default=value)
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--no-prewarm", action="store_true")
+    run.add_argument("--timeout", type=float, default=60.0)
+    run.add_argument("--workspace", help="run in (and keep) this data folder")
+    run.add_argument("-o", "--output", help="write the JSON report here")
+
+    cmp_ = sub.add_parser("compare", help="compare two reports")
+    cmp_.add_argument("before")
+    cmp_.add_argument("after")
+    cmp_.add_argument("--threshold", type=float, default=10.0,
+                      help="percent slowdown that counts as a regression")
+
+    args = parser.parse_args(argv[1:])
+
+    if args.command == "compare":
+        with open(args.before, encoding="utf-8") as f:
+            before = json.load(f)
+        with open(args.after, encoding="utf-8") as f:
+            after = json.load(f)
+        return 1 if compare(before, after, args.threshold) else 0
+
+    if args.command != "run":
+        parser.print_help()
+        return 2
+
+    sizes = {key: getattr(args, key) for key in DEFAULT_SIZES}
+    try:
+        report = run_benchmark(
+            sizes,
+            repeat=max(1, args.repeat),
+            prewarm=not args.no_prewarm,
+            workspace=args.workspace,
+            timeout=args.timeout,
+        )
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    text = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        for name, s in report["summary_ms"].items():
+            print("{0:<24} {1:>10.1f} ms".format(name, s["median"]))
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,166 @@
+"""
+Drift and wakeup benchmark for the focus timer.
+
+Plays one focus session through a simulated event loop, for the old
+Timer page (a repeating 1 s QTimer that took a second off every timeout)
+and for the deadline-based one (focus_timer.Countdown with single-shot
+coarse timers). The loop can stall, coarse timers fire up to 5% off, and
+the machine can be suspended for a while, during which Qt's timers (on
+the monotonic clock) stand still but real time doesn't. While the page
+is hidden the new timer arms precise timeouts, at most 30 s apart, for
+the end of the session. Runs without Qt:
+
+    python bench_timer.py --minutes 50 --stalls 10 --stall-seconds 3 \\
+        --suspend 120 --hidden 0.5
+
+For each model it prints how late the countdown ended compared to the
+real end of the session, the worst gap between the display and the true
+time left, and the number of wakeups (while shown and while hidden).
+"""
+
+import sys
+import random
+import argparse
+
+from focus_timer import Countdown
+
+COARSE = 0.05
+
+
+class SimLoop:
+    """
+    Virtual time. now is real (boot) time; mono is what Qt's timers run
+    on and stops while suspended. Stalls delay any timeout that falls
+    inside them to the end of the stall.
+    """
+
+    def __init__(self, stalls, suspend_at, suspend_seconds):
+        self.now = 0.0
+        self.stalls = stalls  # [(mono start, seconds)]
+        self.suspend_at = suspend_at
+        self.suspend_seconds = suspend_seconds
+        self.suspended = False
+
+    @property
+    def mono(self):
+        return self.now - (self.suspend_seconds if self.suspended else 0.0)
+
+    def fire_time(self, due):
+        """
+        Mono time a timeout due at mono time `due` is delivered.
+        """
+        for start, length in self.stalls:
+            if start <= due < start + length:
+                return start + length
+        return due
+
+    def advance_to(self, mono):
+        if not self.suspended and self.suspend_at is not None:
+            if mono >= self.suspend_at:
+                self.suspended = True  # asleep: real time jumps ahead
+        self.now = mono + (self.suspend_seconds if self.suspended else 0.0)
+
+    def clock(self):
+        return self.now
+
+
+def run_old(loop, seconds, hidden):
+    """
+    The former TimerPage.tick: time_left -= 1 per timeout, always 1 s.
+    """
+    left = seconds
+    due = 1.0
+    wakeups = {"shown": 0, "hidden": 0}
+    worst = 0.0
+    while True:
+        fired = loop.fire_time(due)
+        loop.advance_to(fired)
+        wakeups["hidden" if hidden(loop.now) else "shown"] += 1
+        if left <= 0:
+            return loop.now - seconds, worst, wakeups
+        left -= 1
+        worst = max(worst, abs(left - max(0.0, seconds - loop.now)))
+        due += 1.0
+        if due < fired:
+            due = fired + 1.0  # Qt drops the timeouts missed in a stall
+
+
+def run_new(loop, seconds, hidden, rnd):
+    countdown = Countdown(seconds, clock=loop.clock)
+    countdown.start()
+    wakeups = {"shown": 0, "hidden": 0}
+    worst = 0.0
+    mono = loop.mono
+    while True:
+        is_hidden = hidden(loop.now)
+        if is_hidden:
+            interval = countdown.deadline_ms() / 1000.0  # precise timer
+        else:
+            interval = countdown.next_wakeup_ms() / 1000.0
+            interval *= rnd.uniform(1 - COARSE, 1 + COARSE)
+        fired = loop.fire_time(mono + interval)
+        loop.advance_to(fired)
+        mono = fired
+        wakeups["hidden" if hidden(loop.now) else "shown"] += 1
+        if countdown.finished():
+            return loop.now - seconds, worst, wakeups
+        if not hidden(loop.now):
+            shown = countdown.display_seconds()
+            worst = max(worst, abs(shown - max(0.0, seconds - loop.now)))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python bench_timer.py")
+    parser.add_argument("--minutes", type=int, default=50)
+    parser.add_argument("--stalls", type=int, default=10)
+    parser.add_argument("--stall-seconds", type=float, default=3.0)
+    parser.add_argument("--suspend", type=float, default=120.0, help="seconds")
+    parser.add_argument(
+        "--hidden", type=float, default=0.5, help="fraction of the session hidden"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv[1:])
+
+    seconds = args.minutes * 60
+    rnd = random.Random(args.seed)
+    stalls = sorted(
+        (rnd.uniform(0, seconds), args.stall_seconds) for _ in range(args.stalls)
+    )
+    suspend_at = seconds * 0.4 if args.suspend else None
+    hidden_from = seconds * (1 - args.hidden)
+
+    def hidden(now):
+        return now >= hidden_from
+
+    print(
+        "{0} min session, {1} stalls of {2:g} s, suspended {3:g} s, "
+        "hidden for the last {4:.0%}".format(
+            args.minutes, args.stalls, args.stall_seconds, args.suspend, args.hidden
+        )
+    )
+    results = (
+        (
+            "tick per timeout",
+            run_old(SimLoop(stalls, suspend_at, args.suspend), seconds, hidden),
+        ),
+        (
+            "monotonic deadline",
+            run_new(SimLoop(stalls, suspend_at, args.suspend), seconds, hidden, rnd),
+        ),
+    )
+    print(
+        "  {0:<20} {1:>10} {2:>12} {3:>8} {4:>8}".format(
+            "", "ends late", "worst error", "shown", "hidden"
+        )
+    )
+    for name, (late, worst, wakeups) in results:
+        print(
+            "  {0:<20} {1:>8.2f} s {2:>10.2f} s {3:>8} {4:>8}".format(
+                name, late, worst, wakeups["shown"], wakeups["hidden"]
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,139 @@
+"""
+Microbenchmark for the To-Do filter and edits.
+
+Compares what the To-Do page used to do on every filter change or task
+edit (rescan every task and rebuild both lists) with what the bucketed
+index does (pick a bucket, diff it against the rows on screen). Runs
+without Qt, on an in-memory task list, so only the bookkeeping is timed:
+
+    python bench_todos.py --tasks 20000 --repeat 50
+"""
+
+import sys
+import time
+import random
+import argparse
+import statistics
+
+from repositories import new_record_id
+from task_index import TaskIndex, diff_rows, PRIORITIES, MAX_DIFF_OPS
+
+FILTERS = ("All",) + PRIORITIES
+
+
+class _MemoryRepo:
+    """
+    Same API as the list repositories, without any disk I/O.
+    """
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+
+    def all(self):
+        return self.tasks
+
+    def add(self, record):
+        rec = dict(record, id=new_record_id())
+        self.tasks.append(rec)
+        return rec
+
+    def update(self, record, **fields):
+        record.update(fields)
+        return True
+
+    def delete(self, record):
+        self.tasks.remove(record)
+
+
+def make_tasks(n, seed=1):
+    rnd = random.Random(seed)
+    return [
+        {
+            "id": "t{0}".format(i),
+            "text": "Task {0}".format(i),
+            "priority": rnd.choice(PRIORITIES),
+            "done": rnd.random() < 0.3,
+        }
+        for i in range(n)
+    ]
+
+
+def old_refresh(tasks, filt):
+    """
+    The former TodoPage.refresh: one label per visible task, every time.
+    """
+    pending, done = [], []
+    for item in tasks:
+        if filt != "All" and item.get("priority") != filt:
+            continue
+        label = u"[{0}] {1}".format(item.get("priority", "Low"), item.get("text", ""))
+        (done if item.get("done") else pending).append(label)
+    return pending, done
+
+
+def new_switch(index, shown, filt):
+    """
+    Filter switch on the index: bucket lookup plus a row diff per list
+    (or a reset, as TodoBucketModel does when the diff is too big).
+    """
+    priority = None if filt == "All" else filt
+    for done in (False, True):
+        rows = index.bucket(done, priority)
+        ops = diff_rows(shown[done], rows, MAX_DIFF_OPS)
+        shown[done] = list(rows) if ops is None else rows
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return statistics.median(samples)
+
+
+def run(n, repeat):
+    tasks = make_tasks(n)
+    index = TaskIndex(_MemoryRepo(tasks))
+    shown = {False: index.bucket(False), True: index.bucket(True)}
+    cycle = iter(FILTERS * (repeat + 1))
+    ids = [t["id"] for t in tasks]
+    rnd = random.Random(2)
+
+    results = {}
+    results["filter switch, rescan"] = _time(
+        lambda: old_refresh(tasks, next(cycle)), repeat
+    )
+    results["filter switch, buckets"] = _time(
+        lambda: new_switch(index, shown, next(cycle)), repeat
+    )
+
+    def toggle_old():
+        task = tasks[rnd.randrange(len(tasks))]
+        task["done"] = not task["done"]
+        old_refresh(tasks, "All")
+
+    def toggle_new():
+        task_id = ids[rnd.randrange(len(ids))]
+        index.update(task_id, done=not index.get(task_id)["done"])
+
+    results["toggle one task, rescan"] = _time(toggle_old, repeat)
+    results["toggle one task, buckets"] = _time(toggle_new, repeat)
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python bench_todos.py")
+    parser.add_argument("--tasks", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv[1:])
+
+    results = run(args.tasks, max(1, args.repeat))
+    print("{0} tasks, median of {1} runs".format(args.tasks, args.repeat))
+    for name, ms in results.items():
+        print("  {0:<28} {1:>9.3f} ms".format(name, ms))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,261 @@
+"""
+Bulk flashcard import from CSV / TSV / Anki "Notes in plain text" exports.
+
+The file is streamed line by line: only the current batch of new cards
+is held in memory, plus an 8-byte digest per front for duplicate
+detection. That set only grows when a card is added, so it is bounded
+by the size of the resulting deck, not by the size of the file:
+duplicate and invalid rows cost nothing. Rows are
+
+    front <delimiter> back [<delimiter> anything else, ignored]
+
+The delimiter comes from Anki's "#separator:" header if present, from the
+file extension (.tsv / .txt → tab, .csv → comma) otherwise, and is sniffed
+from the first lines as a last resort. Anki's other "#key:value" header
+lines are skipped; with "#html:true" tags are stripped from both sides.
+A first row such as "front,back" is taken as a column header.
+
+A card is skipped if either side is empty or its front (case and
+whitespace folded) already exists in the deck or earlier in the file.
+New cards are added in batches through the repository, inside a
+data_manager.hold_writes() block for the deck and the stats counters:
+they are written once, when the import ends or is cancelled, instead of
+once per batch. Only those two stores are held back, so other pages keep
+saving normally while an import runs from the UI.
+
+import_steps() is a generator that yields after every batch, so the UI
+can run it from the event loop with a progress dialog. From a shell:
+
+    python card_import.py deck.csv [more files ...]
+"""
+
+import os
+import re
+import csv
+import sys
+import html
+import hashlib
+
+from data_manager import hold_writes
+from repositories import get_repository
+from stats import STATS_NAME
+
+BATCH_SIZE = 500
+MAX_FIELD_CHARS = 10000
+MAX_REPORTED_ERRORS = 20
+
+ANKI_SEPARATORS = {
+    "tab": "\t",
+    "comma": ",",
+    "semicolon": ";",
+    "pipe": "|",
+    "space": " ",
+    "colon": ":",
+}
+
+# A first row like "front,back" is a column header, not a card
+HEADER_FRONTS = ("front", "question", "term")
+HEADER_BACKS = ("back", "answer", "definition")
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_BR_RE = re.compile(r"<br\s*/?>|<div>|</div>", re.IGNORECASE)
+
+
+class ImportReport:
+    def __init__(self, total_bytes=0):
+        self.total_bytes = total_bytes
+        self.bytes_read = 0
+        self.rows = 0
+        self.added = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []  # (line number, reason), first MAX_REPORTED_ERRORS
+
+    @property
+    def progress(self):
+        if not self.total_bytes:
+            return 1.0
+        return min(1.0, self.bytes_read / float(self.total_bytes))
+
+    def reject(self, line, reason):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, reason))
+
+    def summary(self):
+        return u"{0} added, {1} duplicates, {2} invalid of {3} rows.".format(
+            self.added, self.duplicates, self.invalid, self.rows
+        )
+
+
+def _fingerprint(front):
+    key = " ".join(front.split()).casefold()
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+
+
+def _strip_html(text):
+    text = _BR_RE.sub("\n", text)
+    return html.unescape(_TAG_RE.sub("", text)).strip()
+
+
+def _default_delimiter(path, sample):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".tsv", ".txt"):
+        return "\t"
+    if ext == ".csv":
+        return ","
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+    except csv.Error:
+        return "\t"
+
+
+class _LineReader:
+    """
+    Yields decoded lines from a binary file and counts the bytes read,
+    which a text-mode file can't do while it is being iterated.
+    """
+
+    def __init__(self, f, report):
+        self.f = f
+        self.report = report
+        self.line_no = 0
+
+    def __iter__(self):
+        first = True
+        for raw in self.f:
+            self.report.bytes_read += len(raw)
+            self.line_no += 1
+            line = raw.decode("utf-8", errors="replace")
+            if first:
+                line = line.lstrip(u"\ufeff")
+                first = False
+            yield line
+
+
+def import_steps(path, repo=None, batch_size=BATCH_SIZE):
+    """
+    Import path into the flashcards deck. Yields the ImportReport after
+    every batch or batch_size lines (and once at the end); close() the
+    generator to cancel, which keeps (and saves) the batches already
+    added. Raises OSError if the file can't be read and ValueError if it
+    isn't valid CSV.
+    """
+    repo = repo or get_repository("flashcards")
+    report = ImportReport(os.path.getsize(path))
+
+    seen = set(_fingerprint(card.get("front", "")) for card in repo.all())
+    # the json backend's deck file; the others don't go through save_json
+    deck = getattr(repo, "fname", None)
+    held = [name for name in (deck, STATS_NAME) if name]
+
+    def add(batch):
+        report.added += len(repo.add_many(batch))
+
+    with hold_writes(*held), open(path, "rb") as f:
+        head = f.read(64 * 1024).decode("utf-8", errors="replace")
+        f.seek(0)
+
+        delimiter = None
+        use_html = False
+        header_lines = 0
+        for line in head.lstrip(u"\ufeff").splitlines():
+            if not line.startswith("#"):
+                break
+            header_lines += 1
+            key, _, value = line[1:].partition(":")
+            key, value = key.strip().lower(), value.strip().lower()
+            if key == "separator":
+                delimiter = ANKI_SEPARATORS.get(value, value[:1] or None)
+            elif key == "html":
+                use_html = value == "true"
+        if delimiter is None:
+            delimiter = _default_delimiter(path, head)
+
+        lines = _LineReader(f, report)
+        rows = csv.reader(lines, delimiter=delimiter)
+        batch = []
+        yielded_at = 0  # line number of the last yield
+        while True:
+            try:
+                row = next(rows)
+            except StopIteration:
+                break
+            except csv.Error as e:
+                raise ValueError(u"line {0}: {1}".format(lines.line_no, e))
+            if lines.line_no - yielded_at >= batch_size:
+                # also hand control back on runs of duplicates or bad rows
+                yielded_at = lines.line_no
+                yield report
+            if not row or lines.line_no <= header_lines:
+                continue  # blank line / Anki header
+            if (
+                report.rows == 0
+                and len(row) >= 2
+                and row[0].strip().lower() in HEADER_FRONTS
+                and row[1].strip().lower() in HEADER_BACKS
+            ):
+                continue
+            report.rows += 1
+            if len(row) < 2:
+                report.reject(lines.line_no, "needs a front and a back")
+                continue
+            front, back = row[0], row[1]
+            if use_html:
+                front, back = _strip_html(front), _strip_html(back)
+            front, back = front.strip(), back.strip()
+            if not front or not back:
+                report.reject(lines.line_no, "empty front or back")
+                continue
+            if len(front) > MAX_FIELD_CHARS or len(back) > MAX_FIELD_CHARS:
+                report.reject(lines.line_no, "field too long")
+                continue
+            key = _fingerprint(front)
+            if key in seen:
+                report.duplicates += 1
+                continue
+            seen.add(key)
+            batch.append({"front": front, "back": back, "known": False})
+
+            if len(batch) >= batch_size:
+                add(batch)
+                batch = []
+                yielded_at = lines.line_no
+                yield report
+
+        if batch:
+            add(batch)
+    report.bytes_read = report.total_bytes
+    yield report
+
+
+def import_file(path, repo=None, batch_size=BATCH_SIZE):
+    """
+    Run a whole import and return its ImportReport.
+    """
+    report = None
+    for report in import_steps(path, repo, batch_size):
+        pass
+    return report
+
+
+def main(argv):
+    if len(argv) < 2:
+        print("usage: python card_import.py <file.csv|file.tsv|file.txt> [...]")
+        return 2
+    status = 0
+    for path in argv[1:]:
+        try:
+            report = import_file(path)
+        except (OSError, ValueError, csv.Error) as e:
+            print(u"{0}: {1}".format(path, e))
+            status = 1
+            continue
+        print(u"{0}: {1}".format(path, report.summary()))
+        for line, reason in report.errors:
+            print(u"  line {0}: {1}".format(line, reason))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
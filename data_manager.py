@@ -1,10 +1,46 @@
 import os
+import sys
 import json
+import atexit
+import threading
+import contextlib
+
+try:
+    import orjson
+except ImportError:  # optional, only speeds things up
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional, needed only for the "msgpack" codec
+    msgpack = None
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+# STUDY_HELPER_DATA_DIR points the app at another workspace (used by
+# bench_startup.py); by default everything lives in data/ next to the code.
+DATA_DIR = os.environ.get("STUDY_HELPER_DATA_DIR") or os.path.join(BASE_DIR, "data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Parsed stores, keyed by file name:
+#   {"todos.json": ((mtime_ns, size, inode), data), ...}
+_cache = {}
+_cache_stats = {"hits": 0, "misses": 0}
+
+# Write-behind: save_json() only marks a store dirty and a timer writes
+# every dirty store once the window has passed. 0 = write immediately.
+# _dirty maps name -> (data, encoded bytes or None); see save_json().
+_write_delay = 0.0
+_dirty = {}
+_flush_timer = None
+_dirty_lock = threading.Lock()
+_write_lock = threading.Lock()
+# Held from taking stores off _dirty until they are on disk, so flush()
+# can't return while the timer thread is halfway through a write
+_flush_lock = threading.RLock()
+_in_flight = set()
+_deferred = 0  # > 0 inside deferred_writes()
+_held = {}  # name -> depth of hold_writes() blocks holding it
+
 
 def _file_path(name):
     """
@@ -13,13 +49,119 @@ def _file_path(name):
     return os.path.join(DATA_DIR, name)
 
 
+def _signature(path):
+    """
+    Cheap fingerprint of a file on disk. If any of these change,
+    the cached copy is considered stale and the file is parsed again.
+    """
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+# -------------------------------------------------------------------
+# CODECS
+# -------------------------------------------------------------------
+#
+# "pretty"  – indented JSON, today's format, nice for hand editing
+# "compact" – JSON without whitespace
+# "orjson"  – compact JSON written by orjson (falls back to "compact")
+# "msgpack" – binary MessagePack (needs the msgpack package)
+#
+# JSON files are recognised by their first byte ({ or [); msgpack files
+# start with MSGPACK_MARKER. Loading therefore never needs to know which
+# codec a store was configured with.
+
+CODECS = ("pretty", "compact", "orjson", "msgpack")
+DEFAULT_CODEC = "pretty"
+MSGPACK_MARKER = b"\x00study_helper:msgpack:1\n"
+
+
+def available_codecs():
+    names = ["pretty", "compact"]
+    if orjson is not None:
+        names.append("orjson")
+    if msgpack is not None:
+        names.append("msgpack")
+    return names
+
+
+def encode_store(data, codec=DEFAULT_CODEC):
+    """
+    Serialise data with the given codec and return bytes.
+    """
+    if codec == "msgpack" and msgpack is not None:
+        return MSGPACK_MARKER + msgpack.packb(data, use_bin_type=True)
+    if codec == "orjson" and orjson is not None:
+        return orjson.dumps(data)
+    if codec in ("compact", "orjson", "msgpack"):
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode(
+            "utf-8"
+        )
+    return json.dumps(data, indent=4, ensure_ascii=False).encode("utf-8")
+
+
+def decode_store(raw):
+    """
+    Parse bytes written by encode_store(), sniffing the format.
+    """
+    if raw.startswith(MSGPACK_MARKER):
+        if msgpack is None:
+            # Must not be mistaken for a corrupted file and overwritten
+            raise RuntimeError("This store is msgpack-encoded; install msgpack.")
+        return msgpack.unpackb(raw[len(MSGPACK_MARKER):], raw=False)
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode("utf-8"))
+
+
+def codec_for(name):
+    """
+    Codec configured for a store in storage.json (default "pretty").
+    """
+    if name == "storage.json":
+        return DEFAULT_CODEC  # always readable by hand
+    codecs = load_storage_config().get("codecs") or {}
+    return codecs.get(name, DEFAULT_CODEC)
+
+
+def cache_stats():
+    """
+    Return a copy of the cache counters: {"hits": int, "misses": int}.
+    """
+    return dict(_cache_stats)
+
+
+def clear_cache(name=None):
+    """
+    Drop one cached store (or all of them) and reset the counters
+    when everything is cleared.
+    """
+    if name is not None:
+        _cache.pop(name, None)
+        return
+    _cache.clear()
+    _cache_stats["hits"] = 0
+    _cache_stats["misses"] = 0
+
+
 def load_json(name, default):
     """
     Load JSON from data/<name>.
 
     - If file doesn't exist → create it with default and return default.
     - If file is corrupted → overwrite with default and return default.
+    - If the file is unchanged since the last load/save, the cached
+      object is returned without touching the file contents.
+
+    The returned object is shared between callers, so edit it and
+    pass it back to save_json() rather than keeping private copies.
     """
+    with _dirty_lock:
+        if name in _dirty:
+            # newer than what's on disk, waiting for the next flush
+            _cache_stats["hits"] += 1
+            return _dirty[name][0]
+
     path = _file_path(name)
 
     if not os.path.exists(path):
@@ -27,30 +169,224 @@ def load_json(name, default):
         return default
 
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        sig = _signature(path)
+    except OSError:
+        sig = None
+
+    cached = _cache.get(name)
+    if cached is not None and sig is not None and cached[0] == sig:
+        _cache_stats["hits"] += 1
+        return cached[1]
+
+    _cache_stats["misses"] += 1
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except OSError:
+        raw = b""
+    try:
+        data = decode_store(raw)
+    except RuntimeError:
+        raise
     except Exception:
         # corrupted / unreadable
         save_json(name, default)
         return default
 
+    if sig is not None:
+        _cache[name] = (sig, data)
+    return data
 
-def save_json(name, data):
+
+def _write_json(name, data, raw=None):
     """
-    Write JSON to data/<name> using a temp file swap so it's harder to corrupt.
+    Write data/<name> with its configured codec (or the bytes raw that
+    encode it), using a temp file swap so it's harder to corrupt.
     """
     path = _file_path(name)
     tmp = path + ".tmp"
+    if raw is None:
+        raw = encode_store(data, codec_for(name))
+
+    with _write_lock:
+        with open(tmp, "wb") as f:
+            f.write(raw)
+
+        try:
+            os.replace(tmp, path)
+        except Exception:
+            # fallback
+            with open(path, "wb") as f:
+                f.write(raw)
+
+        # What we just wrote is what a re-read would produce
+        try:
+            _cache[name] = (_signature(path), data)
+        except OSError:
+            _cache.pop(name, None)
+
+
+def save_json(name, data):
+    """
+    Persist data/<name>.
+
+    With write-behind off (the default) the file is written right away.
+    With write-behind on, the store is encoded here, on the caller's
+    thread, and only the bytes are left to the timer thread: the stores
+    are shared objects the UI keeps changing, and encoding them on
+    another thread could write a half-changed state. Saves arriving
+    within the window are coalesced into a single write, so write-behind
+    saves disk writes, not serialisation.
+
+    Inside deferred_writes() or hold_writes() nothing is written until
+    the block ends, on the thread that ends it, so encoding waits too.
+    """
+    if _deferred or name in _held:
+        _mark_dirty(name, data, None)
+    elif _write_delay <= 0:
+        _write_json(name, data)
+    else:
+        _mark_dirty(name, data, encode_store(data, codec_for(name)))
+
+
+def _mark_dirty(name, data, raw):
+    global _flush_timer
+
+    with _dirty_lock:
+        _dirty[name] = (data, raw)
+        if _flush_timer is None and raw is not None:
+            _flush_timer = threading.Timer(_write_delay, _flush_from_timer)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+
+
+def flush(include_held=False):
+    """
+    Write every dirty store now, except those inside a hold_writes()
+    block unless include_held. Safe to call at any time; it is hooked
+    to atexit (with include_held) and should also be called when the
+    main window closes.
+    """
+    global _flush_timer
+
+    with _flush_lock:
+        with _dirty_lock:
+            pending = _take_dirty(include_held)
+            if _flush_timer is not None:
+                _flush_timer.cancel()
+                _flush_timer = None
+        try:
+            for name, (data, raw) in pending.items():
+                _write_json(name, data, raw)
+        finally:
+            with _dirty_lock:
+                _in_flight.clear()
+
+
+def _take_dirty(include_held=False, encoded_only=False):
+    # caller holds _flush_lock and _dirty_lock
+    pending = {
+        name: entry
+        for name, entry in _dirty.items()
+        if (include_held or name not in _held)
+        and not (encoded_only and entry[1] is None)
+    }
+    for name in pending:
+        del _dirty[name]
+    _in_flight.update(pending)
+    return pending
+
+
+def is_pending(name):
+    """
+    True while a save of data/<name> is waiting for write-behind or
+    being written.
+    """
+    with _dirty_lock:
+        return name in _dirty or name in _in_flight
 
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
 
+def _flush_from_timer():
+    global _flush_timer
+
+    with _flush_lock:
+        with _dirty_lock:
+            if _deferred:
+                # deferred_writes() flushes everything when it ends
+                _flush_timer = None
+                return
+            # Never encode here: stores saved without their bytes
+            # belong to a block that writes them when it ends
+            pending = _take_dirty(encoded_only=True)
+            _flush_timer = None
+
+        try:
+            for name, (data, raw) in pending.items():
+                _write_json(name, data, raw)
+        finally:
+            with _dirty_lock:
+                _in_flight.clear()
+
+
+def set_write_behind(delay_ms):
+    """
+    Turn write-behind on with a coalescing window of delay_ms
+    milliseconds, or off with 0. Turning it off flushes pending saves.
+    """
+    global _write_delay
+    _write_delay = max(0.0, float(delay_ms) / 1000.0)
+    if _write_delay <= 0:
+        flush()
+
+
+@contextlib.contextmanager
+def deferred_writes():
+    """
+    Hold back every save_json() until the block ends, then write each
+    touched store once. Used by bulk imports; blocks may nest.
+    """
+    global _deferred
+    with _dirty_lock:
+        _deferred += 1
     try:
-        os.replace(tmp, path)
-    except Exception:
-        # fallback
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        yield
+    finally:
+        with _dirty_lock:
+            _deferred -= 1
+            outermost = _deferred == 0
+        if outermost:
+            flush()
+
+
+@contextlib.contextmanager
+def hold_writes(*names):
+    """
+    Keep the saves of the named stores in memory until the block ends,
+    then write each once. Other stores are saved as usual, so unlike
+    deferred_writes() the block may stay open across event-loop turns,
+    e.g. in a generator that yields to the UI; closing the generator
+    ends the block. Blocks may nest.
+    """
+    with _dirty_lock:
+        for name in names:
+            _held[name] = _held.get(name, 0) + 1
+    try:
+        yield
+    finally:
+        released = {}
+        with _dirty_lock:
+            for name in names:
+                _held[name] -= 1
+                if _held[name]:
+                    continue
+                del _held[name]
+                if name in _dirty:
+                    released[name] = _dirty.pop(name)[0]
+        for name, data in released.items():
+            save_json(name, data)
+
+
+atexit.register(flush, include_held=True)
 
 
 # -------------------------------------------------------------------
@@ -86,16 +422,28 @@ def load_settings():
         "theme": "Pink",
         "dark": False,
         "last_user": "",
-        "font": "Avenir"
+        "font": "Avenir",
+        "save_delay_ms": 500,
+        "prewarm_pages": True
     }
+
+    save_delay_ms is the write-behind window (0 = save immediately).
+    prewarm_pages builds the remaining pages while idle after startup.
     """
     default = {
         "theme": "Pink",
         "dark": False,
         "last_user": "",
         "font": "Avenir",
+        "save_delay_ms": 500,
+        "prewarm_pages": True,
     }
-    settings = load_json("settings.json", default)
+    if get_backend() == "sqlite":
+        import sqlite_backend
+
+        settings = sqlite_backend.load_settings(default)
+    else:
+        settings = load_json("settings.json", default)
 
     for k, v in default.items():
         if k not in settings:
@@ -105,9 +453,63 @@ def load_settings():
 
 
 def save_settings(settings):
+    if get_backend() == "sqlite":
+        import sqlite_backend
+
+        sqlite_backend.save_settings(settings)
+        return
     save_json("settings.json", settings)
 
 
+# -------------------------------------------------------------------
+# STORAGE BACKEND
+# -------------------------------------------------------------------
+
+
+def load_storage_config():
+    """
+    Storage structure (data/storage.json):
+    {
+        "backend": "json",              # or "sqlite"
+        "journal": False,               # JSONL journal for todos/flashcards
+        "journal_max_bytes": 1048576,   # compact past this journal size...
+        "journal_max_ratio": 0.5,       # ...or this fraction of the snapshot
+        "notes": "single",              # or "sharded" (see notes_store.py)
+        "codecs": {}                    # {"todos.json": "compact", ...}
+    }
+
+    The journal and sharded notes only apply to the json backend.
+
+    This file always stays JSON: it is what tells us where the rest
+    of the data lives.
+    """
+    default = {
+        "backend": "json",
+        "journal": False,
+        "journal_max_bytes": 1024 * 1024,
+        "journal_max_ratio": 0.5,
+        "notes": "single",
+        "codecs": {},
+    }
+    config = load_json("storage.json", default)
+    if not isinstance(config, dict):
+        config = dict(default)
+    for k, v in default.items():
+        config.setdefault(k, v)
+    return config
+
+
+def save_storage_config(config):
+    save_json("storage.json", config)
+
+
+def get_backend():
+    backend = load_storage_config().get("backend", "json")
+    if backend not in ("json", "sqlite"):
+        return "json"
+    return backend
+
+
 # -------------------------------------------------------------------
 # Bootstrap all JSON files once
 # -------------------------------------------------------------------
@@ -143,4 +545,68 @@ def ensure_all_defaults():
     load_json("schedule.json", {})
 
     load_users()
+    load_storage_config()
     load_settings()
+
+
+# -------------------------------------------------------------------
+# Codec conversion:  python data_manager.py convert <codec> [store ...]
+# -------------------------------------------------------------------
+
+
+def _store_files():
+    names = []
+    for entry in sorted(os.listdir(DATA_DIR)):
+        if entry.endswith(".json") and entry != "storage.json":
+            names.append(entry)
+    index = os.path.join("notes", "index.json")
+    if os.path.exists(_file_path(index)):
+        names.append(index)
+    return names
+
+
+def convert_stores(codec, names=None):
+    """
+    Rewrite stores in place with the given codec and remember the choice
+    in storage.json. Returns {name: (old_bytes, new_bytes)}.
+    """
+    if codec not in CODECS:
+        raise ValueError("Unknown codec: {0}".format(codec))
+    if codec not in available_codecs():
+        raise RuntimeError("Codec '{0}' needs a package that isn't installed.".format(codec))
+
+    flush()
+    config = load_storage_config()
+    codecs = config.setdefault("codecs", {})
+    result = {}
+    for name in names or _store_files():
+        path = _file_path(name)
+        if not os.path.exists(path):
+            continue
+        before = os.path.getsize(path)
+        data = load_json(name, None)
+        codecs[name] = codec
+        save_storage_config(config)
+        _write_json(name, data)
+        result[name] = (before, os.path.getsize(path))
+    return result
+
+
+def main(argv):
+    if len(argv) < 3 or argv[1] != "convert":
+        print("usage: python data_manager.py convert <{0}> [store ...]".format(
+            "|".join(CODECS)
+        ))
+        return 2
+    try:
+        result = convert_stores(argv[2], argv[3:])
+    except (ValueError, RuntimeError) as e:
+        print(e)
+        return 1
+    for name, (before, after) in sorted(result.items()):
+        print("{0}: {1} → {2} bytes".format(name, before, after))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
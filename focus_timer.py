@@ -0,0 +1,105 @@
+"""
+Countdown for the focus timer, kept apart from Qt.
+
+The countdown stores a deadline on a monotonic clock rather than a
+number of seconds left, so what it shows is always computed from the
+clock: a stalled event loop or a late timer can delay a redraw but never
+loses time. next_wakeup_ms() says when the display next changes (the
+next whole-second boundary of the remaining time), so the Timer page
+sleeps until then instead of polling, and while the page is hidden it
+only wakes every half minute (see MAX_HIDDEN_WAIT_MS) or at the end.
+
+On Linux the clock is CLOCK_BOOTTIME, which (unlike time.monotonic)
+keeps counting while the machine is suspended, so a session that spans
+a sleep ends when it should. Elsewhere time.monotonic is used.
+
+bench_timer.py measures drift and wakeups against a simulated event loop;
+tests/test_focus_timer.py checks a 50-minute session the same way.
+"""
+
+import math
+import time
+
+# Coarse timers may fire up to 5% early (Qt::CoarseTimer); waking a bit
+# after the boundary means an early timeout still finds the new second.
+WAKE_SLACK = 0.06
+MIN_WAKE_MS = 20
+# Qt's timers stop while the machine sleeps, so a hidden page still
+# looks at the clock this often to notice a resume
+MAX_HIDDEN_WAIT_MS = 30 * 1000
+
+
+def _boot_clock():
+    return time.clock_gettime(time.CLOCK_BOOTTIME)
+
+
+if hasattr(time, "CLOCK_BOOTTIME"):
+    clock = _boot_clock
+else:
+    clock = time.monotonic
+
+
+class Countdown:
+    def __init__(self, seconds, clock=clock):
+        self.clock = clock
+        self.duration = seconds
+        self._left = float(seconds)  # while paused
+        self._deadline = None  # clock time it reaches zero, while running
+
+    @property
+    def running(self):
+        return self._deadline is not None
+
+    def start(self):
+        if self._deadline is None:
+            self._deadline = self.clock() + self._left
+
+    def pause(self):
+        if self._deadline is not None:
+            self._left = self.remaining()
+            self._deadline = None
+
+    def reset(self, seconds=None):
+        if seconds is not None:
+            self.duration = seconds
+        self._left = float(self.duration)
+        self._deadline = None
+
+    def remaining(self):
+        """
+        Seconds left, as a float, never below zero.
+        """
+        if self._deadline is None:
+            return self._left
+        return max(0.0, self._deadline - self.clock())
+
+    def finished(self):
+        return self.remaining() <= 0.0
+
+    def display_seconds(self):
+        """
+        Whole seconds to show: rounded up, so "00:01" lasts until the end.
+        """
+        return int(math.ceil(self.remaining()))
+
+    def next_wakeup_ms(self):
+        """
+        Milliseconds until the displayed second changes, plus slack for
+        coarse timers.
+        """
+        left = self.remaining()
+        until = left - (math.ceil(left) - 1) if left > 0 else 0.0
+        return max(MIN_WAKE_MS, int(until * 1000 * (1 + WAKE_SLACK)) + 1)
+
+    def deadline_ms(self):
+        """
+        Milliseconds until the countdown ends, at most MAX_HIDDEN_WAIT_MS
+        (for a hidden page). 5% of a long wait is far too late, so these
+        few wakeups should use a precise timer.
+        """
+        ms = int(math.ceil(self.remaining() * 1000))
+        return max(MIN_WAKE_MS, min(ms, MAX_HIDDEN_WAIT_MS))
+
+
+def format_seconds(seconds):
+    return "{0:02d}:{1:02d}".format(seconds // 60, seconds % 60)
@@ -0,0 +1,476 @@
+"""
+iCalendar (.ics) import and export for the schedule.
+
+Import streams the file: lines are unfolded and parsed one at a time and
+each VEVENT is handled as soon as its END:VEVENT is read. RECURRENCE-ID
+events have to wait until every series is known, so they are spilled to
+a temporary file and applied at the end. What the import itself holds
+in memory is one batch of events; on top of that come the stores it
+dedups against, which grow with the schedule, not with the file: the
+imported-UID map (one entry per entry ever imported) and the UIDs of
+the repeating series. Events map onto the schedule like this:
+
+- a plain event becomes an entry on its start date, "HH:MM summary" if
+  it has a time of day
+- an event with an RRULE the recurrence module understands becomes a
+  series (see recurrence.py); its EXDATEs become skipped occurrences
+- an event with a RECURRENCE-ID overrides one occurrence of its series
+- CANCELLED events are skipped
+
+Re-importing is idempotent. A plain event is skipped if its UID was
+imported before (data/schedule_uids.json) or the same text is already
+on that day; a series is skipped if a series with its UID exists. The
+events are handled in batches, each inside its own
+data_manager.deferred_writes() block, so every store touched is written
+once per batch and nothing is held back while the UI runs in between.
+
+Export writes every dated entry as an all-day event and every series
+as an RRULE event plus one event per override, keeping imported UIDs
+so a round trip through another calendar doesn't duplicate anything.
+
+    python ics_io.py import calendar.ics
+    python ics_io.py export calendar.ics
+"""
+
+import os
+import sys
+import json
+import hashlib
+import datetime
+import tempfile
+import itertools
+
+from data_manager import load_json, save_json, deferred_writes
+from repositories import get_repository
+from recurrence import get_recurrence, series_uid, Rule
+
+UIDS_NAME = "schedule_uids.json"
+BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 20
+PRODID = "-//Study Helper//Schedule//EN"
+
+
+class IcsReport:
+    def __init__(self, total_bytes=0):
+        self.total_bytes = total_bytes
+        self.bytes_read = 0
+        self.events = 0
+        self.added = 0
+        self.series = 0
+        self.overrides = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.errors = []  # (line number, reason), first MAX_REPORTED_ERRORS
+
+    @property
+    def progress(self):
+        if not self.total_bytes:
+            return 1.0
+        return min(1.0, self.bytes_read / float(self.total_bytes))
+
+    def reject(self, line, reason):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, reason))
+
+    def summary(self):
+        return (
+            u"{0} entries and {1} repeating series added, {2} duplicates, "
+            u"{3} skipped of {4} events."
+        ).format(self.added, self.series, self.duplicates, self.skipped, self.events)
+
+
+# ================= PARSING =================
+
+
+def unescape(value):
+    out = []
+    i = 0
+    while i < len(value):
+        c = value[i]
+        if c == "\\" and i + 1 < len(value):
+            nxt = value[i + 1]
+            out.append("\n" if nxt in "nN" else nxt)
+            i += 2
+            continue
+        out.append(c)
+        i += 1
+    return "".join(out)
+
+
+def parse_line(line):
+    """
+    "DTSTART;VALUE=DATE:20240102" → ("DTSTART", {"VALUE": "DATE"}, "20240102")
+    """
+    in_quotes = False
+    for i, c in enumerate(line):
+        if c == '"':
+            in_quotes = not in_quotes
+        elif c == ":" and not in_quotes:
+            head, value = line[:i], line[i + 1:]
+            break
+    else:
+        return None
+    parts = head.split(";")
+    params = {}
+    for part in parts[1:]:
+        key, _, val = part.partition("=")
+        params[key.upper()] = val.strip('"')
+    return parts[0].upper(), params, value
+
+
+def parse_when(value, params=None):
+    """
+    (date, "HH:MM" or None) for a DTSTART / RECURRENCE-ID / EXDATE value.
+    UTC times are moved to local time; TZID is taken as local time.
+    """
+    value = value.strip()
+    if (params or {}).get("VALUE") == "DATE" or len(value) == 8:
+        return datetime.datetime.strptime(value[:8], "%Y%m%d").date(), None
+    moment = datetime.datetime.strptime(value[:15], "%Y%m%dT%H%M%S")
+    if value.endswith("Z"):
+        moment = moment.replace(tzinfo=datetime.timezone.utc).astimezone()
+    return moment.date(), moment.strftime("%H:%M")
+
+
+def _unfolded(lines, report):
+    """
+    Logical lines (continuations joined) with the line number they start on.
+    """
+    pending, start = None, 0
+    for number, raw in enumerate(lines, 1):
+        report.bytes_read += len(raw)
+        line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+        if number == 1:
+            line = line.lstrip(u"﻿")
+        if line[:1] in (" ", "\t") and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield start, pending
+        pending, start = line, number
+    if pending is not None:
+        yield start, pending
+
+
+def iter_events(f, report):
+    """
+    Yield (line number, {property: [(params, value), ...]}) per VEVENT
+    in the binary file f. Nested components (VALARM) are ignored.
+    """
+    event = None
+    depth = 0
+    for number, line in _unfolded(f, report):
+        parsed = parse_line(line)
+        if parsed is None:
+            continue
+        name, params, value = parsed
+        if name == "BEGIN":
+            if event is not None:
+                depth += 1
+            elif value.upper() == "VEVENT":
+                event, depth, event_line = {}, 0, number
+            continue
+        if name == "END":
+            if event is not None:
+                if depth:
+                    depth -= 1
+                elif value.upper() == "VEVENT":
+                    yield event_line, event
+                    event = None
+            continue
+        if event is not None and not depth:
+            event.setdefault(name, []).append((params, value))
+
+
+def _first(event, name):
+    values = event.get(name)
+    return values[0] if values else (None, None)
+
+
+# ================= IMPORT =================
+
+
+def _load_uids():
+    data = load_json(UIDS_NAME, None)
+    if not isinstance(data, dict) or data.get("version") != 1:
+        data = {"version": 1, "uids": {}}
+    return data
+
+
+def import_steps(path, repo=None, batch_size=BATCH_SIZE):
+    """
+    Import path into the schedule. Yields the IcsReport after every
+    batch_size events (and once at the end); close() the generator to
+    cancel, which keeps what was added so far. Raises OSError if the
+    file can't be read.
+    """
+    repo = repo or get_repository("schedule")
+    recurrence = get_recurrence()
+    report = IcsReport(os.path.getsize(path))
+    state = {
+        "uid_data": _load_uids(),
+        "series_ids": recurrence.uids(),
+        # RECURRENCE-ID events, one JSON line each, applied once every
+        # series is known
+        "overrides": tempfile.TemporaryFile(),
+    }
+
+    overrides = state["overrides"]
+    try:
+        with open(path, "rb") as f:
+            events = iter_events(f, report)
+            while True:
+                # Each batch is written when its block ends; nothing is
+                # held back while the UI has control between batches
+                with deferred_writes():
+                    count = _import_batch(
+                        repo,
+                        recurrence,
+                        state,
+                        report,
+                        itertools.islice(events, batch_size),
+                    )
+                    save_json(UIDS_NAME, state["uid_data"])
+                if count < batch_size:
+                    break
+                yield report
+    finally:
+        # also on cancel, for the series added so far
+        with overrides, deferred_writes():
+            overrides.seek(0)
+            for raw in overrides:
+                _import_override(
+                    recurrence, state["series_ids"], report, *json.loads(raw)
+                )
+    report.bytes_read = report.total_bytes
+    yield report
+
+
+def _import_batch(repo, recurrence, state, report, events):
+    """
+    Import some events; returns how many were read.
+    """
+    seen = state["uid_data"]["uids"]  # uid -> [day, text] of imported entries
+    on_day = {}  # day -> set of its texts, read once per batch
+    batch = []
+    count = 0
+    for line, event in events:
+        count += 1
+        report.events += 1
+        params, status = _first(event, "STATUS")
+        if (status or "").strip().upper() == "CANCELLED":
+            report.skipped += 1
+            continue
+        params, start = _first(event, "DTSTART")
+        if start is None:
+            report.reject(line, "no DTSTART")
+            continue
+        try:
+            day, time_of_day = parse_when(start, params)
+        except ValueError:
+            report.reject(line, u"bad DTSTART {0}".format(start))
+            continue
+        summary = unescape(_first(event, "SUMMARY")[1] or "").strip()
+        text = summary or "(no title)"
+        if time_of_day:
+            text = u"{0} {1}".format(time_of_day, text)
+        uid = (_first(event, "UID")[1] or "").strip()
+
+        if "RECURRENCE-ID" in event:
+            params, value = _first(event, "RECURRENCE-ID")
+            spilled = [line, uid, params, value, day.strftime("%Y-%m-%d"), text]
+            state["overrides"].write(
+                json.dumps(spilled, ensure_ascii=False).encode("utf-8") + b"\n"
+            )
+        elif "RRULE" in event:
+            _import_series(
+                recurrence, state["series_ids"], report, line, uid, event, day, text
+            )
+        else:
+            key = day.strftime("%Y-%m-%d")
+            uid = uid or hashlib.sha1(
+                u"{0}\x1f{1}".format(key, text).encode("utf-8")
+            ).hexdigest()
+            texts = on_day.get(key)
+            if texts is None:
+                texts = on_day[key] = set(repo.entries(key))
+            if uid in seen or text in texts:
+                report.duplicates += 1
+                continue
+            seen[uid] = [key, text]
+            texts.add(text)
+            batch.append((key, text))
+    if batch:
+        repo.add_entries(batch)
+        report.added += len(batch)
+    return count
+
+
+def _import_series(recurrence, series_ids, report, line, uid, event, day, text):
+    if uid and uid in series_ids:
+        report.duplicates += 1
+        return
+    try:
+        rule = Rule.parse(_first(event, "RRULE")[1])
+    except ValueError as e:
+        report.reject(line, u"unsupported RRULE ({0})".format(e))
+        return
+    series_id = recurrence.add_series(text, day, rule, uid=uid or None)
+    series_ids[series_uid(series_id, recurrence.get(series_id))] = series_id
+    for params, value in event.get("EXDATE", ()):
+        for item in value.split(","):
+            try:
+                skipped, _ = parse_when(item, params)
+            except ValueError:
+                continue
+            recurrence.skip(series_id, skipped.strftime("%Y-%m-%d"))
+    report.series += 1
+
+
+def _import_override(
+    recurrence, series_ids, report, line, uid, params, value, day, text
+):
+    series_id = series_ids.get(uid)
+    if series_id is None:
+        report.reject(line, "RECURRENCE-ID for an unknown series")
+        return
+    try:
+        original, _ = parse_when(value, params)
+    except ValueError:
+        report.reject(line, u"bad RECURRENCE-ID {0}".format(value))
+        return
+    original = original.strftime("%Y-%m-%d")
+    series = recurrence.get(series_id)
+    change = series["overrides"].get(original, {})
+    wanted = {"text": text, "date": day}
+    if all(change.get(k) == v for k, v in wanted.items()):
+        report.duplicates += 1
+        return
+    recurrence.override(series_id, original, **wanted)
+    report.overrides += 1
+
+
+def import_file(path, repo=None, batch_size=BATCH_SIZE):
+    """
+    Run a whole import and return its IcsReport.
+    """
+    report = None
+    for report in import_steps(path, repo, batch_size):
+        pass
+    return report
+
+
+# ================= EXPORT =================
+
+
+def escape(text):
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def fold(line):
+    """
+    Split a content line into 75-octet pieces (RFC 5545 §3.1).
+    """
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line + "\r\n"
+    pieces = []
+    limit = 75
+    while raw:
+        cut = min(limit, len(raw))
+        while cut < len(raw) and (raw[cut] & 0xC0) == 0x80:
+            cut -= 1  # don't split a UTF-8 sequence
+        pieces.append(raw[:cut].decode("utf-8"))
+        raw = raw[cut:]
+        limit = 74  # continuation lines start with a space
+    return "\r\n ".join(pieces) + "\r\n"
+
+
+def _ics_date(day):
+    return day.replace("-", "")
+
+
+def export_file(path, repo=None):
+    """
+    Write the whole schedule to path. Returns the number of events.
+    """
+    repo = repo or get_repository("schedule")
+    recurrence = get_recurrence()
+    uid_of = {tuple(entry): uid for uid, entry in _load_uids()["uids"].items()}
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    count = 0
+
+    def event(out, lines):
+        out.write("BEGIN:VEVENT\r\n")
+        for line in ["DTSTAMP:" + stamp] + lines:
+            out.write(fold(line))
+        out.write("END:VEVENT\r\n")
+
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as out:
+        out.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:" + PRODID + "\r\n")
+        for day, _ in repo.range_counts("0000-01-01", "9999-12-31"):
+            for position, text in enumerate(repo.entries(day)):
+                uid = uid_of.get((day, text)) or u"{0}-{1}@study-helper".format(
+                    hashlib.sha1(text.encode("utf-8")).hexdigest()[:16],
+                    _ics_date(day) + "-" + str(position),
+                )
+                event(out, [
+                    "UID:" + uid,
+                    "DTSTART;VALUE=DATE:" + _ics_date(day),
+                    "SUMMARY:" + escape(text),
+                ])
+                count += 1
+        for series_id, series in recurrence.all_series().items():
+            uid = series_uid(series_id, series)
+            lines = [
+                "UID:" + uid,
+                "DTSTART;VALUE=DATE:" + _ics_date(series["start"]),
+                "RRULE:" + series["rule"],
+                "SUMMARY:" + escape(series["text"]),
+            ]
+            if series.get("exdates"):
+                lines.append("EXDATE;VALUE=DATE:" + ",".join(
+                    _ics_date(day) for day in series["exdates"]
+                ))
+            event(out, lines)
+            count += 1
+            for original, change in sorted(series.get("overrides", {}).items()):
+                event(out, [
+                    "UID:" + uid,
+                    "RECURRENCE-ID;VALUE=DATE:" + _ics_date(original),
+                    "DTSTART;VALUE=DATE:" + _ics_date(change.get("date", original)),
+                    "SUMMARY:" + escape(change.get("text", series["text"])),
+                ])
+                count += 1
+        out.write("END:VCALENDAR\r\n")
+    os.replace(tmp, path)
+    return count
+
+
+def main(argv):
+    if len(argv) != 3 or argv[1] not in ("import", "export"):
+        print("usage: python ics_io.py import|export <file.ics>")
+        return 2
+    if argv[1] == "export":
+        print("Exported {0} events.".format(export_file(argv[2])))
+        return 0
+    try:
+        report = import_file(argv[2])
+    except OSError as e:
+        print(u"{0}: {1}".format(argv[2], e))
+        return 1
+    print(report.summary())
+    for line, reason in report.errors:
+        print(u"  line {0}: {1}".format(line, reason))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
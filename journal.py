@@ -0,0 +1,387 @@
+"""
+Journaled list stores (todos, flashcards).
+
+Instead of rewriting the whole list on every click, each mutation is
+appended as one small JSONL record to data/<store>.journal.jsonl. The
+state is the snapshot (the usual data/<store>.json list) plus the
+journal tail replayed on top of it.
+
+Journal layout:
+
+    {"base": "<sha1 of the snapshot file>"}      header
+    {"op": "add", "rec": {...}}
+    {"op": "set", "id": "<record id>", "fields": {"done": true}}
+    {"op": "del", "i": 0}
+
+Updates name the record by id, so they don't have to find it in the
+list; only a delete needs its position. (Older journals have "i" in
+set ops too, which is still replayed.)
+
+When the journal grows past a size or ratio threshold, a background
+thread folds it into a fresh snapshot. The header ties a journal to the
+exact snapshot it applies to, so a crash at any point of a compaction
+either keeps the old pair or the new one, never a mix. A torn last line
+(crash in the middle of an append) is dropped on the next load. A
+snapshot that can't be decoded is never replaced: it is moved aside as
+<store>.json.corrupt and loading raises RuntimeError until that file is
+dealt with, so the journal isn't dropped with it.
+"""
+
+import os
+import json
+import atexit
+import hashlib
+import threading
+
+import data_manager
+from repositories import new_record_id
+
+MIN_COMPACT_BYTES = 64 * 1024
+
+_CORRUPT = (
+    u"{0} could not be read and was moved to {1}, next to its journal. "
+    u"Repair or remove that file to open the store again."
+)
+
+def _sha1(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def _dump_snapshot(records, fname):
+    return data_manager.encode_store(records, data_manager.codec_for(fname))
+
+
+class JournalListRepository:
+    """
+    Same API as repositories.JsonListRepository; add/update/delete are
+    a single appended line each.
+    """
+
+    def __init__(self, fname, defaults=None, max_bytes=1024 * 1024, max_ratio=0.5):
+        self.fname = fname
+        self.defaults = defaults or {}
+        self.max_bytes = max_bytes
+        self.max_ratio = max_ratio
+
+        base, _ = os.path.splitext(fname)
+        self.journal_name = base + ".journal.jsonl"
+
+        self._lock = threading.RLock()
+        self._records = None
+        self._by_id = {}
+        self._snapshot_size = 0
+        self._journal_size = 0
+        self._journal = None
+        self._compactor = None
+        self._pending = None  # ops appended while a compaction runs
+
+        atexit.register(self.close)
+
+    # ---------- paths ----------
+
+    def _snapshot_path(self):
+        return os.path.join(data_manager.DATA_DIR, self.fname)
+
+    def _journal_path(self):
+        return os.path.join(data_manager.DATA_DIR, self.journal_name)
+
+    # ---------- loading / replay ----------
+
+    def _read_snapshot(self):
+        path = self._snapshot_path()
+        corrupt = path + ".corrupt"
+        if os.path.exists(corrupt):
+            raise RuntimeError(_CORRUPT.format(self.fname, corrupt))
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+        except OSError:
+            raw = b""
+        try:
+            records = data_manager.decode_store(raw) if raw else []
+        except RuntimeError:
+            raise  # e.g. msgpack not installed: the file itself is fine
+        except Exception as e:
+            records = e
+        if not isinstance(records, list):
+            # Starting over would write an empty snapshot and drop the
+            # journal with it; keep both and let the user sort it out
+            os.replace(path, corrupt)
+            raise RuntimeError(_CORRUPT.format(self.fname, corrupt))
+        if not raw:
+            raw = _dump_snapshot(records, self.fname)
+            self._write_file(path, raw)
+        return records, raw
+
+    def _read_journal(self, path, base):
+        """
+        Return (ops, good_bytes) if the journal at path belongs to the
+        snapshot with hash base, else None.
+        """
+        try:
+            f = open(path, "rb")
+        except OSError:
+            return None
+        ops = []
+        good = 0
+        with f:
+            header = f.readline()
+            try:
+                if json.loads(header.decode("utf-8")).get("base") != base:
+                    return None
+            except (ValueError, AttributeError):
+                return None
+            good = len(header)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn write
+                try:
+                    ops.append(json.loads(line.decode("utf-8")))
+                except ValueError:
+                    break
+                good += len(line)
+        return ops, good
+
+    def _apply(self, records, by_id, op):
+        kind = op.get("op")
+        if kind == "add":
+            rec = op.get("rec", {})
+            records.append(rec)
+            if "id" in rec:
+                by_id[rec["id"]] = rec
+        elif kind == "set":
+            if "id" in op:
+                rec = by_id.get(op["id"])
+            else:
+                # journals written before sets were keyed by id
+                i = op.get("i")
+                valid = isinstance(i, int) and 0 <= i < len(records)
+                rec = records[i] if valid else None
+            if rec is not None:
+                rec.update(op.get("fields", {}))
+        elif kind == "del":
+            i = op.get("i")
+            if isinstance(i, int) and 0 <= i < len(records):
+                rec = records.pop(i)
+                if by_id.get(rec.get("id")) is rec:
+                    del by_id[rec["id"]]
+
+    def _load(self):
+        records, raw = self._read_snapshot()
+        base = _sha1(raw)
+        jpath = self._journal_path()
+        tmp = jpath + ".tmp"
+
+        found = self._read_journal(jpath, base)
+        if found is None:
+            # Crash between swapping in a new snapshot and its journal
+            found = self._read_journal(tmp, base)
+            if found is not None:
+                os.replace(tmp, jpath)
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+        if found is None:
+            ops, good = [], 0
+            self._start_journal(base)
+        else:
+            ops, good = found
+            with open(jpath, "r+b") as f:
+                f.truncate(good)
+
+        by_id = {rec["id"]: rec for rec in records if "id" in rec}
+        for op in ops:
+            self._apply(records, by_id, op)
+        missing_ids = False
+        for rec in records:
+            for key, value in self.defaults.items():
+                rec.setdefault(key, value)
+            if "id" not in rec:
+                rec["id"] = new_record_id()
+                missing_ids = True
+
+        self._records = records
+        self._by_id = {rec["id"]: rec for rec in records}
+        self._snapshot_size = len(raw)
+        self._journal_size = os.path.getsize(jpath)
+        self._journal = open(jpath, "ab")
+        if missing_ids:
+            # persist the new ids right away so they stay stable
+            self.compact()
+
+    def _write_file(self, path, raw):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _start_journal(self, base):
+        header = json.dumps({"base": base}).encode("utf-8") + b"\n"
+        self._write_file(self._journal_path(), header)
+
+    # ---------- appends ----------
+
+    def _append(self, op):
+        self._append_many([op])
+
+    def _append_many(self, ops):
+        lines = b"".join(
+            json.dumps(op, ensure_ascii=False).encode("utf-8") + b"\n" for op in ops
+        )
+        self._journal.write(lines)
+        self._journal.flush()
+        self._journal_size += len(lines)
+        if self._pending is not None:
+            self._pending.append(lines)
+        self._maybe_compact()
+
+    def _index_of(self, record):
+        # only delete() needs the position
+        current = self._by_id.get(record.get("id"), record)
+        for i, rec in enumerate(self._records):
+            if rec is current:
+                return i
+        return None
+
+    # ---------- repository API ----------
+
+    def all(self):
+        with self._lock:
+            if self._records is None:
+                self._load()
+            return self._records
+
+    def get(self, record_id):
+        with self._lock:
+            self.all()
+            return self._by_id.get(record_id)
+
+    def add(self, record):
+        with self._lock:
+            records = self.all()
+            rec = dict(self.defaults)
+            rec.update(record)
+            rec.setdefault("id", new_record_id())
+            records.append(rec)
+            self._by_id[rec["id"]] = rec
+            self._append({"op": "add", "rec": rec})
+            return rec
+
+    def add_many(self, records):
+        with self._lock:
+            data = self.all()
+            added = []
+            for record in records:
+                rec = dict(self.defaults)
+                rec.update(record)
+                rec.setdefault("id", new_record_id())
+                self._by_id[rec["id"]] = rec
+                added.append(rec)
+            data.extend(added)
+            self._append_many([{"op": "add", "rec": rec} for rec in added])
+            return added
+
+    def update(self, record, **fields):
+        with self._lock:
+            self.all()
+            current = self._by_id.get(record.get("id"))
+            record.update(fields)
+            if current is None:
+                return False
+            current.update(fields)
+            self._append({"op": "set", "id": current["id"], "fields": fields})
+            return True
+
+    def delete(self, record):
+        with self._lock:
+            self.all()
+            idx = self._index_of(record)
+            if idx is None:
+                return
+            self._by_id.pop(self._records[idx].get("id"), None)
+            del self._records[idx]
+            self._append({"op": "del", "i": idx})
+
+    # ---------- compaction ----------
+
+    def needs_compaction(self):
+        size = self._journal_size
+        if size > self.max_bytes:
+            return True
+        # ratio only counts once the journal is big enough to matter
+        return size > MIN_COMPACT_BYTES and size > self._snapshot_size * self.max_ratio
+
+    def _maybe_compact(self):
+        if self._compactor is None and self.needs_compaction():
+            self.compact(background=True)
+
+    def compact(self, background=False):
+        """
+        Fold the journal into a fresh snapshot. With background=True the
+        serialisation runs on a worker thread; only the final file swaps
+        take the lock.
+        """
+        compactor = self._compactor
+        if compactor is not None:
+            if background:
+                return
+            compactor.join()
+
+        with self._lock:
+            self.all()
+            copy = [dict(r) for r in self._records]
+            self._pending = []
+
+        if not background:
+            self._finish_compaction(copy)
+            return
+        self._compactor = threading.Thread(
+            target=self._finish_compaction, args=(copy,), daemon=True
+        )
+        self._compactor.start()
+
+    def _finish_compaction(self, copy):
+        try:
+            raw = _dump_snapshot(copy, self.fname)
+            base = _sha1(raw)
+            spath = self._snapshot_path()
+            jpath = self._journal_path()
+
+            with open(spath + ".tmp", "wb") as f:
+                f.write(raw)
+                f.flush()
+                os.fsync(f.fileno())
+
+            with self._lock:
+                header = json.dumps({"base": base}).encode("utf-8") + b"\n"
+                tail = b"".join(self._pending or [])
+                # 1. new journal next to the old one
+                with open(jpath + ".tmp", "wb") as f:
+                    f.write(header + tail)
+                    f.flush()
+                    os.fsync(f.fileno())
+                # 2. new snapshot (old journal no longer matches it)
+                os.replace(spath + ".tmp", spath)
+                # 3. new journal
+                self._journal.close()
+                os.replace(jpath + ".tmp", jpath)
+                self._journal = open(jpath, "ab")
+
+                self._snapshot_size = len(raw)
+                self._journal_size = len(header) + len(tail)
+        finally:
+            with self._lock:
+                self._pending = None
+            self._compactor = None
+
+    def close(self):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            self._records = None
@@ -0,0 +1,403 @@
+"""
+Titles, content types and favicons for resource links.
+
+LinkMetaFetcher looks links up on a small thread pool and keeps what it
+finds in data/link_meta.json:
+
+{
+    "version": 1,
+    "entries": {
+        "<url>": {
+            "title": "...",            # <title> of an HTML page, else ""
+            "content_type": "text/html",
+            "icon": "<file in data/link_icons/>" or "",
+            "etag": "...", "last_modified": "...",
+            "status": 200, "error": "",
+            "fetched": unix time
+        }
+    }
+}
+
+An entry is fresh for FRESH_SECONDS (failures for RETRY_SECONDS). After
+that it is revalidated with If-None-Match / If-Modified-Since, so an
+unchanged page costs a 304 and no body. Each URL (and each favicon URL,
+which many links share) is fetched by at most one request at a time:
+asking again while one is in flight just adds a callback.
+
+Callbacks run on a pool thread; the Resources page re-emits them as a
+Qt signal to get back onto the UI thread. Nothing here needs Qt, so it
+can be tried against a local server:
+
+    python link_meta.py http://127.0.0.1:8000/page.html [...]
+"""
+
+import os
+import sys
+import time
+import atexit
+import hashlib
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor
+
+from data_manager import DATA_DIR, load_json, save_json
+
+CACHE_NAME = "link_meta.json"
+ICONS_DIR = os.path.join(DATA_DIR, "link_icons")
+
+FRESH_SECONDS = 7 * 24 * 60 * 60
+RETRY_SECONDS = 60 * 60
+MAX_WORKERS = 4
+TIMEOUT = 10
+MAX_HTML_BYTES = 256 * 1024
+MAX_ICON_BYTES = 64 * 1024
+USER_AGENT = "StudyHelper/1.0 (link preview)"
+
+ICON_TYPES = {
+    "image/x-icon": ".ico",
+    "image/vnd.microsoft.icon": ".ico",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/jpeg": ".jpg",
+    "image/svg+xml": ".svg",
+}
+
+
+def fetchable(url):
+    return urllib.parse.urlsplit(url).scheme in ("http", "https")
+
+
+class _HeadParser(HTMLParser):
+    """
+    Picks <title> and the icon <link> out of a page's <head>.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.icon = None
+        self.done = False
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            self._in_title = True
+        elif tag == "link" and self.icon is None:
+            attrs = dict(attrs)
+            rel = (attrs.get("rel") or "").lower().split()
+            if "icon" in rel and attrs.get("href"):
+                self.icon = attrs["href"]
+        elif tag == "body":
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        elif tag == "head":
+            self.done = True
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+
+
+def _charset(content_type):
+    for part in content_type.split(";")[1:]:
+        key, _, value = part.strip().partition("=")
+        if key.lower() == "charset" and value:
+            return value.strip("\"'")
+    return "utf-8"
+
+
+def parse_head(raw, charset="utf-8"):
+    """
+    (title, icon href or None) from the start of an HTML document.
+    """
+    parser = _HeadParser()
+    try:
+        text = raw.decode(charset, errors="replace")
+    except LookupError:
+        text = raw.decode("utf-8", errors="replace")
+    for start in range(0, len(text), 8192):
+        parser.feed(text[start:start + 8192])
+        if parser.done:
+            break
+    return " ".join(parser.title.split()), parser.icon
+
+
+class LinkMetaFetcher:
+    def __init__(self, max_workers=MAX_WORKERS, timeout=TIMEOUT):
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="link-meta")
+        self._lock = threading.Lock()
+        self._inflight = {}  # url -> [callback, ...]
+        self._icons_inflight = {}  # icon url -> threading.Event
+        self._dirty = False
+        self._closed = False
+        atexit.register(self.save)
+
+    # ---------- cache ----------
+
+    def _data(self):
+        data = load_json(CACHE_NAME, None)
+        if not isinstance(data, dict) or data.get("version") != 1:
+            data = {"version": 1, "entries": {}}
+            save_json(CACHE_NAME, data)
+        return data
+
+    def _entries(self):
+        return self._data()["entries"]
+
+    def get(self, url):
+        """
+        Cached entry for url (possibly stale), or None.
+        """
+        with self._lock:
+            entry = self._entries().get(url)
+            return dict(entry) if entry else None
+
+    def is_fresh(self, entry, now=None):
+        now = time.time() if now is None else now
+        ttl = RETRY_SECONDS if entry.get("error") else FRESH_SECONDS
+        return now - entry.get("fetched", 0) < ttl
+
+    def save(self):
+        with self._lock:
+            if self._dirty:
+                save_json(CACHE_NAME, self._data())
+                self._dirty = False
+
+    # ---------- requests ----------
+
+    def request(self, url, callback=None):
+        """
+        Return the cached entry for url and, unless it is fresh, fetch it
+        in the background and call callback(url, entry) when done.
+        Returns None if nothing is cached yet.
+        """
+        if not fetchable(url):
+            return None
+        with self._lock:
+            entry = self._entries().get(url)
+            entry = dict(entry) if entry else None
+            if self._closed or (entry is not None and self.is_fresh(entry)):
+                return entry
+            waiting = self._inflight.get(url)
+            if waiting is not None:
+                if callback is not None:
+                    waiting.append(callback)
+                return entry
+            self._inflight[url] = [callback] if callback is not None else []
+        self._pool.submit(self._run, url, entry)
+        return entry
+
+    def close(self):
+        """
+        Drop queued lookups and save the cache. Without this the pool's
+        exit handler would run every queued lookup (and its timeouts)
+        before the process could end. Lookups already running finish
+        on their own.
+        """
+        with self._lock:
+            self._closed = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self.save()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._inflight)
+
+    def _run(self, url, old):
+        try:
+            entry = self.fetch(url, old)
+        except Exception as e:  # never lose the in-flight slot
+            error = str(e) or type(e).__name__
+            entry = dict(old or {}, error=error, fetched=time.time())
+        with self._lock:
+            self._entries()[url] = entry
+            self._dirty = True
+            callbacks = self._inflight.pop(url, [])
+            batch_done = not self._inflight
+        if batch_done:
+            self.save()  # one write per burst of lookups, not per link
+        for callback in callbacks:
+            try:
+                callback(url, dict(entry))
+            except RuntimeError:
+                pass  # e.g. the page that asked has been closed
+
+    def _open(self, url, headers, timeout):
+        request = urllib.request.Request(
+            url, headers=dict(headers, **{"User-Agent": USER_AGENT})
+        )
+        return urllib.request.urlopen(request, timeout=timeout)
+
+    def fetch(self, url, old=None):
+        """
+        Fetch (or revalidate) url now, on the calling thread, and return
+        its new entry. Network errors end up in entry["error"].
+        """
+        old = old or {}
+        headers = {}
+        if not old.get("error"):
+            if old.get("etag"):
+                headers["If-None-Match"] = old["etag"]
+            if old.get("last_modified"):
+                headers["If-Modified-Since"] = old["last_modified"]
+        now = time.time()
+        try:
+            response = self._open(url, headers, self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return dict(old, status=304, fetched=now)
+            error = u"HTTP {0}".format(e.code)
+            return dict(old, status=e.code, error=error, fetched=now)
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            reason = getattr(e, "reason", None) or e
+            return dict(old, error=str(reason), fetched=now)
+
+        with response:
+            content_type = response.headers.get("Content-Type", "")
+            entry = {
+                "title": "",
+                "content_type": content_type.split(";")[0].strip().lower(),
+                "icon": "",
+                "etag": response.headers.get("ETag", ""),
+                "last_modified": response.headers.get("Last-Modified", ""),
+                "status": response.status,
+                "error": "",
+                "fetched": now,
+            }
+            icon_href = None
+            if entry["content_type"] in ("text/html", "application/xhtml+xml"):
+                raw = response.read(MAX_HTML_BYTES)
+                entry["title"], icon_href = parse_head(raw, _charset(content_type))
+            final_url = response.geturl()
+
+        icon_url = urllib.parse.urljoin(final_url, icon_href or "/favicon.ico")
+        entry["icon"] = self._icon(icon_url)
+        return entry
+
+    # ---------- favicons ----------
+
+    def _icon(self, icon_url):
+        """
+        File name of the icon at icon_url in ICONS_DIR, or "". Links on
+        the same site share one download.
+        """
+        stem = hashlib.sha1(icon_url.encode("utf-8")).hexdigest()
+        with self._lock:
+            event = self._icons_inflight.get(icon_url)
+            owner = event is None
+            if owner:
+                event = self._icons_inflight[icon_url] = threading.Event()
+        if not owner:
+            event.wait(self.timeout * 2)
+            return self._icon_file(stem)
+        try:
+            name = self._icon_file(stem)
+            if not name:
+                name = self._download_icon(icon_url, stem)
+            return name
+        finally:
+            with self._lock:
+                del self._icons_inflight[icon_url]
+            event.set()
+
+    def _icon_file(self, stem):
+        try:
+            for name in os.listdir(ICONS_DIR):
+                if name.startswith(stem + "."):
+                    return name
+        except OSError:
+            pass
+        return ""
+
+    def _download_icon(self, icon_url, stem):
+        try:
+            with self._open(icon_url, {}, self.timeout) as response:
+                content_type = response.headers.get("Content-Type", "")
+                ext = ICON_TYPES.get(content_type.split(";")[0].strip().lower())
+                raw = response.read(MAX_ICON_BYTES + 1)
+        except (urllib.error.URLError, OSError, ValueError):
+            return ""
+        if ext is None or not raw or len(raw) > MAX_ICON_BYTES:
+            return ""
+        os.makedirs(ICONS_DIR, exist_ok=True)
+        name = stem + ext
+        path = os.path.join(ICONS_DIR, name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(raw)
+        os.replace(path + ".tmp", path)
+        return name
+
+
+def icon_path(entry):
+    """
+    Absolute path of an entry's favicon, or None.
+    """
+    if entry and entry.get("icon"):
+        return os.path.join(ICONS_DIR, entry["icon"])
+    return None
+
+
+def link_label(url, entry):
+    """
+    What the Resources list shows for a link.
+    """
+    if not entry:
+        return url
+    label = entry.get("title") or url
+    content_type = entry.get("content_type", "")
+    if content_type and content_type not in ("text/html", "application/xhtml+xml"):
+        label = u"{0}  [{1}]".format(label, content_type.split("/")[-1].upper())
+    return label
+
+
+_fetcher = None
+
+
+def get_link_fetcher():
+    global _fetcher
+    if _fetcher is None:
+        _fetcher = LinkMetaFetcher()
+    return _fetcher
+
+
+def close_link_fetcher():
+    """
+    Shut the fetcher down if it was ever started (called on app exit).
+    """
+    if _fetcher is not None:
+        _fetcher.close()
+
+
+def main(argv):
+    if len(argv) < 2:
+        print("usage: python link_meta.py <url> [...]")
+        return 2
+    fetcher = get_link_fetcher()
+    done = threading.Semaphore(0)
+    urls = [url for url in argv[1:] if fetchable(url)]
+
+    def report(url, entry):
+        print(u"{0}\n    {1}  ({2}, {3})".format(
+            url, link_label(url, entry), entry.get("status"), entry.get("error") or "ok"
+        ))
+        done.release()
+
+    for url in urls:
+        entry = fetcher.request(url, report)
+        if entry is not None and fetcher.is_fresh(entry):
+            report(url, entry)
+    for _ in urls:
+        done.acquire()
+    fetcher.save()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
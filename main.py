@@ -1,5 +1,6 @@
 import sys
 import os
+import time
 
 from PyQt5.QtWidgets import (
     QApplication,
@@ -13,11 +14,24 @@ from PyQt5.QtWidgets import (
     QComboBox,
     QSizePolicy,
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QFontDatabase, QPixmap, QPainter, QColor, QIcon
 
-from data_manager import ensure_all_defaults, load_settings, save_settings
-from themes import build_stylesheet, THEME_NAMES, LIGHT_THEMES, DARK_THEMES
+from data_manager import (
+    ensure_all_defaults,
+    load_settings,
+    save_settings,
+    set_write_behind,
+    flush,
+)
+from themes import (
+    build_stylesheet,
+    build_palette,
+    precompile_stylesheets,
+    theme_colors,
+    THEME_NAMES,
+    LIGHT_THEMES,
+)
 from pages import (
     LoginPage,
     DashboardPage,
@@ -28,6 +42,7 @@ from pages import (
     SchedulePage,
     TimerPage,
 )
+from link_meta import close_link_fetcher
 
 
 class StandaloneWindow(QMainWindow):
@@ -46,6 +61,8 @@ class StandaloneWindow(QMainWindow):
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
+        self._started_at = time.perf_counter()
+        self.first_frame_ms = None
 
         ensure_all_defaults()
 
@@ -68,6 +85,12 @@ class MainWindow(QMainWindow):
         self.dark_mode = bool(self.settings.get("dark", False))
         self.current_user = self.settings.get("last_user") or None
 
+        # Coalesce saves from quick UI actions; flushed in closeEvent/atexit
+        try:
+            set_write_behind(int(self.settings.get("save_delay_ms", 500)))
+        except (TypeError, ValueError):
+            set_write_behind(500)
+
         # Central layout
         central = QWidget()
         central_layout = QVBoxLayout()
@@ -81,7 +104,7 @@ class MainWindow(QMainWindow):
         if self.current_user:
             self.title_label.setText("Student Helper — " + self.current_user)
         self.title_label.setAlignment(Qt.AlignLeft | Qt.AlignVCenter)
-        self.title_label.setStyleSheet("font-size: 18px; font-weight: 600;")
+        self.title_label.setObjectName("windowTitle")
         top_bar.addWidget(self.title_label)
 
         top_bar.addStretch()
@@ -107,7 +130,7 @@ class MainWindow(QMainWindow):
         # Dark / light toggle
         self.dark_btn = QPushButton("☾" if not self.dark_mode else "☀")
         self.dark_btn.setFixedWidth(40)
-        self.dark_btn.setStyleSheet("border-radius: 12px; padding: 4px;")
+        self.dark_btn.setObjectName("darkToggle")
         self.dark_btn.setToolTip("Toggle dark / light")
         self.dark_btn.clicked.connect(self.toggle_dark)
         top_bar.addWidget(self.dark_btn)
@@ -147,7 +170,7 @@ class MainWindow(QMainWindow):
             row_widget.setLayout(row_layout)
 
             btn = QPushButton(text)
-            btn.setStyleSheet("border-radius: 10px; padding: 8px 10px;")
+            btn.setObjectName("navButton")
             btn.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
             btn.clicked.connect(lambda _, p=key: self.switch_to(p))
             row_layout.addWidget(btn)
@@ -159,7 +182,7 @@ class MainWindow(QMainWindow):
                 pop_btn.setIcon(self.popout_icon)
                 pop_btn.setToolTip("Open in new window")
                 pop_btn.setFixedSize(26, 26)
-                pop_btn.setStyleSheet("border: none; padding: 0;")
+                pop_btn.setObjectName("popoutButton")
                 pop_btn.clicked.connect(lambda _, p=key: self.open_in_new_window(p))
                 row_layout.addWidget(pop_btn)
 
@@ -174,14 +197,17 @@ class MainWindow(QMainWindow):
 
         central_layout.addLayout(body)
 
-        # ---------- Create pages ----------
+        # ---------- Register pages ----------
+        # Pages are built on their first switch_to(); the rest can be
+        # prewarmed once the window is on screen (see prewarm_pages).
         self.pages = {}
+        self.page_factories = {}
         self.page_order = []
 
-        self.add_page("login", LoginPage(self.switch_to, self.set_current_user))
+        self.add_page("login", lambda: LoginPage(self.switch_to, self.set_current_user))
         self.add_page(
             "dashboard",
-            DashboardPage(
+            lambda: DashboardPage(
                 self.switch_to,
                 self.open_in_new_window,
                 self.get_current_user,
@@ -189,12 +215,17 @@ class MainWindow(QMainWindow):
                 self.logout,
             ),
         )
-        self.add_page("todo", TodoPage(self.switch_to))
-        self.add_page("notes", NotesPage(self.switch_to))
-        self.add_page("flashcards", FlashcardsPage(self.switch_to))
-        self.add_page("resources", ResourcesPage(self.switch_to))
-        self.add_page("schedule", SchedulePage(self.switch_to))
-        self.add_page("timer", TimerPage(self.switch_to))
+        self.add_page("todo", lambda: TodoPage(self.switch_to))
+        self.add_page("notes", lambda: NotesPage(self.switch_to))
+        self.add_page("flashcards", lambda: FlashcardsPage(self.switch_to))
+        self.add_page("resources", lambda: ResourcesPage(self.switch_to))
+        self.add_page("schedule", lambda: SchedulePage(self.switch_to))
+        self.add_page("timer", lambda: TimerPage(self.switch_to))
+        self._prewarm_queue = []
+
+        # Theme first, so the start page is polished once with the final sheet
+        self._applied_sheet = None
+        self.apply_theme()
 
         # Start page
         if self.current_user:
@@ -202,8 +233,6 @@ class MainWindow(QMainWindow):
         else:
             self.switch_to("login")
 
-        self.apply_theme()
-
     # ---------- Fonts & Themes ----------
 
     def load_handwriting_font(self):
@@ -261,14 +290,17 @@ class MainWindow(QMainWindow):
             self.theme_combo.setItemData(index, name, Qt.UserRole)
 
     def get_theme_colors(self):
-        base = DARK_THEMES if self.dark_mode else LIGHT_THEMES
-        if self.theme_name not in base:
-            return base["Pink"]
-        return base[self.theme_name]
+        return theme_colors(self.theme_name, self.dark_mode)
 
     def apply_theme(self):
         sheet = build_stylesheet(self.theme_name, self.dark_mode, self.font_name)
-        self.setStyleSheet(sheet)
+        # Widgets carry no inline sheets, so this is the only re-polish
+        if sheet is not self._applied_sheet:
+            self.setStyleSheet(sheet)
+            self._applied_sheet = sheet
+        QApplication.instance().setPalette(
+            build_palette(self.theme_name, self.dark_mode)
+        )
         self.dark_btn.setText("☾" if not self.dark_mode else "☀")
 
         # Let dashboard redraw its rings with new theme
@@ -298,26 +330,65 @@ class MainWindow(QMainWindow):
 
     # ---------- Page management ----------
 
-    def add_page(self, key, widget):
-        self.pages[key] = widget
+    def add_page(self, key, factory):
+        self.page_factories[key] = factory
         self.page_order.append(key)
-        self.stack.addWidget(widget)
+
+    def get_page(self, key):
+        """
+        Return the page for key, building it on first use.
+        """
+        page = self.pages.get(key)
+        if page is None:
+            page = self.page_factories[key]()
+            self.pages[key] = page
+            self.stack.addWidget(page)
+        return page
 
     def switch_to(self, key):
-        if key not in self.pages:
+        if key not in self.page_factories:
             key = "login"
+        just_built = key not in self.pages
+        page = self.get_page(key)
         self.current_page_key = key
-        self.stack.setCurrentWidget(self.pages[key])
+        self.stack.setCurrentWidget(page)
 
         # Sidebar visibility (login hides sidebar)
         self.update_sidebar_visibility()
 
-        # Refresh dashboard when shown
-        if key == "dashboard":
-            page = self.pages["dashboard"]
+        # Refresh dashboard when shown (a new one refreshed in __init__)
+        if key == "dashboard" and not just_built:
             if hasattr(page, "refresh"):
                 page.refresh()
 
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.first_frame_ms is None:
+            self.first_frame_ms = (time.perf_counter() - self._started_at) * 1000.0
+            if os.environ.get("STUDY_HELPER_TIMING"):
+                print("first frame after {0:.1f} ms".format(self.first_frame_ms))
+            if self.settings.get("prewarm_pages", True):
+                QTimer.singleShot(0, lambda: precompile_stylesheets(self.font_name))
+                self._prewarm_queue = [
+                    k for k in self.page_order if k not in self.pages
+                ]
+                QTimer.singleShot(0, self._prewarm_next)
+
+    def _prewarm_next(self):
+        # One page per event-loop turn so input stays responsive
+        while self._prewarm_queue:
+            key = self._prewarm_queue.pop(0)
+            if key not in self.pages:
+                self.get_page(key)
+                break
+        if self._prewarm_queue:
+            QTimer.singleShot(0, self._prewarm_next)
+
+    def closeEvent(self, event):
+        close_link_fetcher()
+        flush()
+        super().closeEvent(event)
+
     def resizeEvent(self, event):
         super().resizeEvent(event)
         self.update_sidebar_visibility()
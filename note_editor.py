@@ -0,0 +1,249 @@
+"""
+Chunked loading and partial saving for the notes editor.
+
+A unit body arrives as segments (runs of whole lines, see
+notes_store.split_segments). The first segment goes in with
+setPlainText, so the first screen shows up at once; the rest are
+appended one per event-loop tick. The editor is read-only and has no
+undo history until the last segment is in.
+
+While the user types, the document's contentsChange signal is mapped to
+block ranges: every segment keeps its block count and the position it
+was loaded from, and a change merges the segments it touches into one
+"dirty" segment. On save, only dirty segments are turned back into
+text; the others are passed to the repository by position, so the
+sharded notes store rewrites just those files. Repositories without
+segment support get the whole body, as before.
+
+snapshot() gives the same description of the unsaved state without
+saving it; autosave.py writes that as a recovery draft.
+"""
+
+import hashlib
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from notes_store import split_segments, SEGMENT_CHARS
+
+
+def _block_count(text):
+    return text.count("\n") + 1
+
+
+def segment_base(repo, subject, unit):
+    """
+    The segment files a unit is stored in, or None if repo doesn't
+    store segments. Segment positions are only meaningful against the
+    same base.
+    """
+    if not hasattr(repo, "unit_segments"):
+        return None
+    entry = repo.unit_info(subject, unit) or {}
+    if "segments" in entry:
+        return [seg["file"] for seg in entry["segments"]]
+    return [entry.get("file")]
+
+
+def content_sha1(text):
+    """
+    Identifies a unit body for repos without segments, so a draft can
+    tell whether the unit was saved since it was taken.
+    """
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class ChunkedNoteLoader(QObject):
+    finished = pyqtSignal()
+    edited = pyqtSignal()  # the user changed the loaded text
+
+    def __init__(self, text_edit, parent=None):
+        super().__init__(parent or text_edit)
+        self.text_edit = text_edit
+        self._timer = QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._load_step)
+        self._pending = None  # iterator over the segments still to append
+        self._segments = []  # [block count, loaded position or None]
+        self._loaded = 0
+        self._blocks = 1
+        self.base = None  # segment_base() of what was loaded / last saved
+        self.content_sha1 = None  # same, for repos without segments
+        text_edit.document().contentsChange.connect(self._on_contents_change)
+
+    # ---------- loading ----------
+
+    def loading(self):
+        return self._pending is not None
+
+    def load(self, repo, subject, unit):
+        self.cancel()
+        if hasattr(repo, "unit_segments"):
+            segments = repo.unit_segments(subject, unit)
+            self.content_sha1 = None
+        else:
+            body = repo.unit_content(subject, unit)
+            self.content_sha1 = content_sha1(body)
+            segments = split_segments(body)
+        segments = iter(segments)
+        first = next(segments, "")
+        self.base = segment_base(repo, subject, unit)
+
+        self._pending = segments  # ignore our own contentsChange
+        self.text_edit.setUndoRedoEnabled(False)
+        self.text_edit.setPlainText(first)
+        self._segments = [[_block_count(first), 0]]
+        self._loaded = 1
+        self.text_edit.setReadOnly(True)
+        self._timer.start()
+
+    def _append(self, text):
+        cursor = self.text_edit.textCursor()
+        cursor.movePosition(cursor.End)
+        cursor.insertText("\n" + text)
+        self._segments.append([_block_count(text), self._loaded])
+        self._loaded += 1
+
+    def _load_step(self):
+        if self._pending is None:
+            self._timer.stop()
+            return
+        text = next(self._pending, None)
+        if text is None:
+            self._done()
+            return
+        # appending moves the view's cursor; keep the user where they are
+        scroll = self.text_edit.verticalScrollBar().value()
+        self._append(text)
+        self.text_edit.verticalScrollBar().setValue(scroll)
+
+    def _done(self):
+        self._timer.stop()
+        self._pending = None
+        self._blocks = self.text_edit.document().blockCount()
+        self.text_edit.moveCursor(self.text_edit.textCursor().Start)
+        self.text_edit.setUndoRedoEnabled(True)
+        self.text_edit.setReadOnly(False)
+        self.finished.emit()
+
+    def finish(self):
+        """
+        Load whatever is left right now (e.g. before a save).
+        """
+        if self._pending is None:
+            return
+        for text in self._pending:
+            self._append(text)
+        self._done()
+
+    def cancel(self):
+        self._timer.stop()
+        self._pending = None
+        self.text_edit.setReadOnly(False)
+        self.text_edit.setUndoRedoEnabled(True)
+
+    def clear(self):
+        self.cancel()
+        self.text_edit.clear()
+        self._segments = [[1, None]]
+        self._blocks = 1
+        self.base = None
+        self.content_sha1 = None
+
+    # ---------- change tracking ----------
+
+    def _on_contents_change(self, pos, removed, added):
+        if self._pending is not None:
+            return
+        doc = self.text_edit.document()
+        blocks = doc.blockCount()
+        first = doc.findBlock(pos).blockNumber()
+        end = doc.findBlock(min(pos + added, doc.characterCount() - 1))
+        last = end.blockNumber() if end.isValid() else blocks - 1
+        new_span = max(1, last - first + 1)
+        old_span = max(1, new_span - (blocks - self._blocks))
+        self._blocks = blocks
+        self._mark_dirty(max(0, first), old_span, new_span)
+        self.edited.emit()
+
+    def _mark_dirty(self, first, old_span, new_span):
+        # segments covering old blocks first .. first + old_span - 1
+        segments = self._segments
+        start = 0
+        i = 0
+        while i < len(segments) - 1 and start + segments[i][0] <= first:
+            start += segments[i][0]
+            i += 1
+        j = i
+        covered = start + segments[i][0]
+        while j < len(segments) - 1 and covered < first + old_span:
+            j += 1
+            covered += segments[j][0]
+        total = sum(seg[0] for seg in segments[i:j + 1])
+        segments[i:j + 1] = [[max(1, total - old_span + new_span), None]]
+
+    def modified(self):
+        return any(origin is None for _, origin in self._segments) or [
+            origin for _, origin in self._segments
+        ] != list(range(len(self._segments)))
+
+    def _segment_text(self, first, count):
+        block = self.text_edit.document().findBlockByNumber(first)
+        lines = []
+        for _ in range(count):
+            lines.append(block.text())
+            block = block.next()
+        return "\n".join(lines)
+
+    # ---------- saving ----------
+
+    def _items(self):
+        """
+        (items, rebased): the body as save_unit_segments() items, and the
+        segment list as it will be once they are saved.
+        """
+        if sum(blocks for blocks, _ in self._segments) != self._blocks:
+            # lost track somewhere; write everything once and start over
+            self._segments = [[self._blocks, None]]
+
+        items = []
+        rebased = []
+        first = 0
+        for blocks, origin in self._segments:
+            if origin is not None:
+                items.append(origin)
+                rebased.append([blocks, len(rebased)])
+            else:
+                text = self._segment_text(first, blocks)
+                pieces = [text]
+                if len(text) > 2 * SEGMENT_CHARS:
+                    pieces = split_segments(text)
+                for piece in pieces:
+                    items.append(piece)
+                    rebased.append([_block_count(piece), len(rebased)])
+            first += blocks
+        return items, rebased or [[1, 0]]
+
+    def snapshot(self):
+        """
+        (base, items) describing the unsaved text: with a segment base,
+        items are as for save_unit_segments(); without one, base is the
+        content_sha1() of the stored body and items is the whole text as
+        a single string.
+        """
+        if self.base is None:
+            return self.content_sha1, [self.text_edit.toPlainText()]
+        return list(self.base), self._items()[0]
+
+    def save(self, repo, subject, unit):
+        self.finish()
+        if not hasattr(repo, "unit_segments"):
+            text = self.text_edit.toPlainText()
+            repo.save_unit(subject, unit, text)
+            self.content_sha1 = content_sha1(text)
+            return
+        if not self.modified():
+            return
+        items, rebased = self._items()
+        repo.save_unit_segments(subject, unit, items)
+        self._segments = rebased
+        self.base = segment_base(repo, subject, unit)
@@ -0,0 +1,508 @@
+"""
+Full-text search over notes.
+
+An inverted index over every unit (subject name, unit name and body),
+kept in data/notes_search.json:
+
+{
+    "version": 1,
+    "source": "json:single",            # backend + notes layout it indexes
+    "gen": int,                         # generation of the change log
+    "docs": {
+        "<subject>\\u001f<unit>": {"subject": "...", "unit": "...", "len": int,
+                                   "sha1": "...", "terms": ["...", ...]}
+    },
+    "postings": {"term": {"<doc key>": term frequency, ...}},
+    "stale": ["<doc key>", ...]          # re-indexed before the next query
+}
+
+The notes repository is wrapped (see wrap_repository) so that saving,
+adding or deleting a unit re-indexes only that unit. A segmented save
+(save_unit_segments) only marks the unit stale, so saving a few lines
+of a huge body doesn't read and tokenize all of it; that happens once,
+before the next search. Queries are ranked
+with BM25; words in the subject or unit name count TITLE_BOOST times.
+Only the bodies of the top hits are read, to cut the snippets.
+
+The snapshot isn't rewritten on every change. Each change is appended
+to data/notes_search.<gen>.log.jsonl as one line per unit:
+
+    {"op": "set", "key": "...", "doc": {...}, "tf": {"term": tf, ...}}
+    {"op": "del" | "stale" | "fresh", "key": "..."}
+
+so a save costs the size of that unit, not of the index. Loading
+replays the logs of the snapshot's generation and newer over it (each
+op sets a unit's entry outright, so replaying one twice is harmless).
+Once the log outgrows MIN_COMPACT_BYTES and LOG_RATIO of the snapshot,
+compact() saves the snapshot as the next generation and starts a new
+log; the old one is removed after the snapshot has been written, so a
+crash in between still replays it. A torn last line is dropped.
+
+If the index is missing or belongs to another storage layout it is
+rebuilt from scratch on first use. By hand:
+
+    python notes_search.py rebuild
+    python notes_search.py query <words ...>
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import heapq
+import hashlib
+
+from data_manager import (
+    DATA_DIR,
+    load_json,
+    save_json,
+    is_pending,
+    get_backend,
+    load_storage_config,
+    _file_path,
+)
+from repositories import RepositoryWrapper
+
+INDEX_NAME = "notes_search.json"
+LOG_PREFIX = "notes_search."
+LOG_SUFFIX = ".log.jsonl"
+# fold the change log into the snapshot once it is this big, or this
+# fraction of the snapshot, so replaying it on start stays cheap
+MIN_COMPACT_BYTES = 64 * 1024
+LOG_RATIO = 0.5
+
+TITLE_BOOST = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_CHARS = 60
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_KEY_SEP = "\x1f"
+
+
+def tokenize(text):
+    return [t.lower() for t in _TOKEN_RE.findall(text or "")]
+
+
+def doc_key(subject, unit):
+    return subject + _KEY_SEP + unit
+
+
+def _source():
+    if get_backend() == "sqlite":
+        return "sqlite"
+    return "json:" + load_storage_config().get("notes", "single")
+
+
+def _sha1_text(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _empty_index():
+    return {"version": 1, "source": _source(), "gen": 0, "docs": {}, "postings": {}}
+
+
+def _log_path(gen):
+    return os.path.join(DATA_DIR, "{0}{1}{2}".format(LOG_PREFIX, gen, LOG_SUFFIX))
+
+
+def _log_gens():
+    gens = []
+    try:
+        names = os.listdir(DATA_DIR)
+    except OSError:
+        return gens
+    for name in names:
+        if name.startswith(LOG_PREFIX) and name.endswith(LOG_SUFFIX):
+            gen = name[len(LOG_PREFIX):-len(LOG_SUFFIX)]
+            if gen.isdigit():
+                gens.append(int(gen))
+    return gens
+
+
+class SearchHit:
+    def __init__(self, subject, unit, score, snippet="", offset=None, length=0):
+        self.subject = subject
+        self.unit = unit
+        self.score = score
+        self.snippet = snippet
+        self.offset = offset  # first match in the body, or None (title hit)
+        self.length = length
+
+    def __repr__(self):
+        return "SearchHit({0!r}, {1!r}, {2:.3f})".format(
+            self.subject, self.unit, self.score
+        )
+
+
+def make_snippet(text, terms, width=SNIPPET_CHARS):
+    """
+    (snippet, offset, length) around the first occurrence of any term;
+    the match is wrapped in « ». offset is None if no term is in text.
+    """
+    if not terms:
+        return "", None, 0
+    pattern = re.compile(
+        r"\b(" + "|".join(re.escape(t) for t in terms) + r")\b",
+        re.IGNORECASE | re.UNICODE,
+    )
+    match = pattern.search(text)
+    if match is None:
+        head = " ".join(text[: width * 2].split())
+        return head + (u"…" if len(text) > width * 2 else ""), None, 0
+
+    start = max(0, match.start() - width)
+    end = min(len(text), match.end() + width)
+    before = " ".join(text[start:match.start()].split())
+    after = " ".join(text[match.end():end].split())
+    snippet = u"{0}{1} «{2}» {3}{4}".format(
+        u"…" if start > 0 else "",
+        before,
+        match.group(0),
+        after,
+        u"…" if end < len(text) else "",
+    ).strip()
+    return snippet, match.start(), match.end() - match.start()
+
+
+class NotesSearchIndex:
+    def __init__(self, repo):
+        self.repo = repo  # unwrapped notes repository, used by rebuild()
+        self._data = None  # snapshot with the change logs replayed on top
+        self._gen = None  # generation of the log being appended to
+        self._log = None  # open file of that log
+        self._log_bytes = 0
+        self._snapshot_bytes = 0
+        self._old_logs = True  # logs folded into a snapshot may be left
+
+    # ---------- storage ----------
+
+    def _index(self):
+        snapshot = load_json(INDEX_NAME, None)
+        if snapshot is self._data and self._data is not None:
+            return self._data
+        if (
+            not isinstance(snapshot, dict)
+            or snapshot.get("version") != 1
+            or snapshot.get("source") != _source()
+        ):
+            return self.rebuild()
+        self._open(snapshot)
+        return snapshot
+
+    def _open(self, snapshot):
+        """
+        Replay every log from the snapshot's generation on (a log of the
+        generation before it may still be needed while the snapshot
+        write is pending) and get ready to append.
+        """
+        self._close_log()
+        gen = snapshot.setdefault("gen", 0)
+        gens = sorted(g for g in _log_gens() if g >= gen)
+        for g in gens:
+            good = 0
+            with open(_log_path(g), "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn write
+                    try:
+                        op = json.loads(line.decode("utf-8"))
+                    except ValueError:
+                        break
+                    self._apply(snapshot, op)
+                    good += len(line)
+            if g == gens[-1]:
+                with open(_log_path(g), "r+b") as f:
+                    f.truncate(good)
+                self._log_bytes = good
+        self._data = snapshot
+        self._gen = gens[-1] if gens else gen
+        try:
+            self._snapshot_bytes = os.path.getsize(_file_path(INDEX_NAME))
+        except OSError:
+            self._snapshot_bytes = 0
+        if not gens:
+            self._log_bytes = 0
+        self._drop_old_logs()
+
+    def _close_log(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def _drop_old_logs(self):
+        # logs older than the snapshot are folded into it, once it is on disk
+        if is_pending(INDEX_NAME):
+            self._old_logs = True
+            return
+        self._old_logs = False
+        for g in _log_gens():
+            if g < self._data["gen"]:
+                try:
+                    os.remove(_log_path(g))
+                except OSError:
+                    pass
+
+    def _record(self, *ops):
+        """
+        Apply ops to the index and append them to the current log.
+        O(size of the ops), whatever the size of the index.
+        """
+        index = self._index()
+        for op in ops:
+            self._apply(index, op)
+        if self._log is None:
+            self._log = open(_log_path(self._gen), "ab")
+        lines = b"".join(
+            json.dumps(op, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            + b"\n"
+            for op in ops
+        )
+        self._log.write(lines)
+        self._log.flush()
+        self._log_bytes += len(lines)
+        if self._log_bytes > max(MIN_COMPACT_BYTES, self._snapshot_bytes * LOG_RATIO):
+            self.compact()
+        elif self._old_logs:
+            self._drop_old_logs()
+
+    def compact(self):
+        """
+        Fold the logs into a new snapshot. New changes go to a log of the
+        next generation right away; the old logs are removed once the
+        snapshot is on disk.
+        """
+        index = self._index()
+        self._close_log()
+        self._gen += 1
+        index["gen"] = self._gen
+        save_json(INDEX_NAME, index)
+        self._log_bytes = 0
+        try:
+            self._snapshot_bytes = os.path.getsize(_file_path(INDEX_NAME))
+        except OSError:
+            pass
+        self._drop_old_logs()
+
+    # ---------- indexing ----------
+
+    def _set_op(self, subject, unit, content):
+        counts = {}
+        for term in tokenize(content):
+            counts[term] = counts.get(term, 0) + 1
+        for term in tokenize(subject) + tokenize(unit):
+            counts[term] = counts.get(term, 0) + TITLE_BOOST
+        doc = {
+            "subject": subject,
+            "unit": unit,
+            "len": sum(counts.values()),
+            "sha1": _sha1_text(content),
+        }
+        return {"op": "set", "key": doc_key(subject, unit), "doc": doc, "tf": counts}
+
+    def _apply(self, index, op):
+        kind, key = op.get("op"), op.get("key")
+        if kind in ("set", "del"):
+            self._remove(index, key)
+            self._unstale(index, key)
+        if kind == "set":
+            doc = dict(op["doc"], terms=sorted(op["tf"]))
+            postings = index["postings"]
+            for term, tf in op["tf"].items():
+                postings.setdefault(term, {})[key] = tf
+            index["docs"][key] = doc
+        elif kind == "stale":
+            stale = index.setdefault("stale", [])
+            if key not in stale:
+                stale.append(key)
+        elif kind == "fresh":
+            self._unstale(index, key)
+
+    def _remove(self, index, key):
+        doc = index["docs"].pop(key, None)
+        if doc is None:
+            return
+        postings = index["postings"]
+        for term in doc["terms"]:
+            docs = postings.get(term)
+            if docs is None:
+                continue
+            docs.pop(key, None)
+            if not docs:
+                del postings[term]
+
+    def rebuild(self):
+        old = load_json(INDEX_NAME, None)
+        index = _empty_index()
+        gens = _log_gens()
+        if isinstance(old, dict) and isinstance(old.get("gen"), int):
+            gens.append(old["gen"])
+        index["gen"] = max(gens) + 1 if gens else 0  # newer than any log
+        for subject, _ in self.repo.subjects():
+            for unit in self.repo.units(subject):
+                content = self.repo.unit_content(subject, unit)
+                self._apply(index, self._set_op(subject, unit, content))
+        self._close_log()
+        save_json(INDEX_NAME, index)
+        self._data = index
+        self._gen = index["gen"]
+        self._log_bytes = 0
+        self._drop_old_logs()
+        return index
+
+    def _unstale(self, index, key):
+        stale = index.get("stale")
+        if stale and key in stale:
+            stale.remove(key)
+            return True
+        return False
+
+    def update_unit(self, subject, unit, content):
+        index = self._index()
+        key = doc_key(subject, unit)
+        doc = index["docs"].get(key)
+        if doc is not None and doc.get("sha1") == _sha1_text(content):
+            if key in index.get("stale", ()):
+                self._record({"op": "fresh", "key": key})
+            return  # saved without changes
+        self._record(self._set_op(subject, unit, content))
+
+    def mark_stale(self, subject, unit):
+        index = self._index()
+        key = doc_key(subject, unit)
+        if key not in index.get("stale", ()):
+            self._record({"op": "stale", "key": key})
+
+    def _refresh_stale(self, index):
+        stale = index.get("stale")
+        if not stale:
+            return
+        ops = []
+        for key in list(stale):
+            subject, _, unit = key.partition(_KEY_SEP)
+            if unit in self.repo.units(subject):
+                content = self.repo.unit_content(subject, unit)
+                ops.append(self._set_op(subject, unit, content))
+            else:
+                ops.append({"op": "del", "key": key})
+        self._record(*ops)
+
+    def remove_unit(self, subject, unit):
+        self._record({"op": "del", "key": doc_key(subject, unit)})
+
+    def remove_subject(self, subject):
+        index = self._index()
+        keys = [k for k, d in index["docs"].items() if d["subject"] == subject]
+        prefix = subject + _KEY_SEP
+        keys += [k for k in index.get("stale", ()) if k.startswith(prefix)]
+        if keys:
+            self._record(*[{"op": "del", "key": key} for key in set(keys)])
+
+    # ---------- queries ----------
+
+    def search(self, query, limit=20):
+        """
+        Best matches for query as a list of SearchHit, best first.
+        """
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        index = self._index()
+        self._refresh_stale(index)
+        docs = index["docs"]
+        n = len(docs)
+        if n == 0:
+            return []
+        avg_len = sum(d["len"] for d in docs.values()) / float(n) or 1.0
+
+        scores = {}
+        for term in terms:
+            postings = index["postings"].get(term)
+            if not postings:
+                continue
+            idf = math.log(1.0 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, tf in postings.items():
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * docs[key]["len"] / avg_len)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (BM25_K1 + 1.0) / (
+                    tf + norm
+                )
+
+        hits = []
+        for key, score in heapq.nlargest(limit, scores.items(), key=lambda kv: kv[1]):
+            doc = docs[key]
+            content = self.repo.unit_content(doc["subject"], doc["unit"])
+            snippet, offset, length = make_snippet(content, terms)
+            hits.append(
+                SearchHit(doc["subject"], doc["unit"], score, snippet, offset, length)
+            )
+        return hits
+
+
+# ================= REPOSITORY WRAPPER =================
+
+
+class SearchIndexedNotesRepository(RepositoryWrapper):
+    """
+    Notes repository that keeps the search index in step with every
+    unit change.
+    """
+
+    def __init__(self, inner):
+        super().__init__(inner)
+        self.search_index = NotesSearchIndex(inner)
+
+    def search(self, query, limit=20):
+        return self.search_index.search(query, limit)
+
+    def delete_subject(self, name):
+        self.inner.delete_subject(name)
+        self.search_index.remove_subject(name)
+
+    def add_unit(self, subject, unit):
+        self.inner.add_unit(subject, unit)
+        self.search_index.update_unit(subject, unit, "")
+
+    def delete_unit(self, subject, unit):
+        self.inner.delete_unit(subject, unit)
+        self.search_index.remove_unit(subject, unit)
+
+    def save_unit(self, subject, unit, content):
+        self.inner.save_unit(subject, unit, content)
+        self.search_index.update_unit(subject, unit, content)
+
+    def save_unit_segments(self, subject, unit, segments):
+        self.inner.save_unit_segments(subject, unit, segments)
+        self.search_index.mark_stale(subject, unit)
+
+
+def wrap_repository(store, repo):
+    if store == "notes":
+        return SearchIndexedNotesRepository(repo)
+    return repo
+
+
+def main(argv):
+    from repositories import get_repository
+    import data_manager
+
+    if len(argv) < 2 or argv[1] not in ("rebuild", "query"):
+        print("usage: python notes_search.py rebuild | query <words ...>")
+        return 2
+    repo = get_repository("notes")
+    if argv[1] == "rebuild":
+        index = repo.search_index.rebuild()
+        data_manager.flush()
+        print("Indexed {0} units, {1} terms.".format(
+            len(index["docs"]), len(index["postings"])
+        ))
+        return 0
+    for hit in repo.search(" ".join(argv[2:])):
+        print(u"{0:6.2f}  {1} › {2}: {3}".format(
+            hit.score, hit.subject, hit.unit, hit.snippet
+        ))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,378 @@
+"""
+Sharded notes storage.
+
+notes.json keeps every unit body in one document, so opening the Notes
+page parses all of it and saving one unit rewrites all of it. This
+engine splits it into:
+
+    data/notes/index.json      subjects, units, complete flags,
+                               body sizes and hashes (small)
+    data/notes/units/<id>.txt  one file per unit body
+
+Startup only reads the index. A body is read when its unit is selected,
+and saving a unit writes that one body file plus the index.
+
+Large bodies can instead be kept as segments: runs of whole lines of
+about SEGMENT_CHARS, one file each, so the editor can save just the
+segments it changed (see save_unit_segments and note_editor.py).
+Replaced segment files are deleted once the index that no longer
+mentions them is on disk; anything left over after a crash is swept up
+on the next start.
+
+Convert an existing notes.json with:
+
+    python notes_store.py migrate
+"""
+
+import os
+import sys
+import uuid
+import hashlib
+
+import data_manager
+from data_manager import (
+    load_json,
+    save_json,
+    is_pending,
+    load_storage_config,
+    save_storage_config,
+)
+
+INDEX_NAME = os.path.join("notes", "index.json")
+UNITS_DIR = os.path.join("notes", "units")
+
+SEGMENT_CHARS = 64 * 1024
+
+
+def split_segments(text, size=SEGMENT_CHARS):
+    """
+    Cut text into runs of whole lines of roughly size characters.
+    "\n".join(split_segments(text)) == text.
+    """
+    if len(text) <= size:
+        return [text]
+    segments = []
+    start = 0
+    while len(text) - start > size:
+        cut = text.rfind("\n", start, start + size)
+        if cut < start:
+            # one very long line; cut at the next line break instead
+            cut = text.find("\n", start + size)
+            if cut == -1:
+                break
+        segments.append(text[start:cut])
+        start = cut + 1
+    segments.append(text[start:])
+    return segments
+
+
+def _empty_index():
+    return {"version": 1, "subjects": {}}
+
+
+def _sha1_text(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class ShardedNotesRepository:
+    """
+    Same API as repositories.JsonNotesRepository.
+
+    Index structure:
+    {
+        "version": 1,
+        "subjects": {
+            "Subject": {
+                "complete": bool,
+                "units": {
+                    "Unit": {"file": "<id>.txt", "size": int, "sha1": "..."}
+                    or
+                    "Unit": {"segments": [{"file", "size"}, ...], "size": int}
+                }
+            }
+        }
+    }
+    """
+
+    def __init__(self):
+        os.makedirs(self._units_dir(), exist_ok=True)
+        self._orphans = []  # segment files to delete once the index is saved
+        self._sweep()
+
+    # ---------- files ----------
+
+    def _units_dir(self):
+        return os.path.join(data_manager.DATA_DIR, UNITS_DIR)
+
+    def _body_path(self, entry):
+        return os.path.join(self._units_dir(), entry["file"])
+
+    def _entry_files(self, entry):
+        if "segments" in entry:
+            return [seg["file"] for seg in entry["segments"]]
+        return [entry["file"]]
+
+    def _sweep(self):
+        """
+        Delete body files the index doesn't know about (left behind by a
+        crash between writing segments and saving the index).
+        """
+        known = set()
+        for folder in self._subjects().values():
+            for entry in folder["units"].values():
+                known.update(self._entry_files(entry))
+        try:
+            names = os.listdir(self._units_dir())
+        except OSError:
+            return
+        for name in names:
+            if name not in known:
+                try:
+                    os.remove(os.path.join(self._units_dir(), name))
+                except OSError:
+                    pass
+
+    def _remove_files(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self._units_dir(), name))
+            except OSError:
+                pass
+
+    def _collect_orphans(self):
+        if self._orphans and not is_pending(INDEX_NAME):
+            self._remove_files(self._orphans)
+            self._orphans = []
+
+    def _index(self):
+        index = load_json(INDEX_NAME, _empty_index())
+        if not isinstance(index, dict) or not isinstance(
+            index.get("subjects"), dict
+        ):
+            index = _empty_index()
+            save_json(INDEX_NAME, index)
+        return index
+
+    def _subjects(self):
+        return self._index()["subjects"]
+
+    def _save_index(self):
+        save_json(INDEX_NAME, self._index())
+
+    def _write_body(self, entry, content):
+        path = self._body_path(entry)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp, path)
+        entry["size"] = len(content.encode("utf-8"))
+        entry["sha1"] = _sha1_text(content)
+
+    def _remove_body(self, entry):
+        self._remove_files(self._entry_files(entry))
+
+    def _new_entry(self):
+        return {"file": uuid.uuid4().hex + ".txt", "size": 0, "sha1": _sha1_text("")}
+
+    # ---------- subjects ----------
+
+    def subjects(self):
+        return [
+            (name, bool(info.get("complete", False)))
+            for name, info in self._subjects().items()
+        ]
+
+    def has_subject(self, name):
+        return name in self._subjects()
+
+    def add_subject(self, name):
+        self._subjects()[name] = {"complete": False, "units": {}}
+        self._save_index()
+
+    def delete_subject(self, name):
+        folder = self._subjects().pop(name, None)
+        if folder is None:
+            return
+        self._save_index()
+        for entry in folder["units"].values():
+            self._remove_body(entry)
+
+    def set_complete(self, name, complete):
+        folder = self._subjects().get(name)
+        if folder is None:
+            return
+        folder["complete"] = bool(complete)
+        self._save_index()
+
+    def completion(self):
+        subjects = self._subjects()
+        complete = sum(1 for f in subjects.values() if f.get("complete"))
+        return complete, len(subjects)
+
+    # ---------- units ----------
+
+    def units(self, subject):
+        folder = self._subjects().get(subject)
+        if folder is None:
+            return []
+        return list(folder["units"].keys())
+
+    def unit_info(self, subject, unit):
+        """
+        Index entry for a unit ({"file", "size", "sha1"} or
+        {"segments", "size"}) or None.
+        """
+        folder = self._subjects().get(subject)
+        if folder is None:
+            return None
+        return folder["units"].get(unit)
+
+    def add_unit(self, subject, unit):
+        entry = self._new_entry()
+        self._write_body(entry, "")
+        self._subjects()[subject]["units"][unit] = entry
+        self._save_index()
+
+    def delete_unit(self, subject, unit):
+        entry = self._subjects()[subject]["units"].pop(unit, None)
+        if entry is None:
+            return
+        self._save_index()
+        self._remove_body(entry)
+
+    def _read(self, entry):
+        try:
+            with open(self._body_path(entry), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return ""
+
+    def unit_content(self, subject, unit):
+        entry = self.unit_info(subject, unit)
+        if entry is None:
+            return ""
+        if "segments" in entry:
+            return "\n".join(self._read(seg) for seg in entry["segments"])
+        return self._read(entry)
+
+    def unit_segments(self, subject, unit):
+        """
+        Yield the body as segments ("\n".join gives the whole text),
+        reading segment files one at a time.
+        """
+        entry = self.unit_info(subject, unit)
+        if entry is None:
+            yield ""
+        elif "segments" in entry:
+            for seg in entry["segments"]:
+                yield self._read(seg)
+        else:
+            for text in split_segments(self._read(entry)):
+                yield text
+
+    def save_unit(self, subject, unit, content):
+        units = self._subjects()[subject]["units"]
+        entry = units.get(unit)
+        if entry is None:
+            entry = self._new_entry()
+            units[unit] = entry
+        elif "segments" in entry:
+            self._orphans.extend(self._entry_files(entry))
+            entry = self._new_entry()
+            units[unit] = entry
+        elif entry.get("sha1") == _sha1_text(content):
+            return  # unchanged, nothing to write
+        self._write_body(entry, content)
+        self._save_index()
+        self._collect_orphans()
+
+    def save_unit_segments(self, subject, unit, segments):
+        """
+        Save a body given as a list of segments, where each item is
+        either new text or the int position of a segment from the last
+        unit_segments() that is unchanged. Only new text is written.
+        """
+        units = self._subjects()[subject]["units"]
+        entry = units.get(unit)
+        old = entry.get("segments") if entry is not None else None
+        old_texts = None
+        if entry is not None and old is None:
+            # first segmented save: same cut unit_segments() handed out
+            old_texts = split_segments(self._read(entry))
+
+        new = []
+        for item in segments:
+            if isinstance(item, int) and old is not None:
+                new.append(old[item])
+                continue
+            text = old_texts[item] if isinstance(item, int) else item
+            seg = {"file": uuid.uuid4().hex + ".txt"}
+            self._write_body(seg, text)
+            del seg["sha1"]
+            new.append(seg)
+
+        kept = set(seg["file"] for seg in new)
+        if entry is not None:
+            self._orphans.extend(
+                name for name in self._entry_files(entry) if name not in kept
+            )
+        units[unit] = {
+            "segments": new,
+            "size": sum(seg["size"] for seg in new) + max(0, len(new) - 1),
+        }
+        self._save_index()
+        self._collect_orphans()
+
+
+# -------------------------------------------------------------------
+# notes.json → sharded migration
+# -------------------------------------------------------------------
+
+
+def migrate_from_json():
+    """
+    Split notes.json into the sharded layout and switch
+    data/storage.json to "notes": "sharded". notes.json itself is kept,
+    so switching back to "single" returns to the old document.
+    """
+    from repositories import JsonNotesRepository
+
+    source = JsonNotesRepository()
+    target = ShardedNotesRepository()
+
+    # Re-running the migration replaces whatever was sharded before
+    index = target._index()
+    for old_folder in index["subjects"].values():
+        for entry in old_folder["units"].values():
+            target._remove_body(entry)
+    index["subjects"] = {}
+
+    units_total = 0
+    for name, complete in source.subjects():
+        folder = {"complete": complete, "units": {}}
+        for unit in source.units(name):
+            entry = target._new_entry()
+            target._write_body(entry, source.unit_content(name, unit))
+            folder["units"][unit] = entry
+            units_total += 1
+        index["subjects"][name] = folder
+    save_json(INDEX_NAME, index)
+
+    config = load_storage_config()
+    config["notes"] = "sharded"
+    save_storage_config(config)
+    return {"subjects": len(index["subjects"]), "units": units_total}
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] != "migrate":
+        print("usage: python notes_store.py migrate")
+        return 2
+    counts = migrate_from_json()
+    data_manager.flush()
+    print("Migrated {subjects} subjects / {units} units.".format(**counts))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,3 +1,5 @@
+import time
+
 from PyQt5.QtWidgets import (
     QWidget,
     QPushButton,
@@ -8,6 +10,7 @@ from PyQt5.QtWidgets import (
     QTextEdit,
     QListWidget,
     QListWidgetItem,
+    QListView,
     QComboBox,
     QMessageBox,
     QCalendarWidget,
@@ -15,6 +18,8 @@ from PyQt5.QtWidgets import (
     QGridLayout,
     QFrame,
     QInputDialog,
+    QFileDialog,
+    QProgressDialog,
 )
 from PyQt5.QtCore import (
     Qt,
@@ -23,7 +28,10 @@ from PyQt5.QtCore import (
     QPropertyAnimation,
     QRectF,
     QDate,
+    QDateTime,
     pyqtProperty,
+    pyqtSignal,
+    QObject,
     QEasingCurve,
 )
 from PyQt5.QtGui import (
@@ -34,31 +42,30 @@ from PyQt5.QtGui import (
     QColor,
     QPen,
     QFont,
+    QTextCursor,
+    QPalette,
 )
 
-from data_manager import (
-    load_json,
-    save_json,
-    load_users,
-    save_users,
-    load_settings,
-    save_settings,
-)
-
-# ---------- Shared styles (colors come from theme stylesheet) ----------
-
-CARD_STYLE = """
-    border-radius: 18px;
-    padding: 18px;
-"""
-
-BUTTON_STYLE = """
-    border-radius: 14px;
-    padding: 7px 16px;
-"""
-
-TITLE_STYLE = "font-size: 22px; font-weight: 600; margin-bottom: 8px;"
-TEXT_STYLE = "font-size: 14px;"
+from data_manager import load_settings, save_settings
+from repositories import get_repository
+from stats import get_stats
+from task_index import get_task_index
+from todo_model import TodoBucketModel
+from srs import get_review_queue
+from card_import import import_steps
+from note_editor import ChunkedNoteLoader
+from autosave import NotesAutosave, list_drafts, restore_draft, discard_draft
+from link_meta import get_link_fetcher, link_label, icon_path
+from schedule_index import AGENDA_DAYS
+from recurrence import get_recurrence
+from focus_timer import Countdown, format_seconds
+from session_log import get_session_log, format_duration
+import ics_io
+
+# ---------- Shared styles ----------
+# All styling lives in the window stylesheet (themes.py). Widgets that
+# need a special look get one of its object names instead of an inline
+# setStyleSheet(), so theme switches don't re-polish every widget.
 
 
 def make_open_window_icon(size=20):
@@ -80,76 +87,6 @@ def make_open_window_icon(size=20):
     return QIcon(pix)
 
 
-# ---------- Helpers for legacy data ----------
-
-def normalize_notes_data(data):
-    """
-    Normalise any previous notes.json format into:
-    {
-        "folders": {
-            "Subject": {
-                "complete": bool,
-                "units": {
-                    "Unit name": {"content": "..."}
-                }
-            }
-        }
-    }
-    """
-    if not isinstance(data, dict):
-        data = {}
-    folders = data.get("folders", {})
-
-    # If folders is a list of names, convert
-    if isinstance(folders, list):
-        new_f = {}
-        for f in folders:
-            if isinstance(f, str):
-                new_f[f] = {"complete": False, "units": {}}
-        folders = new_f
-
-    if not isinstance(folders, dict):
-        folders = {}
-
-    changed = False
-    for name, val in list(folders.items()):
-        if isinstance(val, dict):
-            # Old shape: {"content": "..."}
-            if "units" not in val and "content" in val:
-                content = val.get("content", "")
-                folders[name] = {
-                    "complete": False,
-                    "units": {"General": {"content": content}},
-                }
-                changed = True
-            else:
-                if "complete" not in val:
-                    val["complete"] = False
-                    changed = True
-                if "units" not in val or not isinstance(val["units"], dict):
-                    val["units"] = {}
-                    changed = True
-        else:
-            folders[name] = {"complete": False, "units": {}}
-            changed = True
-
-    data["folders"] = folders
-    if changed:
-        save_json("notes.json", data)
-    return data
-
-
-def normalize_schedule_data(raw):
-    """
-    Legacy schedule.json might be a list; new is a dict.
-    """
-    if isinstance(raw, list):
-        return {"__all__": raw}
-    if not isinstance(raw, dict):
-        return {}
-    return raw
-
-
 # ================== Multi-ring circular progress ==================
 
 
@@ -286,6 +223,60 @@ class MultiRingProgress(QWidget):
         p.end()
 
 
+# ================== Calendar with entry badges ==================
+
+
+class BadgeCalendar(QCalendarWidget):
+    """
+    QCalendarWidget that paints the number of schedule entries in the
+    corner of each day. Counts come from one range query over the
+    visible 6-week grid whenever the month changes (or refresh_badges()
+    is called), not from a lookup per painted cell.
+    """
+
+    def __init__(self, range_counts, parent=None):
+        super().__init__(parent)
+        self._range_counts = range_counts  # (start, end) -> [(day, n), ...]
+        self._badges = {}
+        self.currentPageChanged.connect(lambda *_: self.refresh_badges())
+        self.refresh_badges()
+
+    def visible_range(self):
+        first = QDate(self.yearShown(), self.monthShown(), 1)
+        offset = (first.dayOfWeek() - int(self.firstDayOfWeek())) % 7
+        start = first.addDays(-offset)
+        return start, start.addDays(6 * 7 - 1)
+
+    def refresh_badges(self):
+        start, end = self.visible_range()
+        counts = self._range_counts(
+            start.toString("yyyy-MM-dd"), end.toString("yyyy-MM-dd")
+        )
+        self._badges = dict(counts)
+        self.updateCells()
+
+    def paintCell(self, painter, rect, date):
+        super().paintCell(painter, rect, date)
+        count = self._badges.get(date.toString("yyyy-MM-dd"))
+        if not count:
+            return
+        text = str(count) if count < 100 else "99+"
+        painter.save()
+        font = painter.font()
+        font.setPointSizeF(max(6.0, font.pointSizeF() * 0.7))
+        font.setBold(True)
+        painter.setFont(font)
+        width = max(14, painter.fontMetrics().horizontalAdvance(text) + 6)
+        badge = QRectF(rect.right() - width - 1, rect.top() + 1, width, 14)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(self.palette().color(QPalette.Highlight))
+        painter.drawRoundedRect(badge, 7, 7)
+        painter.setPen(self.palette().color(QPalette.HighlightedText))
+        painter.drawText(badge, Qt.AlignCenter, text)
+        painter.restore()
+
+
 # ================= BASE PAGE =================
 
 
@@ -298,7 +289,6 @@ class BasePage(QWidget):
     def add_back(self, layout: QVBoxLayout):
         if self.goto_page is not None and not self.standalone:
             back = QPushButton("← Back to Dashboard")
-            back.setStyleSheet(BUTTON_STYLE)
             back.clicked.connect(lambda: self.goto_page("dashboard"))
             layout.addWidget(back)
 
@@ -317,12 +307,12 @@ class LoginPage(QWidget):
 
         title = QLabel("Study Helper")
         title.setAlignment(Qt.AlignCenter)
-        title.setStyleSheet("font-size: 26px; font-weight: 600; margin-bottom: 10px;")
+        title.setObjectName("loginTitle")
         layout.addWidget(title)
 
         subtitle = QLabel("Log in or sign up to continue")
         subtitle.setAlignment(Qt.AlignCenter)
-        subtitle.setStyleSheet("color: #666666;")
+        subtitle.setObjectName("mutedLabel")
         layout.addWidget(subtitle)
 
         self.username_input = QLineEdit()
@@ -339,9 +329,6 @@ class LoginPage(QWidget):
         signup_btn = QPushButton("Sign up")
         delete_btn = QPushButton("Delete User")
 
-        for b in (login_btn, signup_btn, delete_btn):
-            b.setStyleSheet(BUTTON_STYLE)
-
         login_btn.clicked.connect(self.handle_login)
         signup_btn.clicked.connect(self.handle_signup)
         delete_btn.clicked.connect(self.handle_delete)
@@ -370,11 +357,11 @@ class LoginPage(QWidget):
         username, password = self._get_credentials()
         if not username:
             return
-        users = load_users()
-        if username not in users:
+        stored = get_repository("users").get_password(username)
+        if stored is None:
             QMessageBox.warning(self, "User not found", "This username does not exist. Try signing up.")
             return
-        if users[username] != password:
+        if stored != password:
             QMessageBox.warning(self, "Wrong password", "The password you entered is incorrect.")
             return
         self.finish_login(username)
@@ -383,12 +370,11 @@ class LoginPage(QWidget):
         username, password = self._get_credentials()
         if not username:
             return
-        users = load_users()
-        if username in users:
+        users = get_repository("users")
+        if users.get_password(username) is not None:
             QMessageBox.warning(self, "User exists", "This username is already taken. Try logging in.")
             return
-        users[username] = password
-        save_users(users)
+        users.add_user(username, password)
         QMessageBox.information(self, "Account created", "Your account has been created.")
         self.finish_login(username)
 
@@ -396,11 +382,12 @@ class LoginPage(QWidget):
         username, password = self._get_credentials()
         if not username:
             return
-        users = load_users()
-        if username not in users:
+        users = get_repository("users")
+        stored = users.get_password(username)
+        if stored is None:
             QMessageBox.warning(self, "User not found", "That user does not exist.")
             return
-        if users[username] != password:
+        if stored != password:
             QMessageBox.warning(self, "Wrong password", "Password incorrect.")
             return
         confirm = QMessageBox.question(
@@ -412,8 +399,7 @@ class LoginPage(QWidget):
             QMessageBox.Yes | QMessageBox.No,
         )
         if confirm == QMessageBox.Yes:
-            del users[username]
-            save_users(users)
+            users.delete_user(username)
             settings = load_settings()
             if settings.get("last_user") == username:
                 settings["last_user"] = ""
@@ -435,6 +421,7 @@ class DashboardPage(QWidget):
     """
     New dashboard:
     - Only big concentric progress rings
+    - Focus time today and this week (under the rings)
     - Today's To-Do (all pending tasks)
     - Today's Schedule (today's entries)
     """
@@ -454,17 +441,17 @@ class DashboardPage(QWidget):
         top_row = QHBoxLayout()
         title = QLabel("Dashboard")
         title.setAlignment(Qt.AlignLeft | Qt.AlignVCenter)
-        title.setStyleSheet("font-size: 24px; font-weight: 600;")
+        title.setObjectName("dashboardTitle")
         top_row.addWidget(title)
 
         self.user_label = QLabel("")
-        self.user_label.setStyleSheet("margin-left: 12px; color: #777777;")
+        self.user_label.setObjectName("userLabel")
         top_row.addWidget(self.user_label, stretch=0)
 
         top_row.addStretch()
 
         logout_btn = QPushButton("Logout")
-        logout_btn.setStyleSheet(BUTTON_STYLE + "font-size: 12px; padding: 4px 10px;")
+        logout_btn.setObjectName("smallButton")
         logout_btn.clicked.connect(self.logout)
         top_row.addWidget(logout_btn)
 
@@ -472,7 +459,7 @@ class DashboardPage(QWidget):
 
         # Center: progress rings
         rings_frame = QFrame()
-        rings_frame.setStyleSheet(CARD_STYLE)
+        rings_frame.setObjectName("card")
         rings_layout = QVBoxLayout()
         rings_layout.setContentsMargins(18, 18, 18, 18)
         rings_frame.setLayout(rings_layout)
@@ -480,6 +467,10 @@ class DashboardPage(QWidget):
         self.progress_rings = MultiRingProgress(self.get_theme_colors)
         rings_layout.addWidget(self.progress_rings, alignment=Qt.AlignCenter)
 
+        self.focus_label = QLabel("")
+        self.focus_label.setAlignment(Qt.AlignCenter)
+        rings_layout.addWidget(self.focus_label)
+
         main.addWidget(rings_frame)
 
         # Bottom: two cards side by side: Today's To-Do, Today's Schedule
@@ -487,34 +478,34 @@ class DashboardPage(QWidget):
 
         # Today's To-Do
         todo_frame = QFrame()
-        todo_frame.setStyleSheet(CARD_STYLE)
+        todo_frame.setObjectName("card")
         todo_layout = QVBoxLayout()
         todo_layout.setContentsMargins(12, 12, 12, 12)
         todo_frame.setLayout(todo_layout)
 
         todo_title = QLabel("Today's To-Do")
-        todo_title.setStyleSheet("font-size: 16px; font-weight: 600; margin-bottom: 6px;")
+        todo_title.setObjectName("cardTitle")
         todo_layout.addWidget(todo_title)
 
         self.todo_list = QListWidget()
-        self.todo_list.setStyleSheet("font-size: 13px;")
+        self.todo_list.setObjectName("compactList")
         todo_layout.addWidget(self.todo_list)
 
         bottom_row.addWidget(todo_frame)
 
         # Today's Schedule
         sched_frame = QFrame()
-        sched_frame.setStyleSheet(CARD_STYLE)
+        sched_frame.setObjectName("card")
         sched_layout = QVBoxLayout()
         sched_layout.setContentsMargins(12, 12, 12, 12)
         sched_frame.setLayout(sched_layout)
 
         self.today_label = QLabel("")
-        self.today_label.setStyleSheet("font-size: 16px; font-weight: 600; margin-bottom: 6px;")
+        self.today_label.setObjectName("cardTitle")
         sched_layout.addWidget(self.today_label)
 
         self.today_list = QListWidget()
-        self.today_list.setStyleSheet("font-size: 13px;")
+        self.today_list.setObjectName("compactList")
         sched_layout.addWidget(self.today_list)
 
         bottom_row.addWidget(sched_frame)
@@ -524,6 +515,8 @@ class DashboardPage(QWidget):
         main.addStretch(1)
         self.setLayout(main)
 
+        # store version each list was last drawn from
+        self._shown_versions = {}
         self.refresh()
 
     def theme_changed(self):
@@ -537,39 +530,42 @@ class DashboardPage(QWidget):
         else:
             self.user_label.setText("Not logged in")
 
-        # --- Load To-Do stats ---
-        todos = load_json("todos.json", [])
-        total_tasks = len(todos)
-        done_tasks = sum(1 for t in todos if t.get("done"))
-        pending_tasks = [t for t in todos if not t.get("done")]
-
-        # show all pending tasks
-        self.todo_list.clear()
-        if not pending_tasks:
-            self.todo_list.addItem("You're all caught up! ✨")
-        else:
-            for t in pending_tasks:
-                label = u"[{0}] {1}".format(
-                    t.get("priority", "Low"),
-                    t.get("text", ""),
-                )
-                item = QListWidgetItem(label)
-                self.todo_list.addItem(item)
+        # Counters are kept up to date by the repositories (see stats.py)
+        stats = get_stats()
+        versions = stats["versions"]
+
+        # --- To-Do stats ---
+        total_tasks = stats["tasks_total"]
+        done_tasks = stats["tasks_done"]
+
+        # show all pending tasks (only rebuilt when the tasks changed)
+        if versions["todos"] != self._shown_versions.get("todos"):
+            self._shown_versions["todos"] = versions["todos"]
+            pending_tasks = [
+                t for t in get_repository("todos").all() if not t.get("done")
+            ]
+            self.todo_list.clear()
+            if not pending_tasks:
+                self.todo_list.addItem("You're all caught up! ✨")
+            else:
+                for t in pending_tasks:
+                    label = u"[{0}] {1}".format(
+                        t.get("priority", "Low"),
+                        t.get("text", ""),
+                    )
+                    item = QListWidgetItem(label)
+                    self.todo_list.addItem(item)
 
         tasks_ratio = (float(done_tasks) / float(total_tasks)) if total_tasks > 0 else 0.0
 
         # --- Flashcards stats ---
-        cards = load_json("flashcards.json", [])
-        total_cards = len(cards)
-        known_cards = sum(1 for c in cards if c.get("known"))
+        total_cards = stats["cards_total"]
+        known_cards = stats["cards_known"]
         flash_ratio = (float(known_cards) / float(total_cards)) if total_cards > 0 else 0.0
 
         # --- Notes stats (folders complete) ---
-        notes_raw = load_json("notes.json", {"folders": {}})
-        notes_data = normalize_notes_data(notes_raw)
-        folders = notes_data.get("folders", {})
-        total_folders = len(folders)
-        complete_folders = sum(1 for f in folders.values() if f.get("complete"))
+        complete_folders = stats["folders_complete"]
+        total_folders = stats["folders_total"]
         notes_ratio = (
             float(complete_folders) / float(total_folders) if total_folders > 0 else 0.0
         )
@@ -582,30 +578,56 @@ class DashboardPage(QWidget):
         ]
         self.progress_rings.set_items(items)
 
-        # --- Today's schedule ---
-        raw_schedule = load_json("schedule.json", {})
-        schedule = normalize_schedule_data(raw_schedule)
+        # --- Focus time (rollups kept by session_log.py) ---
+        sessions = get_session_log()
+        today = QDate.currentDate().toString("yyyy-MM-dd")
+        shown = (today, sessions.rev)
+        if shown != self._shown_versions.get("focus"):
+            self._shown_versions["focus"] = shown
+            seconds, count, completed = sessions.day(today)
+            week_seconds, _, _ = sessions.week(today)
+            self.focus_label.setText(
+                u"Focus today: {0} ({1} of {2} sessions completed) · "
+                u"this week: {3}".format(
+                    format_duration(seconds),
+                    completed,
+                    count,
+                    format_duration(week_seconds),
+                )
+            )
 
+        # --- Today's schedule ---
         today = QDate.currentDate().toString("yyyy-MM-dd")
-        self.today_label.setText(u"Today's Schedule — {0}".format(today))
-        self.today_list.clear()
-        entries = schedule.get(today, [])
-        if not entries:
-            self.today_list.addItem("No entries for today.")
-        else:
-            for e in entries:
-                self.today_list.addItem(e)
+        recurrence = get_recurrence()
+        shown = (today, versions["schedule"], recurrence.rev)
+        if shown != self._shown_versions.get("schedule"):
+            self._shown_versions["schedule"] = shown
+            self.today_label.setText(u"Today's Schedule — {0}".format(today))
+            self.today_list.clear()
+            entries = []
+            if stats["schedule_counts"].get(today, 0):
+                entries = get_repository("schedule").entries(today)
+            for occ in recurrence.occurrences(today, today):
+                entries.append(u"↻ " + occ.text)
+            if not entries:
+                self.today_list.addItem("No entries for today.")
+            else:
+                for e in entries:
+                    self.today_list.addItem(e)
 
 
 # ================= TODO PAGE =================
 
 
 class TodoPage(BasePage):
-    FNAME = "todos.json"
+    STORE = "todos"
 
     def __init__(self, goto_page, standalone=False):
         super().__init__(goto_page, standalone)
-        self.data = load_json(self.FNAME, [])  # list of {text, priority, done}
+        # Shared with every other open To-Do page; edits touch single rows
+        self.tasks = get_task_index()
+        self.pending_model = TodoBucketModel(self.tasks, done=False)
+        self.done_model = TodoBucketModel(self.tasks, done=True)
 
         layout = QVBoxLayout()
         layout.setAlignment(Qt.AlignTop)
@@ -613,26 +635,33 @@ class TodoPage(BasePage):
 
         title = QLabel("To-Do List")
         title.setAlignment(Qt.AlignCenter)
-        title.setStyleSheet(TITLE_STYLE)
+        title.setObjectName("pageTitle")
         layout.addWidget(title)
 
         filter_row = QHBoxLayout()
         filter_label = QLabel("Priority filter:")
         self.filter_combo = QComboBox()
         self.filter_combo.addItems(["All", "High", "Medium", "Low"])
-        self.filter_combo.currentIndexChanged.connect(self.refresh)
+        self.filter_combo.currentIndexChanged.connect(self.apply_filter)
         filter_row.addWidget(filter_label)
         filter_row.addWidget(self.filter_combo)
         layout.addLayout(filter_row)
 
         lists_row = QHBoxLayout()
-        self.pending_list = QListWidget()
-        self.pending_list.setStyleSheet("font-size: 13px;")
-        self.done_list = QListWidget()
-        self.done_list.setStyleSheet("font-size: 13px; color: #888888;")
+        self.pending_list = self._make_view(self.pending_model, "compactList")
+        self.done_list = self._make_view(self.done_model, "doneList")
         lists_row.addWidget(self.pending_list)
         lists_row.addWidget(self.done_list)
         layout.addLayout(lists_row)
+        # Delete acts on whichever list was picked from last
+        self._active_view = None
+        for view, other in (
+            (self.pending_list, self.done_list),
+            (self.done_list, self.pending_list),
+        ):
+            view.selectionModel().selectionChanged.connect(
+                lambda *_, view=view, other=other: self._selection_changed(view, other)
+            )
 
         input_row = QHBoxLayout()
         self.task_input = QLineEdit()
@@ -642,7 +671,6 @@ class TodoPage(BasePage):
         self.priority_select.addItems(["High", "Medium", "Low"])
 
         add_btn = QPushButton("Add")
-        add_btn.setStyleSheet(BUTTON_STYLE)
         add_btn.clicked.connect(self.add_task)
 
         input_row.addWidget(self.task_input)
@@ -654,8 +682,6 @@ class TodoPage(BasePage):
         to_done = QPushButton("Pending → Done")
         to_todo = QPushButton("Done → Pending")
         delete_btn = QPushButton("Delete selected")
-        for b in (to_done, to_todo, delete_btn):
-            b.setStyleSheet(BUTTON_STYLE)
         to_done.clicked.connect(self.pending_to_done)
         to_todo.clicked.connect(self.done_to_pending)
         delete_btn.clicked.connect(self.delete_selected)
@@ -665,46 +691,24 @@ class TodoPage(BasePage):
         layout.addLayout(actions_row)
 
         self.setLayout(layout)
-        self.refresh()
 
-    def _load_data(self):
-        self.data = load_json(self.FNAME, [])
-
-    def _save_data(self):
-        save_json(self.FNAME, self.data)
-
-    def _style_item(self, lw_item, priority, done):
-        if priority == "High":
-            color = "#ff6b6b"
-        elif priority == "Medium":
-            color = "#ffb347"
-        else:
-            color = "#6bd36b"
-        if done:
-            lw_item.setForeground(QColor("#888888"))
-        else:
-            lw_item.setForeground(QColor(color))
+    def _make_view(self, model, object_name):
+        view = QListView()
+        view.setObjectName(object_name)
+        view.setModel(model)
+        # Lets the view skip measuring every row; matters with 10k+ tasks
+        view.setUniformItemSizes(True)
+        view.setEditTriggers(QListView.NoEditTriggers)
+        return view
 
     def refresh(self):
-        self._load_data()
-        self.pending_list.clear()
-        self.done_list.clear()
-
-        filt = self.filter_combo.currentText()
-        for item in self.data:
-            if filt != "All" and item.get("priority") != filt:
-                continue
-            label = u"[{0}] {1}".format(
-                item.get("priority", "Low"),
-                item.get("text", ""),
-            )
-            lw = QListWidgetItem(label)
-            done = item.get("done")
-            self._style_item(lw, item.get("priority", "Low"), done)
-            if done:
-                self.done_list.addItem(lw)
-            else:
-                self.pending_list.addItem(lw)
+        # Only needed when the data changed behind the index's back
+        self.tasks.reload()
+
+    def apply_filter(self):
+        priority = self.filter_combo.currentText()
+        self.pending_model.set_priority(priority)
+        self.done_model.set_priority(priority)
 
     def add_task(self):
         txt = self.task_input.text().strip()
@@ -712,68 +716,58 @@ class TodoPage(BasePage):
             QMessageBox.information(self, "Empty task", "Please type a task before adding.")
             return
         priority = self.priority_select.currentText()
-        self.data.append({"text": txt, "priority": priority, "done": False})
-        self._save_data()
+        self.tasks.add(txt, priority)
         self.task_input.clear()
-        self.refresh()
 
-    def _find_item_index(self, text, done_flag):
-        for i, item in enumerate(self.data):
-            if item.get("done") == done_flag:
-                label = u"[{0}] {1}".format(
-                    item.get("priority", "Low"),
-                    item.get("text", ""),
-                )
-                if label == text:
-                    return i
-        return None
+    def _selection_changed(self, view, other):
+        if view.selectionModel().hasSelection():
+            self._active_view = view
+            other.clearSelection()
+        elif self._active_view is view:
+            self._active_view = None
+
+    def _selected_id(self, view):
+        # The current index survives row removals (Qt moves it to a
+        # neighbour), so only an explicit selection counts
+        if view is None:
+            return None
+        indexes = view.selectionModel().selectedIndexes()
+        if not indexes:
+            return None
+        return view.model().task_id(indexes[0])
 
     def pending_to_done(self):
-        item = self.pending_list.currentItem()
-        if not item:
+        task_id = self._selected_id(self.pending_list)
+        if task_id is None:
             QMessageBox.information(self, "No task selected", "Choose a task in the left list.")
             return
-        idx = self._find_item_index(item.text(), False)
-        if idx is not None:
-            self.data[idx]["done"] = True
-            self._save_data()
-            self.refresh()
+        self.tasks.update(task_id, done=True)
 
     def done_to_pending(self):
-        item = self.done_list.currentItem()
-        if not item:
+        task_id = self._selected_id(self.done_list)
+        if task_id is None:
             QMessageBox.information(self, "No task selected", "Choose a task in the right list.")
             return
-        idx = self._find_item_index(item.text(), True)
-        if idx is not None:
-            self.data[idx]["done"] = False
-            self._save_data()
-            self.refresh()
+        self.tasks.update(task_id, done=False)
 
     def delete_selected(self):
-        item = self.pending_list.currentItem() or self.done_list.currentItem()
-        if not item:
+        task_id = self._selected_id(self._active_view)
+        if task_id is None:
             QMessageBox.information(self, "No task selected", "Pick a task to delete.")
             return
-        idx = self._find_item_index(item.text(), False)
-        if idx is None:
-            idx = self._find_item_index(item.text(), True)
-        if idx is not None:
-            del self.data[idx]
-            self._save_data()
-            self.refresh()
+        self.tasks.delete(task_id)
 
 
 # ================= NOTES PAGE =================
 
 
 class NotesPage(BasePage):
-    FNAME = "notes.json"
+    STORE = "notes"
+    _drafts_offered = False  # once per run, not once per page instance
 
     def __init__(self, goto_page, standalone=False):
         super().__init__(goto_page, standalone)
-        raw = load_json(self.FNAME, {"folders": {}})
-        self.data = normalize_notes_data(raw)
+        self.repo = get_repository(self.STORE)
         self.current_subject = None
         self.current_unit = None
 
@@ -783,9 +777,29 @@ class NotesPage(BasePage):
 
         title = QLabel("Notes")
         title.setAlignment(Qt.AlignCenter)
-        title.setStyleSheet(TITLE_STYLE)
+        title.setObjectName("pageTitle")
         layout.addWidget(title)
 
+        # Search across all subjects / units
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search notes…")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self.run_search)
+        self.search_input.textChanged.connect(lambda _: self.search_timer.start())
+        self.search_input.returnPressed.connect(self.run_search)
+        layout.addWidget(self.search_input)
+
+        self.search_results = QListWidget()
+        self.search_results.setObjectName("compactList")
+        self.search_results.setMaximumHeight(160)
+        self.search_results.itemActivated.connect(self.open_search_hit)
+        self.search_results.itemClicked.connect(self.open_search_hit)
+        self.search_results.hide()
+        layout.addWidget(self.search_results)
+
         main_row = QHBoxLayout()
 
         # Left: subjects list
@@ -794,12 +808,10 @@ class NotesPage(BasePage):
         subj_header_row.addWidget(QLabel("Subjects"))
 
         delete_subject_btn = QPushButton("Delete subject")
-        delete_subject_btn.setStyleSheet(BUTTON_STYLE)
         delete_subject_btn.clicked.connect(self.delete_subject)
         subj_header_row.addWidget(delete_subject_btn)
 
         complete_btn = QPushButton("Mark folder complete")
-        complete_btn.setStyleSheet(BUTTON_STYLE)
         complete_btn.clicked.connect(self.toggle_subject_complete)
         subj_header_row.addWidget(complete_btn)
 
@@ -818,7 +830,6 @@ class NotesPage(BasePage):
         self.subject_input = QLineEdit()
         self.subject_input.setPlaceholderText("New subject…")
         subj_add_btn = QPushButton("Add")
-        subj_add_btn.setStyleSheet(BUTTON_STYLE)
         subj_add_btn.clicked.connect(self.add_subject)
         subj_add_row.addWidget(self.subject_input)
         subj_add_row.addWidget(subj_add_btn)
@@ -841,25 +852,29 @@ class NotesPage(BasePage):
         unit_row.addWidget(self.unit_combo)
 
         add_unit_btn = QPushButton("Add unit")
-        add_unit_btn.setStyleSheet(BUTTON_STYLE)
         add_unit_btn.clicked.connect(self.add_unit)
         unit_row.addWidget(add_unit_btn)
 
         del_unit_btn = QPushButton("Delete unit")
-        del_unit_btn.setStyleSheet(BUTTON_STYLE)
         del_unit_btn.clicked.connect(self.delete_unit)
         unit_row.addWidget(del_unit_btn)
 
         right_col.addLayout(unit_row)
 
         self.text_edit = QTextEdit()
-        self.text_edit.setStyleSheet("font-size: 16px;")
+        self.text_edit.setObjectName("noteEditor")
+        self.note_loader = ChunkedNoteLoader(self.text_edit)
+        self.autosave = NotesAutosave(self.note_loader)
         right_col.addWidget(self.text_edit)
 
+        save_row = QHBoxLayout()
         save_btn = QPushButton("Save notes")
-        save_btn.setStyleSheet(BUTTON_STYLE)
         save_btn.clicked.connect(self.save_notes)
-        right_col.addWidget(save_btn)
+        save_row.addWidget(save_btn)
+        self.save_status = QLabel("")
+        self.save_status.setObjectName("mutedLabel")
+        save_row.addWidget(self.save_status, 1)
+        right_col.addLayout(save_row)
 
         right_widget = QWidget()
         right_widget.setLayout(right_col)
@@ -869,11 +884,13 @@ class NotesPage(BasePage):
         self.setLayout(layout)
 
         self.refresh_subjects()
+        if not NotesPage._drafts_offered:
+            NotesPage._drafts_offered = True
+            QTimer.singleShot(0, self.offer_draft_restore)
 
     def refresh_subjects(self):
         self.subject_list.clear()
-        for name, info in self.data["folders"].items():
-            complete = info.get("complete", False)
+        for name, complete in self.repo.subjects():
             label = u"✓ {0}".format(name) if complete else name
             item = QListWidgetItem(label)
             item.setData(Qt.UserRole, name)
@@ -884,11 +901,10 @@ class NotesPage(BasePage):
         if not name:
             QMessageBox.information(self, "No name", "Type a subject name.")
             return
-        if name in self.data["folders"]:
+        if self.repo.has_subject(name):
             QMessageBox.information(self, "Exists", "That subject already exists.")
             return
-        self.data["folders"][name] = {"complete": False, "units": {}}
-        save_json(self.FNAME, self.data)
+        self.repo.add_subject(name)
         self.subject_input.clear()
         self.refresh_subjects()
 
@@ -903,11 +919,14 @@ class NotesPage(BasePage):
             QMessageBox.Yes | QMessageBox.No,
         )
         if confirm == QMessageBox.Yes:
-            self.data["folders"].pop(self.current_subject, None)
-            save_json(self.FNAME, self.data)
+            self.autosave.saved()
+            self.autosave.set_unit(None, None)
+            for unit in self.repo.units(self.current_subject):
+                discard_draft(self.current_subject, unit)
+            self.repo.delete_subject(self.current_subject)
             self.current_subject = None
             self.current_unit = None
-            self.text_edit.clear()
+            self.note_loader.clear()
             self.unit_combo.clear()
             self.subject_title.setText("No subject selected")
             self.refresh_subjects()
@@ -916,9 +935,8 @@ class NotesPage(BasePage):
         if not self.current_subject:
             QMessageBox.information(self, "No subject", "Select a subject first.")
             return
-        folder = self.data["folders"].get(self.current_subject, {})
-        folder["complete"] = not folder.get("complete", False)
-        save_json(self.FNAME, self.data)
+        complete = dict(self.repo.subjects()).get(self.current_subject, False)
+        self.repo.set_complete(self.current_subject, not complete)
         self.refresh_subjects()
 
     def select_subject(self, display_name):
@@ -938,35 +956,33 @@ class NotesPage(BasePage):
         if not self.current_subject:
             self.unit_combo.blockSignals(False)
             return
-        units = self.data["folders"][self.current_subject]["units"]
-        for unit_name in units.keys():
+        units = self.repo.units(self.current_subject)
+        for unit_name in units:
             self.unit_combo.addItem(unit_name)
         self.unit_combo.blockSignals(False)
         if units:
-            first = next(iter(units.keys()))
+            first = units[0]
             self.unit_combo.setCurrentText(first)
             self.select_unit(first)
         else:
+            self.autosave.set_unit(None, None)
             self.current_unit = None
-            self.text_edit.clear()
+            self.note_loader.clear()
 
     def add_unit(self):
         if not self.current_subject:
             QMessageBox.information(self, "No subject", "Select a subject first.")
             return
-        suggested = u"Unit {0}".format(
-            len(self.data["folders"][self.current_subject]["units"]) + 1
-        )
+        units = self.repo.units(self.current_subject)
+        suggested = u"Unit {0}".format(len(units) + 1)
         text, ok = QInputDialog.getText(self, "New unit", "Unit name:", text=suggested)
         if not ok or not text.strip():
             return
         name = text.strip()
-        units = self.data["folders"][self.current_subject]["units"]
         if name in units:
             QMessageBox.information(self, "Exists", "That unit already exists.")
             return
-        units[name] = {"content": ""}
-        save_json(self.FNAME, self.data)
+        self.repo.add_unit(self.current_subject, name)
         self.refresh_units()
         self.unit_combo.setCurrentText(name)
         self.select_unit(name)
@@ -982,52 +998,126 @@ class NotesPage(BasePage):
             QMessageBox.Yes | QMessageBox.No,
         )
         if confirm == QMessageBox.Yes:
-            units = self.data["folders"][self.current_subject]["units"]
-            units.pop(self.current_unit, None)
-            save_json(self.FNAME, self.data)
+            self.autosave.saved()
+            self.repo.delete_unit(self.current_subject, self.current_unit)
             self.current_unit = None
             self.refresh_units()
 
     def select_unit(self, unit_name):
         if not self.current_subject or not unit_name:
             return
+        self.autosave.set_unit(self.current_subject, unit_name)
         self.current_unit = unit_name
-        content = (
-            self.data["folders"][self.current_subject]["units"]
-            .get(unit_name, {})
-            .get("content", "")
-        )
-        self.text_edit.setPlainText(content)
+        self.save_status.setText("")
+        self.note_loader.load(self.repo, self.current_subject, unit_name)
 
     def save_notes(self):
         if not self.current_subject or not self.current_unit:
             QMessageBox.information(self, "No unit", "Select subject and unit first.")
             return
-        self.data["folders"][self.current_subject]["units"][self.current_unit][
-            "content"
-        ] = self.text_edit.toPlainText()
-        save_json(self.FNAME, self.data)
-        QMessageBox.information(self, "Saved", "Notes saved.")
+        self.note_loader.save(self.repo, self.current_subject, self.current_unit)
+        self.autosave.saved()
+        self.save_status.setText(
+            u"Saved at {0}".format(QDateTime.currentDateTime().toString("HH:mm"))
+        )
+
+    def hideEvent(self, event):
+        self.autosave.write_now()
+        super().hideEvent(event)
+
+    # ---------- recovery drafts ----------
+
+    def offer_draft_restore(self):
+        drafts = list_drafts()
+        if not drafts:
+            return
+        names = u"\n".join(
+            u"• {0} › {1}".format(d["subject"], d["unit"]) for d in drafts[:10]
+        )
+        if len(drafts) > 10:
+            names += u"\n… and {0} more".format(len(drafts) - 10)
+        answer = QMessageBox.question(
+            self,
+            "Restore notes",
+            u"These notes have unsaved changes from the last session:\n\n{0}"
+            u"\n\nRestore them? (No discards the changes.)".format(names),
+            QMessageBox.Yes | QMessageBox.No,
+        )
+        failed = []
+        for draft in drafts:
+            if answer == QMessageBox.Yes and not restore_draft(self.repo, draft):
+                failed.append(u"{0} › {1}".format(draft["subject"], draft["unit"]))
+            discard_draft(draft["subject"], draft["unit"])
+        if failed:
+            QMessageBox.information(
+                self,
+                "Not restored",
+                u"These units were deleted or saved again since, so their "
+                u"drafts were dropped:\n\n{0}".format(u"\n".join(failed)),
+            )
+        if self.current_subject and self.current_unit:
+            self.select_unit(self.current_unit)
+
+    # ---------- search ----------
+
+    def run_search(self):
+        self.search_timer.stop()
+        query = self.search_input.text().strip()
+        self.search_results.clear()
+        if not query:
+            self.search_results.hide()
+            return
+        hits = self.repo.search(query)
+        if not hits:
+            self.search_results.addItem(QListWidgetItem("No matches."))
+        for hit in hits:
+            item = QListWidgetItem(
+                u"{0} › {1} — {2}".format(hit.subject, hit.unit, hit.snippet)
+            )
+            item.setData(Qt.UserRole, hit)
+            self.search_results.addItem(item)
+        self.search_results.show()
+
+    def open_search_hit(self, item):
+        hit = item.data(Qt.UserRole)
+        if hit is None:
+            return
+        for row in range(self.subject_list.count()):
+            if self.subject_list.item(row).data(Qt.UserRole) == hit.subject:
+                self.subject_list.setCurrentRow(row)
+                break
+        else:
+            return
+        if self.current_unit != hit.unit:
+            self.unit_combo.setCurrentText(hit.unit)
+            self.select_unit(hit.unit)
+        if hit.offset is None:
+            return
+        self.note_loader.finish()  # the match may be past what's loaded so far
+        # QTextDocument positions count UTF-16 code units
+        text = self.text_edit.toPlainText()
+        start = len(text[: hit.offset].encode("utf-16-le")) // 2
+        end = len(text[: hit.offset + hit.length].encode("utf-16-le")) // 2
+        cursor = self.text_edit.textCursor()
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.KeepAnchor)
+        self.text_edit.setTextCursor(cursor)
+        self.text_edit.ensureCursorVisible()
+        self.text_edit.setFocus()
 
 
 # ================= FLASHCARDS =================
 
 
 class FlashcardsPage(BasePage):
-    FNAME = "flashcards.json"
+    STORE = "flashcards"
 
     def __init__(self, goto_page, standalone=False):
         super().__init__(goto_page, standalone)
-        self.cards = load_json(self.FNAME, [])
-        changed = False
-        for c in self.cards:
-            if "known" not in c:
-                c["known"] = False
-                changed = True
-        if changed:
-            save_json(self.FNAME, self.cards)
-
-        self.index = 0
+        self.repo = get_repository(self.STORE)
+        self.queue = get_review_queue()
+        self.card = None  # card on screen, None when nothing is due
+
         self.show_front = True
 
         layout = QVBoxLayout()
@@ -1036,14 +1126,14 @@ class FlashcardsPage(BasePage):
 
         title = QLabel("Flashcards")
         title.setAlignment(Qt.AlignCenter)
-        title.setStyleSheet(TITLE_STYLE)
+        title.setObjectName("pageTitle")
         layout.addWidget(title)
 
         self.card_label = QLabel("")
         self.card_label.setAlignment(Qt.AlignCenter)
         self.card_label.setWordWrap(True)
         self.card_label.setMinimumHeight(150)
-        self.card_label.setStyleSheet(CARD_STYLE + "font-size: 18px;")
+        self.card_label.setObjectName("flashcard")
         layout.addWidget(self.card_label)
 
         self.effect = QGraphicsOpacityEffect()
@@ -1057,18 +1147,19 @@ class FlashcardsPage(BasePage):
 
         btn_row = QHBoxLayout()
         flip_btn = QPushButton("Flip")
-        next_btn = QPushButton("Next")
-        known_btn = QPushButton("Mark Known")
-        delete_btn = QPushButton("Delete")
-        for b in (flip_btn, next_btn, known_btn, delete_btn):
-            b.setStyleSheet(BUTTON_STYLE)
         flip_btn.clicked.connect(self.flip)
-        next_btn.clicked.connect(self.next_card)
-        known_btn.clicked.connect(self.mark_known)
-        delete_btn.clicked.connect(self.delete_current)
         btn_row.addWidget(flip_btn)
-        btn_row.addWidget(next_btn)
-        btn_row.addWidget(known_btn)
+        for label, answer in (
+            ("Again", "again"),
+            ("Hard", "hard"),
+            ("Good", "good"),
+            ("Easy", "easy"),
+        ):
+            btn = QPushButton(label)
+            btn.clicked.connect(lambda _, a=answer: self.answer(a))
+            btn_row.addWidget(btn)
+        delete_btn = QPushButton("Delete")
+        delete_btn.clicked.connect(self.delete_current)
         btn_row.addWidget(delete_btn)
         layout.addLayout(btn_row)
 
@@ -1078,13 +1169,20 @@ class FlashcardsPage(BasePage):
         self.back_input = QLineEdit()
         self.back_input.setPlaceholderText("Back (answer)…")
         add_btn = QPushButton("Add card")
-        add_btn.setStyleSheet(BUTTON_STYLE)
         add_btn.clicked.connect(self.add_card)
+        import_btn = QPushButton("Import…")
+        import_btn.setToolTip("Import cards from CSV, TSV or an Anki text export")
+        import_btn.clicked.connect(self.import_cards)
         add_row.addWidget(self.front_input)
         add_row.addWidget(self.back_input)
         add_row.addWidget(add_btn)
+        add_row.addWidget(import_btn)
         layout.addLayout(add_row)
 
+        self._import = None  # running import_steps() generator
+        self._import_dialog = None
+        self._last_report = None
+
         self.setLayout(layout)
         self.refresh()
 
@@ -1096,48 +1194,45 @@ class FlashcardsPage(BasePage):
         self.anim.start()
 
     def refresh(self):
-        self.cards = load_json(self.FNAME, [])
-        changed = False
-        for c in self.cards:
-            if "known" not in c:
-                c["known"] = False
-                changed = True
-        if changed:
-            save_json(self.FNAME, self.cards)
-
-        if not self.cards:
-            self.card_label.setText("No cards yet. Add one below.")
-            self.counter_label.setText("")
-            self.index = 0
-            self.show_front = True
-            return
-
-        self.index %= len(self.cards)
+        """
+        Show the next due card (or say when the next one comes due).
+        """
+        self.card = self.queue.next_due()
         self.show_front = True
-        self.card_label.setText(self.cards[self.index].get("front", ""))
+        total = get_stats()["cards_total"]
+
+        if self.card is None:
+            if not total:
+                self.card_label.setText("No cards yet. Add one below.")
+                self.counter_label.setText("")
+                return
+            next_time = self.queue.next_due_time()
+            when = QDateTime.fromSecsSinceEpoch(int(next_time)).toString(
+                "ddd d MMM, HH:mm"
+            )
+            self.card_label.setText(u"All caught up! Next review: {0}".format(when))
+            self.counter_label.setText(u"0 due · {0} cards".format(total))
+            return
+
+        self.card_label.setText(self.card.get("front", ""))
         self.counter_label.setText(
-            u"Card {0} / {1}".format(self.index + 1, len(self.cards))
+            u"{0} due · {1} cards".format(self.queue.due_count(), total)
         )
         self._play_flip_anim()
 
     def flip(self):
-        if not self.cards:
+        if self.card is None:
             return
         self.show_front = not self.show_front
         side = "front" if self.show_front else "back"
-        self.card_label.setText(self.cards[self.index].get(side, ""))
+        self.card_label.setText(self.card.get(side, ""))
         self._play_flip_anim()
 
-    def next_card(self):
-        if not self.cards:
+    def answer(self, answer):
+        if self.card is None:
             return
-        self.index = (self.index + 1) % len(self.cards)
-        self.show_front = True
-        self.card_label.setText(self.cards[self.index].get("front", ""))
-        self.counter_label.setText(
-            u"Card {0} / {1}".format(self.index + 1, len(self.cards))
-        )
-        self._play_flip_anim()
+        self.queue.review(self.card, answer)
+        self.refresh()
 
     def add_card(self):
         front = self.front_input.text().strip()
@@ -1147,40 +1242,115 @@ class FlashcardsPage(BasePage):
                 self, "Missing", "Please fill in both front and back."
             )
             return
-        self.cards.append({"front": front, "back": back, "known": False})
-        save_json(self.FNAME, self.cards)
+        self.queue.add_card({"front": front, "back": back, "known": False})
         self.front_input.clear()
         self.back_input.clear()
-        self.refresh()
+        if self.card is None:
+            self.refresh()
 
     def delete_current(self):
-        if not self.cards:
-            QMessageBox.information(self, "No cards", "There is no card to delete.")
+        if self.card is None:
+            QMessageBox.information(self, "No card", "There is no card to delete.")
             return
-        del self.cards[self.index]
-        save_json(self.FNAME, self.cards)
+        self.queue.delete_card(self.card)
         self.refresh()
 
-    def mark_known(self):
-        if not self.cards:
+    def hideEvent(self, event):
+        self.queue.save()
+        super().hideEvent(event)
+
+    # ---------- bulk import ----------
+
+    def import_cards(self):
+        if self._import is not None:
+            return
+        path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Import flashcards",
+            "",
+            "Card files (*.csv *.tsv *.txt);;All files (*)",
+        )
+        if not path:
+            return
+        self._import = import_steps(path)
+
+        dialog = QProgressDialog("Importing cards…", "Cancel", 0, 1000, self)
+        dialog.setWindowTitle("Import flashcards")
+        dialog.setWindowModality(Qt.WindowModal)
+        dialog.setMinimumDuration(300)
+        dialog.canceled.connect(self._cancel_import)
+        self._import_dialog = dialog
+        # One batch per event-loop turn keeps the window responsive
+        QTimer.singleShot(0, self._import_step)
+
+    def _import_step(self):
+        if self._import is None:
+            return
+        try:
+            report = next(self._import)
+        except StopIteration:
+            self._finish_import(self._last_report)
+            return
+        except (OSError, ValueError) as e:
+            self._finish_import(None, str(e))
             return
-        self.cards[self.index]["known"] = True
-        save_json(self.FNAME, self.cards)
-        self.next_card()
+        self._last_report = report
+        self._import_dialog.setValue(int(report.progress * 1000))
+        self._import_dialog.setLabelText(
+            u"Importing cards… {0} added, {1} duplicates".format(
+                report.added, report.duplicates
+            )
+        )
+        QTimer.singleShot(0, self._import_step)
+
+    def _cancel_import(self):
+        if self._import is not None:
+            self._import.close()  # keeps what was added so far
+            self._finish_import(self._last_report, canceled=True)
+
+    def _finish_import(self, report, error=None, canceled=False):
+        self._import = None
+        dialog, self._import_dialog = self._import_dialog, None
+        self._last_report = None
+        if dialog is not None:
+            dialog.canceled.disconnect(self._cancel_import)
+            dialog.close()
+        if error:
+            QMessageBox.warning(self, "Import failed", error)
+        elif report is not None:
+            text = report.summary()
+            if canceled:
+                text = u"Import canceled. " + text
+            if report.errors:
+                text += u"\n\n" + u"\n".join(
+                    u"Line {0}: {1}".format(line, reason)
+                    for line, reason in report.errors
+                )
+            QMessageBox.information(self, "Import finished", text)
+        self.refresh()
 
 
 # ================= RESOURCES =================
 
 
+class _LinkMetaSignals(QObject):
+    # link_meta callbacks arrive on pool threads; a queued signal brings
+    # them back to the UI thread
+    arrived = pyqtSignal(str, object)
+
+
 class ResourcesPage(BasePage):
-    FNAME = "resources.json"
+    STORE = "resources"
 
     def __init__(self, goto_page, standalone=False):
         super().__init__(goto_page, standalone)
-        self.data = load_json(self.FNAME, {"subjects": {}})
-        self._normalize_data()
+        self.repo = get_repository(self.STORE)
         self.current_subject = None
         self.current_unit = None
+        self.link_fetcher = get_link_fetcher()
+        self.link_signals = _LinkMetaSignals(self)
+        self.link_signals.arrived.connect(self.apply_link_meta)
+        self._link_items = {}  # url -> [QListWidgetItem, ...] on screen
 
         layout = QVBoxLayout()
         layout.setAlignment(Qt.AlignTop)
@@ -1188,7 +1358,7 @@ class ResourcesPage(BasePage):
 
         title = QLabel("Study Resources")
         title.setAlignment(Qt.AlignCenter)
-        title.setStyleSheet(TITLE_STYLE)
+        title.setObjectName("pageTitle")
         layout.addWidget(title)
 
         main_row = QHBoxLayout()
@@ -1203,7 +1373,6 @@ class ResourcesPage(BasePage):
         self.subject_input = QLineEdit()
         self.subject_input.setPlaceholderText("New subject…")
         add_subj_btn = QPushButton("Add")
-        add_subj_btn.setStyleSheet(BUTTON_STYLE)
         add_subj_btn.clicked.connect(self.add_subject)
         subj_add_row.addWidget(self.subject_input)
         subj_add_row.addWidget(add_subj_btn)
@@ -1222,10 +1391,13 @@ class ResourcesPage(BasePage):
         unit_row.addWidget(self.unit_combo)
 
         add_unit_btn = QPushButton("Add unit")
-        add_unit_btn.setStyleSheet(BUTTON_STYLE)
         add_unit_btn.clicked.connect(self.add_unit)
         unit_row.addWidget(add_unit_btn)
 
+        dedup_btn = QPushButton("Remove duplicates")
+        dedup_btn.clicked.connect(self.remove_duplicates)
+        unit_row.addWidget(dedup_btn)
+
         right_col.addLayout(unit_row)
 
         self.listw = QListWidget()
@@ -1236,7 +1408,6 @@ class ResourcesPage(BasePage):
         self.link_input = QLineEdit()
         self.link_input.setPlaceholderText("Paste a link…")
         add_btn = QPushButton("Add link")
-        add_btn.setStyleSheet(BUTTON_STYLE)
         add_btn.clicked.connect(self.add_link)
         bottom_row.addWidget(self.link_input)
         bottom_row.addWidget(add_btn)
@@ -1250,18 +1421,9 @@ class ResourcesPage(BasePage):
         self.setLayout(layout)
         self.refresh_subjects()
 
-    def _normalize_data(self):
-        if isinstance(self.data, list):
-            self.data = {"subjects": {"General": {"units": {"All": self.data}}}}
-            save_json(self.FNAME, self.data)
-            return
-        if "subjects" not in self.data or not isinstance(self.data["subjects"], dict):
-            self.data["subjects"] = {}
-            save_json(self.FNAME, self.data)
-
     def refresh_subjects(self):
         self.subject_box.clear()
-        for subj in sorted(self.data["subjects"].keys()):
+        for subj in self.repo.subjects():
             self.subject_box.addItem(subj)
 
     def select_subject(self, name):
@@ -1277,12 +1439,12 @@ class ResourcesPage(BasePage):
             self.unit_combo.blockSignals(False)
             self.listw.clear()
             return
-        units = self.data["subjects"][self.current_subject]["units"]
-        for unit in units.keys():
+        units = self.repo.units(self.current_subject)
+        for unit in units:
             self.unit_combo.addItem(unit)
         self.unit_combo.blockSignals(False)
         if units:
-            first = next(iter(units.keys()))
+            first = units[0]
             self.unit_combo.setCurrentText(first)
             self.select_unit(first)
         else:
@@ -1294,11 +1456,10 @@ class ResourcesPage(BasePage):
         if not name:
             QMessageBox.information(self, "No name", "Type a subject name.")
             return
-        if name in self.data["subjects"]:
+        if self.repo.has_subject(name):
             QMessageBox.information(self, "Exists", "That subject already exists.")
             return
-        self.data["subjects"][name] = {"units": {}}
-        save_json(self.FNAME, self.data)
+        self.repo.add_subject(name)
         self.subject_input.clear()
         self.refresh_subjects()
 
@@ -1306,19 +1467,16 @@ class ResourcesPage(BasePage):
         if not self.current_subject:
             QMessageBox.information(self, "No subject", "Select a subject first.")
             return
-        suggested = u"Unit {0}".format(
-            len(self.data["subjects"][self.current_subject]["units"]) + 1
-        )
+        units = self.repo.units(self.current_subject)
+        suggested = u"Unit {0}".format(len(units) + 1)
         text, ok = QInputDialog.getText(self, "New unit", "Unit name:", text=suggested)
         if not ok or not text.strip():
             return
         name = text.strip()
-        units = self.data["subjects"][self.current_subject]["units"]
         if name in units:
             QMessageBox.information(self, "Exists", "That unit already exists.")
             return
-        units[name] = []
-        save_json(self.FNAME, self.data)
+        self.repo.add_unit(self.current_subject, name)
         self.refresh_units()
         self.unit_combo.setCurrentText(name)
         self.select_unit(name)
@@ -1331,13 +1489,33 @@ class ResourcesPage(BasePage):
 
     def refresh_links(self):
         self.listw.clear()
+        self._link_items = {}
         if not self.current_subject or not self.current_unit:
             return
-        links = self.data["subjects"][self.current_subject]["units"].get(
-            self.current_unit, []
-        )
+        links = self.repo.links(self.current_subject, self.current_unit)
+        emit = self.link_signals.arrived.emit
         for url in links:
-            self.listw.addItem(url)
+            item = QListWidgetItem(url)
+            item.setData(Qt.UserRole, url)
+            self.listw.addItem(item)
+            self._link_items.setdefault(url, []).append(item)
+        for url in self._link_items:
+            entry = self.link_fetcher.request(url, emit)
+            if entry is not None:
+                self.apply_link_meta(url, entry)
+
+    def apply_link_meta(self, url, entry):
+        for item in self._link_items.get(url, ()):
+            item.setText(link_label(url, entry))
+            tip = url
+            if entry.get("content_type"):
+                tip += u"\n" + entry["content_type"]
+            if entry.get("error"):
+                tip += u"\n" + entry["error"]
+            item.setToolTip(tip)
+            path = icon_path(entry)
+            if path:
+                item.setIcon(QIcon(path))
 
     def add_link(self):
         if not self.current_subject or not self.current_unit:
@@ -1349,26 +1527,76 @@ class ResourcesPage(BasePage):
                 self, "Empty link", "Paste a valid URL before adding."
             )
             return
-        units = self.data["subjects"][self.current_subject]["units"]
-        units.setdefault(self.current_unit, []).append(url)
-        save_json(self.FNAME, self.data)
+        places = self.repo.places(url)
+        current = (self.current_subject, self.current_unit)
+        here = [place for place in places if place[:2] == current]
+        if here:
+            QMessageBox.information(
+                self,
+                "Already added",
+                u"This unit already has that link:\n{0}".format(here[0][2]),
+            )
+            return
+        if places:
+            where = u"\n".join(
+                u"• {0} › {1}".format(subject, unit)
+                for subject, unit, _ in places[:10]
+            )
+            confirm = QMessageBox.question(
+                self,
+                "Duplicate link",
+                u"That link is already filed under:\n\n{0}\n\n"
+                u"Add it here too?".format(where),
+                QMessageBox.Yes | QMessageBox.No,
+            )
+            if confirm != QMessageBox.Yes:
+                return
+        self.repo.add_link(self.current_subject, self.current_unit, url)
         self.link_input.clear()
         self.refresh_links()
 
+    def remove_duplicates(self):
+        if not self.current_subject:
+            QMessageBox.information(self, "No subject", "Select a subject first.")
+            return
+        confirm = QMessageBox.question(
+            self,
+            "Remove duplicates",
+            u"Remove repeated links from every unit of '{0}'?\n"
+            u"The first copy in each unit is kept.".format(self.current_subject),
+            QMessageBox.Yes | QMessageBox.No,
+        )
+        if confirm != QMessageBox.Yes:
+            return
+        removed = self.repo.dedup(subject=self.current_subject)
+        self.refresh_links()
+        QMessageBox.information(
+            self, "Duplicates", u"Removed {0} duplicate links.".format(removed)
+        )
+
     def open_link(self, item):
-        QDesktopServices.openUrl(QUrl(item.text()))
+        QDesktopServices.openUrl(QUrl(item.data(Qt.UserRole) or item.text()))
 
 
 # ================= SCHEDULE PAGE =================
 
 
 class SchedulePage(BasePage):
-    FNAME = "schedule.json"
+    STORE = "schedule"
+
+    # (label, RRULE) offered by "Repeat…"; {0} is the selected weekday
+    REPEAT_CHOICES = (
+        (u"Every {0}", "FREQ=WEEKLY"),
+        (u"Every other {0}", "FREQ=WEEKLY;INTERVAL=2"),
+        (u"Every weekday (Mon–Fri)", "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR"),
+        (u"Every day", "FREQ=DAILY"),
+        (u"Every month on this day", "FREQ=MONTHLY"),
+    )
 
     def __init__(self, goto_page, standalone=False):
         super().__init__(goto_page, standalone)
-        raw = load_json(self.FNAME, {})
-        self.data = normalize_schedule_data(raw)
+        self.repo = get_repository(self.STORE)
+        self.recurrence = get_recurrence()
 
         layout = QVBoxLayout()
         layout.setAlignment(Qt.AlignTop)
@@ -1376,10 +1604,10 @@ class SchedulePage(BasePage):
 
         title = QLabel("Schedule")
         title.setAlignment(Qt.AlignCenter)
-        title.setStyleSheet(TITLE_STYLE)
+        title.setObjectName("pageTitle")
         layout.addWidget(title)
 
-        self.calendar = QCalendarWidget()
+        self.calendar = BadgeCalendar(self.range_counts)
         self.calendar.selectionChanged.connect(self.refresh_for_selected_date)
         layout.addWidget(self.calendar)
 
@@ -1389,16 +1617,50 @@ class SchedulePage(BasePage):
         self.listw = QListWidget()
         layout.addWidget(self.listw)
 
+        occurrence_row = QHBoxLayout()
+        skip_btn = QPushButton("Skip this time")
+        skip_btn.clicked.connect(self.skip_occurrence)
+        occurrence_row.addWidget(skip_btn)
+        edit_btn = QPushButton("Change this time…")
+        edit_btn.clicked.connect(self.edit_occurrence)
+        occurrence_row.addWidget(edit_btn)
+        delete_series_btn = QPushButton("Delete series")
+        delete_series_btn.clicked.connect(self.delete_series)
+        occurrence_row.addWidget(delete_series_btn)
+        layout.addLayout(occurrence_row)
+
         row = QHBoxLayout()
         self.input = QLineEdit()
         self.input.setPlaceholderText("Add entry for selected date…")
         add_btn = QPushButton("Add")
-        add_btn.setStyleSheet(BUTTON_STYLE)
         add_btn.clicked.connect(self.add_entry)
+        repeat_btn = QPushButton("Repeat…")
+        repeat_btn.clicked.connect(self.add_series)
         row.addWidget(self.input)
         row.addWidget(add_btn)
+        row.addWidget(repeat_btn)
         layout.addLayout(row)
 
+        layout.addWidget(QLabel(u"Coming up (next {0} days)".format(AGENDA_DAYS)))
+        self.agenda = QListWidget()
+        self.agenda.setObjectName("compactList")
+        self.agenda.itemActivated.connect(self.open_agenda_day)
+        self.agenda.itemClicked.connect(self.open_agenda_day)
+        layout.addWidget(self.agenda)
+
+        ics_row = QHBoxLayout()
+        import_btn = QPushButton("Import .ics…")
+        import_btn.clicked.connect(self.import_ics)
+        ics_row.addWidget(import_btn)
+        export_btn = QPushButton("Export .ics…")
+        export_btn.clicked.connect(self.export_ics)
+        ics_row.addWidget(export_btn)
+        layout.addLayout(ics_row)
+
+        self._import = None  # ics_io.import_steps generator while importing
+        self._import_dialog = None
+        self._last_report = None
+
         self.setLayout(layout)
         self.refresh_for_selected_date()
 
@@ -1406,15 +1668,28 @@ class SchedulePage(BasePage):
         d = self.calendar.selectedDate()
         return d.toString("yyyy-MM-dd")
 
+    def range_counts(self, start, end):
+        """
+        Entries per day, one-off and repeating, for the calendar badges.
+        """
+        counts = dict(self.repo.range_counts(start, end))
+        for day, n in self.recurrence.range_counts(start, end):
+            counts[day] = counts.get(day, 0) + n
+        return sorted(counts.items())
+
     def refresh_for_selected_date(self):
         self.listw.clear()
         key = self._date_key()
-        entries = self.data.get(key, [])
+        entries = self.repo.entries(key)
         self.entries_label.setText(u"Entries for {0}:".format(key))
         for e in entries:
             self.listw.addItem(e)
+        for occ in self.recurrence.occurrences(key, key):
+            item = QListWidgetItem(u"↻ {0}".format(occ.text))
+            item.setData(Qt.UserRole, (occ.series_id, occ.original))
+            self.listw.addItem(item)
 
-        legacy = self.data.get("__all__")
+        legacy = self.repo.legacy()
         if legacy:
             self.listw.addItem("---- Legacy entries ----")
             for e in legacy:
@@ -1426,23 +1701,236 @@ class SchedulePage(BasePage):
             QMessageBox.information(self, "Empty entry", "Write something before adding.")
             return
         key = self._date_key()
-        self.data.setdefault(key, []).append(txt)
-        save_json(self.FNAME, self.data)
+        self.repo.add_entry(key, txt)
         self.input.clear()
+        self._refresh_all()
+
+    def _refresh_all(self):
         self.refresh_for_selected_date()
+        self.calendar.refresh_badges()
+        self.refresh_agenda()
+
+    # ---------- repeating entries ----------
+
+    def add_series(self):
+        txt = self.input.text().strip()
+        if not txt:
+            QMessageBox.information(self, "Empty entry", "Write something first.")
+            return
+        date = self.calendar.selectedDate()
+        weekday = date.toString("dddd")
+        labels = [label.format(weekday) for label, _ in self.REPEAT_CHOICES]
+        choice, ok = QInputDialog.getItem(
+            self, "Repeat", u"Repeat “{0}”:".format(txt), labels, 0, False
+        )
+        if not ok:
+            return
+        rule = self.REPEAT_CHOICES[labels.index(choice)][1]
+        until, ok = QInputDialog.getText(
+            self, "Repeat", "Until (yyyy-MM-dd, leave empty for no end):"
+        )
+        if not ok:
+            return
+        until = until.strip()
+        if until:
+            end = QDate.fromString(until, "yyyy-MM-dd")
+            if not end.isValid() or end < date:
+                QMessageBox.information(
+                    self, "Bad date", "Use yyyy-MM-dd, on or after the start."
+                )
+                return
+            rule += ";UNTIL=" + end.toString("yyyyMMdd")
+        self.recurrence.add_series(txt, date.toPyDate(), rule)
+        self.input.clear()
+        self._refresh_all()
+
+    def _selected_occurrence(self):
+        item = self.listw.currentItem()
+        data = item.data(Qt.UserRole) if item is not None else None
+        if not data:
+            QMessageBox.information(
+                self, "No repeating entry", "Select a ↻ entry in the list first."
+            )
+            return None
+        return data
+
+    def skip_occurrence(self):
+        selected = self._selected_occurrence()
+        if selected:
+            self.recurrence.skip(*selected)
+            self._refresh_all()
+
+    def edit_occurrence(self):
+        selected = self._selected_occurrence()
+        if not selected:
+            return
+        series_id, original = selected
+        current = self.listw.currentItem().text()[2:]
+        text, ok = QInputDialog.getText(self, "Change this time", "Text:", text=current)
+        if not ok or not text.strip():
+            return
+        day, ok = QInputDialog.getText(
+            self, "Change this time", "Date (yyyy-MM-dd):", text=self._date_key()
+        )
+        if not ok:
+            return
+        date = QDate.fromString(day.strip(), "yyyy-MM-dd")
+        if not date.isValid():
+            QMessageBox.information(self, "Bad date", "Use yyyy-MM-dd.")
+            return
+        self.recurrence.override(
+            series_id, original, text=text.strip(), date=date.toPyDate()
+        )
+        self._refresh_all()
+
+    def delete_series(self):
+        selected = self._selected_occurrence()
+        if not selected:
+            return
+        confirm = QMessageBox.question(
+            self,
+            "Delete series",
+            "Delete every occurrence of this repeating entry?",
+            QMessageBox.Yes | QMessageBox.No,
+        )
+        if confirm == QMessageBox.Yes:
+            self.recurrence.delete_series(selected[0])
+            self._refresh_all()
+
+    # ---------- agenda ----------
+
+    def refresh_agenda(self):
+        self.agenda.clear()
+        today = QDate.currentDate()
+        last = today.addDays(AGENDA_DAYS - 1)
+        by_day = {}
+        for day, entries in self.repo.agenda(today.toPyDate(), AGENDA_DAYS):
+            by_day[day] = list(entries)
+        occurrences = self.recurrence.occurrences(
+            today.toString("yyyy-MM-dd"), last.toString("yyyy-MM-dd")
+        )
+        for occ in occurrences:
+            by_day.setdefault(occ.day, []).append(u"↻ " + occ.text)
+        for day in sorted(by_day):
+            date = QDate.fromString(day, "yyyy-MM-dd")
+            label = "Today" if date == today else date.toString("ddd d MMM")
+            for text in by_day[day]:
+                item = QListWidgetItem(u"{0} · {1}".format(label, text))
+                item.setData(Qt.UserRole, day)
+                self.agenda.addItem(item)
+
+    def open_agenda_day(self, item):
+        date = QDate.fromString(item.data(Qt.UserRole), "yyyy-MM-dd")
+        self.calendar.setSelectedDate(date)
+
+    # ---------- iCalendar ----------
+
+    def import_ics(self):
+        if self._import is not None:
+            return
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Import calendar", "", "Calendar files (*.ics);;All files (*)"
+        )
+        if not path:
+            return
+        self._import = ics_io.import_steps(path, self.repo)
+
+        dialog = QProgressDialog("Importing calendar…", "Cancel", 0, 1000, self)
+        dialog.setWindowTitle("Import calendar")
+        dialog.setWindowModality(Qt.WindowModal)
+        dialog.setMinimumDuration(300)
+        dialog.canceled.connect(self._cancel_import)
+        self._import_dialog = dialog
+        QTimer.singleShot(0, self._import_step)
+
+    def _import_step(self):
+        if self._import is None:
+            return
+        try:
+            report = next(self._import)
+        except StopIteration:
+            self._finish_import(self._last_report)
+            return
+        except (OSError, ValueError) as e:
+            self._finish_import(None, str(e))
+            return
+        self._last_report = report
+        self._import_dialog.setValue(int(report.progress * 1000))
+        self._import_dialog.setLabelText(
+            u"Importing calendar… {0} added, {1} duplicates".format(
+                report.added + report.series, report.duplicates
+            )
+        )
+        QTimer.singleShot(0, self._import_step)
+
+    def _cancel_import(self):
+        if self._import is not None:
+            self._import.close()  # keeps what was added so far
+            self._finish_import(self._last_report, canceled=True)
+
+    def _finish_import(self, report, error=None, canceled=False):
+        self._import = None
+        dialog, self._import_dialog = self._import_dialog, None
+        self._last_report = None
+        if dialog is not None:
+            dialog.canceled.disconnect(self._cancel_import)
+            dialog.close()
+        if error:
+            QMessageBox.warning(self, "Import failed", error)
+        elif report is not None:
+            text = report.summary()
+            if canceled:
+                text = u"Import canceled. " + text
+            if report.errors:
+                text += u"\n\n" + u"\n".join(
+                    u"Line {0}: {1}".format(line, reason)
+                    for line, reason in report.errors
+                )
+            QMessageBox.information(self, "Import finished", text)
+        self._refresh_all()
+
+    def export_ics(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export calendar", "schedule.ics", "Calendar files (*.ics)"
+        )
+        if not path:
+            return
+        try:
+            count = ics_io.export_file(path, self.repo)
+        except OSError as e:
+            QMessageBox.warning(self, "Export failed", str(e))
+            return
+        QMessageBox.information(
+            self, "Export finished", u"Exported {0} events.".format(count)
+        )
+
+    def showEvent(self, event):
+        # entries may have been added from the dashboard or an import
+        self.calendar.refresh_badges()
+        self.refresh_agenda()
+        super().showEvent(event)
 
 
 # ================= TIMER PAGE =================
 
 
 class TimerPage(BasePage):
+    DEFAULT_MINUTES = 25
+    # resets before this much focus time aren't worth a log entry
+    MIN_LOGGED_SECONDS = 60
+
     def __init__(self, goto_page, standalone=False):
         super().__init__(goto_page, standalone)
 
-        self.time_left = 25 * 60
-        self.running = False
-        self.timer = QTimer()
+        # Time comes from the countdown's deadline; the QTimer only says
+        # when to look again (see focus_timer.py)
+        self.countdown = Countdown(self.DEFAULT_MINUTES * 60)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
         self.timer.timeout.connect(self.tick)
+        self._shown_seconds = None
+        self.sessions = get_session_log()
+        self._session = None  # (start time, subject) of the session under way
 
         layout = QVBoxLayout()
         layout.setAlignment(Qt.AlignTop)
@@ -1450,21 +1938,12 @@ class TimerPage(BasePage):
 
         title = QLabel("Focus Timer")
         title.setAlignment(Qt.AlignCenter)
-        title.setStyleSheet(TITLE_STYLE)
+        title.setObjectName("pageTitle")
         layout.addWidget(title)
 
         self.time_label = QLabel("")
         self.time_label.setAlignment(Qt.AlignCenter)
-        self.time_label.setStyleSheet(
-            """
-            font-size: 72px;
-            font-weight: 600;
-            padding: 24px 32px;
-            border-radius: 22px;
-            background-color: rgba(0, 0, 0, 0.06);
-            letter-spacing: 6px;
-            """
-        )
+        self.time_label.setObjectName("timerDisplay")
         self.time_label.setMinimumHeight(180)
         layout.addWidget(self.time_label)
 
@@ -1477,12 +1956,14 @@ class TimerPage(BasePage):
         self.minutes_input.setPlaceholderText("Minutes (default 25)")
         layout.addWidget(self.minutes_input)
 
+        self.subject_combo = QComboBox()
+        layout.addWidget(self.subject_combo)
+        self.refresh_subjects()
+
         row = QHBoxLayout()
         start_btn = QPushButton("Start")
         stop_btn = QPushButton("Stop")
         reset_btn = QPushButton("Reset")
-        for b in (start_btn, stop_btn, reset_btn):
-            b.setStyleSheet(BUTTON_STYLE)
         start_btn.clicked.connect(self.start_timer)
         stop_btn.clicked.connect(self.stop_timer)
         reset_btn.clicked.connect(self.reset_timer)
@@ -1491,8 +1972,21 @@ class TimerPage(BasePage):
         row.addWidget(reset_btn)
         layout.addLayout(row)
 
+        self.history_label = QLabel("")
+        self.history_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.history_label)
+
         self.setLayout(layout)
         self.update_label()
+        self.refresh_history()
+
+    @property
+    def running(self):
+        return self.countdown.running
+
+    @property
+    def time_left(self):
+        return self.countdown.display_seconds()
 
     def _play_tick_anim(self):
         self.time_anim.stop()
@@ -1508,37 +2002,113 @@ class TimerPage(BasePage):
         if text:
             try:
                 mins = max(1, int(text))
-                self.time_left = mins * 60
             except ValueError:
                 QMessageBox.information(
                     self, "Invalid minutes", "Please enter a whole number."
                 )
                 return
-        self.running = True
-        self.timer.start(1000)
+            self._end_session(completed=False)
+            self.countdown.reset(mins * 60)
+        elif self.countdown.finished():
+            self.countdown.reset()  # same length again
+        if self._session is None:
+            self._session = (time.time(), self.subject_combo.currentData())
+        self.countdown.start()
         self.update_label()
         self._play_tick_anim()
+        self._schedule()
 
     def stop_timer(self):
-        self.running = False
+        self.countdown.pause()
         self.timer.stop()
 
     def reset_timer(self):
-        self.running = False
         self.timer.stop()
-        self.time_left = 25 * 60
+        self._end_session(completed=False)
+        self.countdown.reset(self.DEFAULT_MINUTES * 60)
         self.update_label()
 
+    def _watched(self):
+        return self.isVisible() and not self.window().isMinimized()
+
+    def _schedule(self):
+        """
+        Arm the timer for the next second boundary, or only for the end
+        of the countdown while the page can't be seen.
+        """
+        if not self.running:
+            return
+        if self._watched():
+            self.timer.setTimerType(Qt.CoarseTimer)
+            self.timer.start(self.countdown.next_wakeup_ms())
+        else:
+            self.timer.setTimerType(Qt.PreciseTimer)
+            self.timer.start(self.countdown.deadline_ms())
+
     def tick(self):
-        if self.time_left <= 0:
+        if self.countdown.finished():
             self.stop_timer()
-            self.time_label.setText("00:00")
+            self.update_label()
+            self._end_session(completed=True)
             return
-        self.time_left -= 1
-        self.update_label()
-        self._play_tick_anim()
+        if self._watched() and self.update_label():
+            self._play_tick_anim()
+        self._schedule()
 
     def update_label(self):
-        mins = self.time_left // 60
-        secs = self.time_left % 60
-        self.time_label.setText("{0:02d}:{1:02d}".format(mins, secs))
+        """
+        Show the remaining time; returns False if it hasn't changed.
+        """
+        seconds = self.countdown.display_seconds()
+        if seconds == self._shown_seconds:
+            return False
+        self._shown_seconds = seconds
+        self.time_label.setText(format_seconds(seconds))
+        return True
+
+    # ---------- session log ----------
+
+    def refresh_subjects(self):
+        current = self.subject_combo.currentData()
+        self.subject_combo.clear()
+        self.subject_combo.addItem("No subject", None)
+        for name, _complete in get_repository("notes").subjects():
+            self.subject_combo.addItem(name, name)
+        index = self.subject_combo.findData(current)
+        self.subject_combo.setCurrentIndex(max(0, index))
+
+    def _end_session(self, completed):
+        """
+        Log the session under way, if any: run to zero, or cut short
+        after at least MIN_LOGGED_SECONDS of focus.
+        """
+        if self._session is None:
+            return
+        start, subject = self._session
+        self._session = None
+        planned = self.countdown.duration
+        focused = planned - self.countdown.remaining()
+        if completed or focused >= self.MIN_LOGGED_SECONDS:
+            self.sessions.record(start, focused, planned, completed, subject)
+            self.refresh_history()
+
+    def refresh_history(self):
+        seconds, sessions, _ = self.sessions.day()
+        week_seconds, _, _ = self.sessions.week()
+        self.history_label.setText(
+            u"Today: {0} in {1} sessions · this week: {2}".format(
+                format_duration(seconds), sessions, format_duration(week_seconds)
+            )
+        )
+
+    def showEvent(self, event):
+        # back from another page: catch up and go back to once a second
+        self.refresh_subjects()
+        self.update_label()
+        self._schedule()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        # nobody is looking; only wake up for the end of the countdown
+        self._schedule()
+        super().hideEvent(event)
@@ -0,0 +1,422 @@
+"""
+Repeating schedule entries.
+
+A series is stored once, in data/schedule_series.json, instead of one
+schedule.json entry per date:
+
+{
+    "version": 1,
+    "rev": int,                                   # +1 on every change
+    "series": {
+        "<id>": {
+            "text": "Revise chemistry",
+            "start": "2024-01-02",                 # first possible date
+            "rule": "FREQ=WEEKLY;BYDAY=TU,TH;UNTIL=20240601",
+            "exdates": ["2024-02-13", ...],        # skipped occurrences
+            "overrides": {"2024-02-20": {"text": "...", "date": "2024-02-21"}}
+        }
+    }
+}
+
+Rules are a subset of RFC 5545 RRULE: FREQ (DAILY, WEEKLY, MONTHLY,
+YEARLY), INTERVAL, COUNT, UNTIL, BYDAY (plain weekdays, weekly rules
+only) and BYMONTHDAY (monthly rules only; -1 = last day). An override
+changes one occurrence's text and/or moves it to another date.
+
+Occurrences are never stored. occurrences(start, end) expands just that
+window: rules without COUNT jump straight to the first period in it,
+and COUNT for daily/weekly rules is worked out arithmetically. Results
+are cached per window until the next change to any series.
+"""
+
+import sys
+import uuid
+import calendar
+import datetime
+import collections
+
+from data_manager import load_json, save_json
+
+SERIES_NAME = "schedule_series.json"
+
+FREQS = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+CACHE_WINDOWS = 64
+
+
+def parse_day(day):
+    if isinstance(day, datetime.date):
+        return day
+    return datetime.datetime.strptime(day, "%Y-%m-%d").date()
+
+
+def day_key(day):
+    return day.strftime("%Y-%m-%d")
+
+
+def _add_months(year, month, n):
+    month += n - 1
+    return year + month // 12, month % 12 + 1
+
+
+class Rule:
+    def __init__(
+        self, freq, interval=1, count=None, until=None, byday=(), bymonthday=()
+    ):
+        self.freq = freq
+        self.interval = interval
+        self.count = count
+        self.until = until
+        self.byday = tuple(sorted(set(byday)))
+        self.bymonthday = tuple(bymonthday)
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Rule from "FREQ=WEEKLY;BYDAY=TU" (an "RRULE:" prefix is fine).
+        Raises ValueError for anything outside the supported subset.
+        """
+        text = text.strip()
+        if text.upper().startswith("RRULE:"):
+            text = text[6:]
+        parts = {}
+        for part in filter(None, text.split(";")):
+            name, sep, value = part.partition("=")
+            if not sep:
+                raise ValueError(u"bad rule part: {0}".format(part))
+            parts[name.strip().upper()] = value.strip().upper()
+
+        freq = parts.pop("FREQ", None)
+        if freq not in FREQS:
+            raise ValueError(u"unsupported FREQ: {0}".format(freq))
+        kwargs = {}
+        if "INTERVAL" in parts:
+            kwargs["interval"] = int(parts.pop("INTERVAL"))
+            if kwargs["interval"] < 1:
+                raise ValueError("INTERVAL must be at least 1")
+        if "COUNT" in parts:
+            kwargs["count"] = int(parts.pop("COUNT"))
+        if "UNTIL" in parts:
+            kwargs["until"] = datetime.datetime.strptime(
+                parts.pop("UNTIL")[:8], "%Y%m%d"
+            ).date()
+        if "BYDAY" in parts:
+            if freq != "WEEKLY":
+                raise ValueError("BYDAY is only supported for weekly rules")
+            days = parts.pop("BYDAY").split(",")
+            if any(d not in WEEKDAYS for d in days):
+                raise ValueError("BYDAY takes plain weekdays (MO, TU, ...)")
+            kwargs["byday"] = [WEEKDAYS.index(d) for d in days]
+        if "BYMONTHDAY" in parts:
+            if freq != "MONTHLY":
+                raise ValueError("BYMONTHDAY is only supported for monthly rules")
+            days = [int(d) for d in parts.pop("BYMONTHDAY").split(",")]
+            if any(d == 0 or not -31 <= d <= 31 for d in days):
+                raise ValueError("BYMONTHDAY must be 1..31 or -31..-1")
+            kwargs["bymonthday"] = days
+        parts.pop("WKST", None)  # weeks start on Monday either way
+        if parts:
+            raise ValueError(u"unsupported: {0}".format(", ".join(sorted(parts))))
+        return cls(freq, **kwargs)
+
+    def format(self):
+        parts = ["FREQ=" + self.freq]
+        if self.interval != 1:
+            parts.append("INTERVAL={0}".format(self.interval))
+        if self.byday:
+            parts.append("BYDAY=" + ",".join(WEEKDAYS[d] for d in self.byday))
+        if self.bymonthday:
+            parts.append("BYMONTHDAY=" + ",".join(str(d) for d in self.bymonthday))
+        if self.count is not None:
+            parts.append("COUNT={0}".format(self.count))
+        if self.until is not None:
+            parts.append("UNTIL=" + self.until.strftime("%Y%m%d"))
+        return ";".join(parts)
+
+    # ---------- expansion ----------
+
+    def _period(self, dtstart, day):
+        """
+        Index of the period (day / week / month / year) day falls in.
+        """
+        if self.freq == "DAILY":
+            return (day - dtstart).days
+        if self.freq == "WEEKLY":
+            week0 = dtstart - datetime.timedelta(days=dtstart.weekday())
+            return (day - week0).days // 7
+        if self.freq == "MONTHLY":
+            return (day.year - dtstart.year) * 12 + day.month - dtstart.month
+        return day.year - dtstart.year
+
+    def _dates(self, dtstart, p):
+        """
+        Occurrences in period p, in order (the first period starts at
+        dtstart).
+        """
+        if self.freq == "DAILY":
+            dates = [dtstart + datetime.timedelta(days=p)]
+        elif self.freq == "WEEKLY":
+            week = dtstart + datetime.timedelta(days=7 * p - dtstart.weekday())
+            byday = self.byday or (dtstart.weekday(),)
+            dates = [week + datetime.timedelta(days=d) for d in byday]
+        elif self.freq == "MONTHLY":
+            year, month = _add_months(dtstart.year, dtstart.month, p)
+            last = calendar.monthrange(year, month)[1]
+            days = set()
+            for d in self.bymonthday or (dtstart.day,):
+                d = d if d > 0 else last + 1 + d
+                if 1 <= d <= last:  # e.g. the 31st is skipped in short months
+                    days.add(d)
+            dates = [datetime.date(year, month, d) for d in sorted(days)]
+        else:
+            year = dtstart.year + p
+            if dtstart.month == 2 and dtstart.day == 29 and not calendar.isleap(year):
+                dates = []
+            else:
+                dates = [dtstart.replace(year=year)]
+        if p == 0:
+            dates = [d for d in dates if d >= dtstart]
+        return dates
+
+    def _count_before(self, dtstart, p):
+        """
+        Occurrences in the periods before p (p a multiple of interval).
+        """
+        if p <= 0:
+            return 0
+        if self.freq in ("DAILY", "WEEKLY"):
+            per_period = len(self._dates(dtstart, self.interval))
+            first = len(self._dates(dtstart, 0))
+            return first + (p // self.interval - 1) * per_period
+        return sum(len(self._dates(dtstart, q)) for q in range(0, p, self.interval))
+
+    def between(self, dtstart, start, end):
+        """
+        Occurrence dates from start to end (inclusive), in order.
+        """
+        dtstart, start, end = parse_day(dtstart), parse_day(start), parse_day(end)
+        if self.until is not None:
+            end = min(end, self.until)
+        if end < start or end < dtstart:
+            return
+        p = max(0, self._period(dtstart, max(start, dtstart)))
+        p -= p % self.interval
+        n = self._count_before(dtstart, p) if self.count is not None else 0
+        while True:
+            dates = self._dates(dtstart, p)
+            if dates and dates[0] > end:
+                return
+            for day in dates:
+                if self.count is not None:
+                    if n >= self.count:
+                        return
+                    n += 1
+                if day > end:
+                    return
+                if day >= start:
+                    yield day
+            p += self.interval
+            if not dates and self._period(dtstart, end) < p:
+                return
+
+
+def series_uid(series_id, series):
+    """
+    UID a series is exported with: the one it was imported with, if any.
+    """
+    return series.get("uid") or series_id + "@study-helper"
+
+
+class Occurrence:
+    def __init__(self, day, series_id, text, original):
+        self.day = day  # "yyyy-MM-dd" it shows up on
+        self.series_id = series_id
+        self.text = text
+        self.original = original  # date the rule produced (key for overrides)
+
+    def __repr__(self):
+        return "Occurrence({0!r}, {1!r})".format(self.day, self.text)
+
+
+class RecurrenceStore:
+    def __init__(self):
+        self._rules = {}  # series id -> (rule text, Rule)
+        self._windows = collections.OrderedDict()
+        self._windows_rev = None
+
+    # ---------- storage ----------
+
+    def _data(self):
+        data = load_json(SERIES_NAME, None)
+        if not isinstance(data, dict) or data.get("version") != 1:
+            data = {"version": 1, "rev": 0, "series": {}}
+            save_json(SERIES_NAME, data)
+        return data
+
+    def _save(self, data):
+        data["rev"] = data.get("rev", 0) + 1
+        save_json(SERIES_NAME, data)
+
+    @property
+    def rev(self):
+        return self._data().get("rev", 0)
+
+    def _rule(self, series_id, series):
+        cached = self._rules.get(series_id)
+        if cached is None or cached[0] != series["rule"]:
+            cached = (series["rule"], Rule.parse(series["rule"]))
+            self._rules[series_id] = cached
+        return cached[1]
+
+    # ---------- series ----------
+
+    def all_series(self):
+        return dict(self._data()["series"])
+
+    def get(self, series_id):
+        return self._data()["series"].get(series_id)
+
+    def add_series(self, text, start, rule, uid=None):
+        """
+        New series starting on start (date or "yyyy-MM-dd"); rule is an
+        RRULE string. uid is the iCalendar UID it was imported with.
+        Raises ValueError for an unsupported rule.
+        """
+        rule = Rule.parse(rule) if isinstance(rule, str) else rule
+        data = self._data()
+        series_id = uuid.uuid4().hex
+        series = {
+            "text": text,
+            "start": day_key(parse_day(start)),
+            "rule": rule.format(),
+            "exdates": [],
+            "overrides": {},
+        }
+        if uid:
+            series["uid"] = uid
+        data["series"][series_id] = series
+        self._save(data)
+        return series_id
+
+    def uids(self):
+        """
+        {iCalendar UID: series id} for every series (see series_uid).
+        """
+        return {
+            series_uid(series_id, series): series_id
+            for series_id, series in self._data()["series"].items()
+        }
+
+    def delete_series(self, series_id):
+        data = self._data()
+        if data["series"].pop(series_id, None) is not None:
+            self._rules.pop(series_id, None)
+            self._save(data)
+
+    def skip(self, series_id, original):
+        """
+        Leave out the occurrence the rule puts on original.
+        """
+        data = self._data()
+        series = data["series"].get(series_id)
+        if series is None or original in series["exdates"]:
+            return
+        series["exdates"].append(original)
+        series["overrides"].pop(original, None)
+        self._save(data)
+
+    def override(self, series_id, original, text=None, date=None):
+        """
+        Change the text of one occurrence and/or move it to date.
+        """
+        data = self._data()
+        series = data["series"].get(series_id)
+        if series is None:
+            return
+        change = series["overrides"].setdefault(original, {})
+        if text is not None:
+            change["text"] = text
+        if date is not None:
+            change["date"] = day_key(parse_day(date))
+        self._save(data)
+
+    # ---------- queries ----------
+
+    def occurrences(self, start, end):
+        """
+        Every Occurrence shown from start to end (inclusive), by day.
+        Treat the returned list as read-only; it is cached.
+        """
+        start, end = day_key(parse_day(start)), day_key(parse_day(end))
+        data = self._data()
+        if self._windows_rev != data.get("rev"):
+            self._windows.clear()
+            self._windows_rev = data.get("rev")
+        key = (start, end)
+        found = self._windows.get(key)
+        if found is not None:
+            self._windows.move_to_end(key)
+            return found
+
+        found = []
+        for series_id, series in data["series"].items():
+            found.extend(self._expand(series_id, series, start, end))
+        found.sort(key=lambda occ: occ.day)
+        self._windows[key] = found
+        if len(self._windows) > CACHE_WINDOWS:
+            self._windows.popitem(last=False)
+        return found
+
+    def _expand(self, series_id, series, start, end):
+        text = series["text"]
+        skipped = set(series.get("exdates", ()))
+        overrides = series.get("overrides", {})
+        rule = self._rule(series_id, series)
+        for day in rule.between(series["start"], start, end):
+            original = day_key(day)
+            if original in skipped:
+                continue
+            change = overrides.get(original)
+            if change is None:
+                yield Occurrence(original, series_id, text, original)
+            elif change.get("date", original) == original:
+                text_here = change.get("text", text)
+                yield Occurrence(original, series_id, text_here, original)
+        # occurrences moved into the window from elsewhere
+        for original, change in overrides.items():
+            moved_to = change.get("date", original)
+            if moved_to != original and start <= moved_to <= end:
+                if original not in skipped:
+                    yield Occurrence(
+                        moved_to, series_id, change.get("text", text), original
+                    )
+
+    def range_counts(self, start, end):
+        """
+        [(day, occurrences), ...] like ScheduleIndex.range_counts().
+        """
+        counts = collections.Counter(occ.day for occ in self.occurrences(start, end))
+        return sorted(counts.items())
+
+
+_store = None
+
+
+def get_recurrence():
+    global _store
+    if _store is None:
+        _store = RecurrenceStore()
+    return _store
+
+
+def main(argv):
+    if len(argv) < 4 or argv[1] != "expand":
+        print("usage: python recurrence.py expand <yyyy-MM-dd> <yyyy-MM-dd>")
+        return 2
+    for occ in get_recurrence().occurrences(argv[2], argv[3]):
+        print(u"{0}  {1}".format(occ.day, occ.text))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,513 @@
+"""
+Repository API used by the pages.
+
+Each logical store (users, todos, flashcards, notes, resources, schedule)
+is reached through a small object with row-level operations, so the
+storage backend can decide how much actually has to be written:
+
+- "json"   → the classic data/*.json files (whole-document saves)
+- "sqlite" → data/study_helper.db (single-row inserts/updates/deletes)
+
+With "journal" switched on, the json backend keeps todos and flashcards
+as snapshot + append-only journal (see journal.py). With "notes" set to
+"sharded", notes live in an index plus one file per unit (notes_store.py).
+
+The backend comes from data/storage.json; see data_manager.get_backend().
+"""
+
+import uuid
+
+from data_manager import (
+    load_json,
+    save_json,
+    load_users,
+    save_users,
+    get_backend,
+    load_storage_config,
+)
+
+
+# ---------- Helpers for legacy data ----------
+
+
+def normalize_notes_data(data):
+    """
+    Normalise any previous notes.json format into:
+    {
+        "folders": {
+            "Subject": {
+                "complete": bool,
+                "units": {
+                    "Unit name": {"content": "..."}
+                }
+            }
+        }
+    }
+    """
+    if not isinstance(data, dict):
+        data = {}
+    folders = data.get("folders", {})
+
+    # If folders is a list of names, convert
+    if isinstance(folders, list):
+        new_f = {}
+        for f in folders:
+            if isinstance(f, str):
+                new_f[f] = {"complete": False, "units": {}}
+        folders = new_f
+
+    if not isinstance(folders, dict):
+        folders = {}
+
+    changed = False
+    for name, val in list(folders.items()):
+        if isinstance(val, dict):
+            # Old shape: {"content": "..."}
+            if "units" not in val and "content" in val:
+                content = val.get("content", "")
+                folders[name] = {
+                    "complete": False,
+                    "units": {"General": {"content": content}},
+                }
+                changed = True
+            else:
+                if "complete" not in val:
+                    val["complete"] = False
+                    changed = True
+                if "units" not in val or not isinstance(val["units"], dict):
+                    val["units"] = {}
+                    changed = True
+        else:
+            folders[name] = {"complete": False, "units": {}}
+            changed = True
+
+    data["folders"] = folders
+    if changed:
+        save_json("notes.json", data)
+    return data
+
+
+def normalize_schedule_data(raw):
+    """
+    Legacy schedule.json might be a list; new is a dict.
+    """
+    if isinstance(raw, list):
+        return {"__all__": raw}
+    if not isinstance(raw, dict):
+        return {}
+    return raw
+
+
+def normalize_resources_data(data):
+    """
+    Legacy resources.json was a flat list of links; new shape is
+    {"subjects": {"Subject": {"units": {"Unit": [links]}}}}.
+    """
+    if isinstance(data, list):
+        data = {"subjects": {"General": {"units": {"All": data}}}}
+        save_json("resources.json", data)
+        return data
+    if not isinstance(data, dict):
+        data = {"subjects": {}}
+        save_json("resources.json", data)
+        return data
+    if "subjects" not in data or not isinstance(data["subjects"], dict):
+        data["subjects"] = {}
+        save_json("resources.json", data)
+    return data
+
+
+def new_record_id():
+    """
+    Id for a new todo / flashcard. Stable for the life of the record;
+    the sqlite backend uses its integer row ids instead.
+    """
+    return uuid.uuid4().hex
+
+
+# ================= JSON BACKEND =================
+
+
+class JsonListRepository:
+    """
+    A list of flat records kept in one JSON file (todos.json,
+    flashcards.json). Records handed out by all() are the stored
+    dicts themselves; pass them back to update()/delete().
+
+    Every record has a unique "id"; records saved before ids existed
+    get one the first time the file is loaded.
+    """
+
+    def __init__(self, fname, defaults=None):
+        self.fname = fname
+        self.defaults = defaults or {}
+        self._checked = None
+        self._by_id = {}
+
+    def all(self):
+        data = load_json(self.fname, [])
+        if not isinstance(data, list):
+            data = []
+            save_json(self.fname, data)
+        # Fill missing fields once per loaded document, not on every call
+        if data is not self._checked:
+            changed = False
+            for rec in data:
+                for key, value in self.defaults.items():
+                    if key not in rec:
+                        rec[key] = value
+                        changed = True
+                if "id" not in rec:
+                    rec["id"] = new_record_id()
+                    changed = True
+            if changed:
+                save_json(self.fname, data)
+            self._checked = data
+            self._by_id = {rec["id"]: rec for rec in data}
+        return data
+
+    def get(self, record_id):
+        """
+        Record with the given id, or None.
+        """
+        self.all()
+        return self._by_id.get(record_id)
+
+    def _index_of(self, data, record):
+        # only delete() needs the position
+        for i, rec in enumerate(data):
+            if rec is record:
+                return i
+        # file was reloaded since the record was handed out
+        current = self._by_id.get(record.get("id"))
+        for i, rec in enumerate(data):
+            if rec is current:
+                return i
+        return None
+
+    def add(self, record):
+        data = self.all()
+        rec = dict(self.defaults)
+        rec.update(record)
+        rec.setdefault("id", new_record_id())
+        data.append(rec)
+        self._by_id[rec["id"]] = rec
+        save_json(self.fname, data)
+        return rec
+
+    def add_many(self, records):
+        """
+        add() for a batch of records, saved once.
+        """
+        data = self.all()
+        added = []
+        for record in records:
+            rec = dict(self.defaults)
+            rec.update(record)
+            rec.setdefault("id", new_record_id())
+            self._by_id[rec["id"]] = rec
+            added.append(rec)
+        data.extend(added)
+        save_json(self.fname, data)
+        return added
+
+    def update(self, record, **fields):
+        """
+        Change fields of record; False if it is no longer stored.
+        """
+        data = self.all()
+        # the stored dict, also if the file was reloaded since record
+        # was handed out; no need to know where it is in the list
+        current = self._by_id.get(record.get("id"))
+        record.update(fields)
+        if current is None:
+            return False
+        current.update(fields)
+        save_json(self.fname, data)
+        return True
+
+    def delete(self, record):
+        data = self.all()
+        idx = self._index_of(data, record)
+        if idx is None:
+            return
+        self._by_id.pop(data[idx].get("id"), None)
+        del data[idx]
+        save_json(self.fname, data)
+
+
+class JsonUsersRepository:
+    """
+    users.json: {"username": "password", ...}
+    """
+
+    def get_password(self, username):
+        return load_users().get(username)
+
+    def add_user(self, username, password):
+        users = load_users()
+        users[username] = password
+        save_users(users)
+
+    def delete_user(self, username):
+        users = load_users()
+        if users.pop(username, None) is not None:
+            save_users(users)
+
+
+class JsonNotesRepository:
+    """
+    notes.json, normalised by normalize_notes_data().
+    """
+
+    FNAME = "notes.json"
+
+    def _data(self):
+        raw = load_json(self.FNAME, {"folders": {}})
+        data = normalize_notes_data(raw)
+        if data is not raw:
+            save_json(self.FNAME, data)
+        return data
+
+    def _folders(self):
+        return self._data()["folders"]
+
+    def _save(self):
+        save_json(self.FNAME, self._data())
+
+    def subjects(self):
+        return [
+            (name, bool(info.get("complete", False)))
+            for name, info in self._folders().items()
+        ]
+
+    def has_subject(self, name):
+        return name in self._folders()
+
+    def add_subject(self, name):
+        self._folders()[name] = {"complete": False, "units": {}}
+        self._save()
+
+    def delete_subject(self, name):
+        self._folders().pop(name, None)
+        self._save()
+
+    def set_complete(self, name, complete):
+        folder = self._folders().get(name)
+        if folder is None:
+            return
+        folder["complete"] = bool(complete)
+        self._save()
+
+    def completion(self):
+        folders = self._folders()
+        complete = sum(1 for f in folders.values() if f.get("complete"))
+        return complete, len(folders)
+
+    def units(self, subject):
+        folder = self._folders().get(subject)
+        if folder is None:
+            return []
+        return list(folder["units"].keys())
+
+    def add_unit(self, subject, unit):
+        self._folders()[subject]["units"][unit] = {"content": ""}
+        self._save()
+
+    def delete_unit(self, subject, unit):
+        self._folders()[subject]["units"].pop(unit, None)
+        self._save()
+
+    def unit_content(self, subject, unit):
+        folder = self._folders().get(subject, {})
+        return folder.get("units", {}).get(unit, {}).get("content", "")
+
+    def save_unit(self, subject, unit, content):
+        units = self._folders()[subject]["units"]
+        units.setdefault(unit, {})["content"] = content
+        self._save()
+
+
+class JsonResourcesRepository:
+    """
+    resources.json, normalised by normalize_resources_data().
+    """
+
+    FNAME = "resources.json"
+
+    def _data(self):
+        return normalize_resources_data(load_json(self.FNAME, {"subjects": {}}))
+
+    def _subjects(self):
+        return self._data()["subjects"]
+
+    def _save(self):
+        save_json(self.FNAME, self._data())
+
+    def subjects(self):
+        return sorted(self._subjects().keys())
+
+    def has_subject(self, name):
+        return name in self._subjects()
+
+    def add_subject(self, name):
+        self._subjects()[name] = {"units": {}}
+        self._save()
+
+    def units(self, subject):
+        subj = self._subjects().get(subject)
+        if subj is None:
+            return []
+        return list(subj["units"].keys())
+
+    def add_unit(self, subject, unit):
+        self._subjects()[subject]["units"][unit] = []
+        self._save()
+
+    def links(self, subject, unit):
+        subj = self._subjects().get(subject, {})
+        return list(subj.get("units", {}).get(unit, []))
+
+    def add_link(self, subject, unit, url):
+        units = self._subjects()[subject]["units"]
+        units.setdefault(unit, []).append(url)
+        self._save()
+
+    def set_links(self, subject, unit, urls):
+        self._subjects()[subject]["units"][unit] = list(urls)
+        self._save()
+
+
+class JsonScheduleRepository:
+    """
+    schedule.json: {"yyyy-MM-dd": [entries], "__all__": [legacy entries]}
+    """
+
+    FNAME = "schedule.json"
+
+    def _data(self):
+        raw = load_json(self.FNAME, {})
+        data = normalize_schedule_data(raw)
+        if data is not raw:
+            save_json(self.FNAME, data)
+        return data
+
+    def entries(self, day):
+        return list(self._data().get(day, []))
+
+    def legacy(self):
+        return list(self._data().get("__all__", []))
+
+    def day_counts(self):
+        """
+        {day: number of entries} for every dated day (legacy excluded).
+        """
+        return {
+            day: len(entries)
+            for day, entries in self._data().items()
+            if not day.startswith("__") and entries
+        }
+
+    def add_entry(self, day, text):
+        data = self._data()
+        data.setdefault(day, []).append(text)
+        save_json(self.FNAME, data)
+
+    def add_entries(self, pairs):
+        """
+        Add many (day, text) entries with one write.
+        """
+        data = self._data()
+        for day, text in pairs:
+            data.setdefault(day, []).append(text)
+        save_json(self.FNAME, data)
+
+
+# ================= WRAPPERS =================
+
+
+class RepositoryWrapper:
+    """
+    Base for the wrappers get_repository() stacks on a backend (search
+    index, URL index, date index, dashboard counters). Anything a
+    wrapper doesn't define is passed through to inner.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+# ================= FACTORY =================
+
+LIST_STORES = {
+    "todos": ("todos.json", {"text": "", "priority": "Low", "done": False}),
+    "flashcards": ("flashcards.json", {"front": "", "back": "", "known": False}),
+}
+
+_repositories = {}
+
+
+def _build(store, backend):
+    if backend == "sqlite":
+        import sqlite_backend
+
+        return sqlite_backend.build_repository(store)
+
+    if store in LIST_STORES:
+        fname, defaults = LIST_STORES[store]
+        config = load_storage_config()
+        if config.get("journal"):
+            from journal import JournalListRepository
+
+            return JournalListRepository(
+                fname,
+                defaults,
+                max_bytes=config.get("journal_max_bytes", 1024 * 1024),
+                max_ratio=config.get("journal_max_ratio", 0.5),
+            )
+        return JsonListRepository(fname, defaults)
+    if store == "users":
+        return JsonUsersRepository()
+    if store == "notes":
+        if load_storage_config().get("notes") == "sharded":
+            from notes_store import ShardedNotesRepository
+
+            return ShardedNotesRepository()
+        return JsonNotesRepository()
+    if store == "resources":
+        return JsonResourcesRepository()
+    if store == "schedule":
+        return JsonScheduleRepository()
+    raise KeyError(store)
+
+
+def get_repository(store, backend=None):
+    """
+    Shared repository for a logical store:
+    "users", "todos", "flashcards", "notes", "resources" or "schedule".
+
+    backend defaults to the configured one; migrations pass it explicitly.
+    """
+    if backend is None:
+        backend = get_backend()
+    key = (store, backend)
+    repo = _repositories.get(key)
+    if repo is None:
+        # The wrapper modules subclass RepositoryWrapper, so they are
+        # imported here rather than at the top
+        import notes_search
+        import resource_index
+        import schedule_index
+        import stats
+
+        # Mutations go through the notes search index, the resource URL
+        # index, the schedule date index and the dashboard counters
+        repo = notes_search.wrap_repository(store, _build(store, backend))
+        repo = resource_index.wrap_repository(store, repo)
+        repo = schedule_index.wrap_repository(store, repo)
+        repo = stats.wrap_repository(store, repo)
+        _repositories[key] = repo
+    return repo
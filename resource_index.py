@@ -0,0 +1,242 @@
+"""
+Normalized URL index over all resource links.
+
+normalize_url() reduces a link to the form two copies of "the same" link
+share: http and https are treated alike, the host is lower-cased, default
+ports, trailing slashes, fragments and tracking parameters (utm_*,
+fbclid, ...) are dropped and the remaining query parameters are sorted.
+The link as typed is what gets stored; the normalized form is only the
+index key.
+
+ResourceIndex maps every key to the places it is filed,
+[(subject, unit, url as stored), ...], so "is this a duplicate?" and
+"where else is this link?" are dict lookups. It is built from the
+repository on first use and kept up to date by the repository wrapper
+(see wrap_repository). From a shell:
+
+    python resource_index.py dupes
+    python resource_index.py dedup [--across-units]
+    python resource_index.py where <url>
+"""
+
+import re
+import sys
+import urllib.parse
+
+from data_manager import deferred_writes
+from repositories import RepositoryWrapper
+
+TRACKING_PARAMS = frozenset(
+    [
+        "fbclid",
+        "gclid",
+        "dclid",
+        "msclkid",
+        "yclid",
+        "igshid",
+        "mc_cid",
+        "mc_eid",
+        "_hsenc",
+        "_hsmi",
+        "ref_src",
+        "spm",
+    ]
+)
+TRACKING_PREFIXES = ("utm_",)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# "host:8080/..." has a port, not a scheme
+_SCHEME_RE = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*:(?!\d)")
+
+
+def _tracking(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def normalize_url(url):
+    """
+    Index key for url. Links that aren't http(s) (mailto:, file:, ...)
+    are only trimmed.
+    """
+    url = url.strip()
+    if not _SCHEME_RE.match(url):
+        url = "http://" + url  # "example.com/page" as typed into the box
+    try:
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        return url
+
+    host = (parts.hostname or "").rstrip(".")
+    if ":" in host:
+        host = u"[{0}]".format(host)  # IPv6
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        host = u"{0}:{1}".format(host, port)
+    path = re.sub(r"/{2,}", "/", parts.path).rstrip("/")
+    params = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+    query = urllib.parse.urlencode(
+        sorted((name, value) for name, value in params if not _tracking(name))
+    )
+    # "#!/..." and "#/..." are routes in single-page apps, not anchors
+    fragment = parts.fragment if parts.fragment[:1] in ("!", "/") else ""
+    return urllib.parse.urlunsplit(("http", host, path, query, fragment))
+
+
+class ResourceIndex:
+    def __init__(self, repo):
+        self.repo = repo  # unwrapped resources repository
+        self._places = None
+
+    def _index(self):
+        if self._places is None:
+            self.rebuild()
+        return self._places
+
+    def rebuild(self):
+        self._places = {}
+        for subject in self.repo.subjects():
+            for unit in self.repo.units(subject):
+                for url in self.repo.links(subject, unit):
+                    self._file(subject, unit, url)
+
+    def _file(self, subject, unit, url):
+        key = normalize_url(url)
+        self._places.setdefault(key, []).append((subject, unit, url))
+
+    def _unfile_unit(self, subject, unit, urls):
+        for url in urls:
+            key = normalize_url(url)
+            places = self._places.get(key)
+            if not places:
+                continue
+            place = (subject, unit, url)
+            if place in places:
+                places.remove(place)
+            if not places:
+                del self._places[key]
+
+    # ---------- queries ----------
+
+    def places(self, url):
+        """
+        Every (subject, unit, url as stored) where url is filed.
+        """
+        return list(self._index().get(normalize_url(url), ()))
+
+    def duplicates(self):
+        """
+        {key: places} for every link filed more than once.
+        """
+        return {
+            key: list(places)
+            for key, places in self._index().items()
+            if len(places) > 1
+        }
+
+    # ---------- changes (called by the wrapper) ----------
+
+    def added(self, subject, unit, url):
+        if self._places is not None:
+            self._file(subject, unit, url)
+
+    def replaced(self, subject, unit, old_urls, new_urls):
+        if self._places is not None:
+            self._unfile_unit(subject, unit, old_urls)
+            for url in new_urls:
+                self._file(subject, unit, url)
+
+
+# ================= REPOSITORY WRAPPER =================
+
+
+class IndexedResourcesRepository(RepositoryWrapper):
+    """
+    Resources repository that keeps the URL index in step with every
+    link change and adds places() / dedup().
+    """
+
+    def __init__(self, inner):
+        super().__init__(inner)
+        self.url_index = ResourceIndex(inner)
+
+    def places(self, url):
+        return self.url_index.places(url)
+
+    def add_link(self, subject, unit, url):
+        self.inner.add_link(subject, unit, url)
+        self.url_index.added(subject, unit, url)
+
+    def set_links(self, subject, unit, urls):
+        old = self.inner.links(subject, unit)
+        self.inner.set_links(subject, unit, urls)
+        self.url_index.replaced(subject, unit, old, urls)
+
+    def dedup(self, across_units=False, subject=None, unit=None):
+        """
+        Drop repeated links, keeping the first copy. By default only
+        repeats within the same unit go; with across_units, a link
+        filed in an earlier unit (subjects and units in list order) is
+        dropped from the later ones too. subject / unit limit the pass
+        to part of the data. Returns the number of links removed.
+        """
+        seen = set()
+        removed = 0
+        with deferred_writes():
+            for subj in self.inner.subjects():
+                if subject is not None and subj != subject:
+                    continue
+                for name in self.inner.units(subj):
+                    if unit is not None and name != unit:
+                        continue
+                    if not across_units:
+                        seen = set()
+                    urls = self.inner.links(subj, name)
+                    kept = []
+                    for url in urls:
+                        key = normalize_url(url)
+                        if key not in seen:
+                            seen.add(key)
+                            kept.append(url)
+                    if len(kept) < len(urls):
+                        removed += len(urls) - len(kept)
+                        self.set_links(subj, name, kept)
+        return removed
+
+
+def wrap_repository(store, repo):
+    if store == "resources":
+        return IndexedResourcesRepository(repo)
+    return repo
+
+
+def main(argv):
+    from repositories import get_repository
+
+    if len(argv) < 2 or argv[1] not in ("dupes", "dedup", "where"):
+        print(
+            "usage: python resource_index.py dupes | dedup [--across-units]"
+            " | where <url>"
+        )
+        return 2
+    repo = get_repository("resources")
+    if argv[1] == "where":
+        for subject, unit, url in repo.places(" ".join(argv[2:])):
+            print(u"{0} › {1}: {2}".format(subject, unit, url))
+        return 0
+    if argv[1] == "dedup":
+        removed = repo.dedup(across_units="--across-units" in argv)
+        print("Removed {0} duplicate links.".format(removed))
+        return 0
+    for key, places in sorted(repo.url_index.duplicates().items()):
+        print(key)
+        for subject, unit, url in places:
+            print(u"    {0} › {1}: {2}".format(subject, unit, url))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,127 @@
+"""
+Sorted date index over the schedule store.
+
+schedule.json is keyed by "yyyy-MM-dd" strings, which sort in date
+order, so a sorted list of the days that have entries (plus their entry
+counts) answers every range question with two bisects:
+
+    index.range_counts("2024-05-01", "2024-05-31")   # [(day, count), ...]
+    index.agenda(date.today(), 7)                     # [(day, [entries]), ...]
+
+Both cost O(log n + k) for k days in the range. The calendar on the
+Schedule page paints its badges from one range_counts() call per visible
+month, and the agenda list under it uses agenda().
+
+The index is built from the repository's day_counts() on first use and
+kept up to date by the repository wrapper (see wrap_repository).
+Legacy entries ("__all__") have no date and are not indexed.
+"""
+
+import bisect
+import datetime
+
+from repositories import RepositoryWrapper
+
+AGENDA_DAYS = 14
+
+
+def day_key(day):
+    """
+    "yyyy-MM-dd" for a datetime.date, or the string itself.
+    """
+    if isinstance(day, (datetime.date, datetime.datetime)):
+        return day.strftime("%Y-%m-%d")
+    return day
+
+
+class ScheduleIndex:
+    def __init__(self, repo):
+        self.repo = repo  # unwrapped schedule repository
+        self._days = None
+        self._counts = None
+
+    def _load(self):
+        if self._days is None:
+            self.rebuild()
+
+    def rebuild(self):
+        self._counts = dict(self.repo.day_counts())
+        self._days = sorted(self._counts)
+
+    # ---------- queries ----------
+
+    def range_counts(self, start, end):
+        """
+        [(day, entry count), ...] for the days from start to end
+        (inclusive) that have entries, in date order.
+        """
+        self._load()
+        lo = bisect.bisect_left(self._days, day_key(start))
+        hi = bisect.bisect_right(self._days, day_key(end))
+        return [(day, self._counts[day]) for day in self._days[lo:hi]]
+
+    def agenda(self, start, days=AGENDA_DAYS):
+        """
+        [(day, [entries]), ...] for the days in [start, start + days)
+        that have entries.
+        """
+        if isinstance(start, str):
+            start = datetime.datetime.strptime(start, "%Y-%m-%d").date()
+        end = start + datetime.timedelta(days=days - 1)
+        return [
+            (day, self.repo.entries(day)) for day, _ in self.range_counts(start, end)
+        ]
+
+    def next_day(self, after):
+        """
+        First day after `after` that has entries, or None.
+        """
+        self._load()
+        pos = bisect.bisect_right(self._days, day_key(after))
+        return self._days[pos] if pos < len(self._days) else None
+
+    # ---------- changes (called by the wrapper) ----------
+
+    def added(self, day, n=1):
+        if self._days is None or day.startswith("__"):
+            return
+        if day not in self._counts:
+            bisect.insort(self._days, day)
+            self._counts[day] = 0
+        self._counts[day] += n
+
+
+# ================= REPOSITORY WRAPPER =================
+
+
+class IndexedScheduleRepository(RepositoryWrapper):
+    """
+    Schedule repository that keeps the date index in step with every
+    new entry and adds range_counts() / agenda().
+    """
+
+    def __init__(self, inner):
+        super().__init__(inner)
+        self.date_index = ScheduleIndex(inner)
+
+    def range_counts(self, start, end):
+        return self.date_index.range_counts(start, end)
+
+    def agenda(self, start, days=AGENDA_DAYS):
+        return self.date_index.agenda(start, days)
+
+    def add_entry(self, day, text):
+        self.inner.add_entry(day, text)
+        self.date_index.added(day)
+
+    def add_entries(self, pairs):
+        pairs = list(pairs)
+        self.inner.add_entries(pairs)
+        for day, _ in pairs:
+            self.date_index.added(day)
+
+
+def wrap_repository(store, repo):
+    if store == "schedule":
+        return IndexedScheduleRepository(repo)
+    return repo
@@ -0,0 +1,337 @@
+"""
+Focus-session history.
+
+Every focus session the Timer page ends (run to zero or reset part way)
+is appended as one line to data/focus_sessions.jsonl:
+
+    [start, seconds, planned, completed, "subject"]
+
+start is a unix time, seconds the time actually focused, planned the
+length it was started with, completed 1 or 0, and subject "" if the
+session wasn't tagged. The log is only ever appended to.
+
+Rollups live in data/focus_stats.json and are updated with each
+append, so the dashboard never reads the log:
+
+{
+    "version": 1,
+    "log_bytes": int,                      # how much of the log is counted
+    "total": [seconds, sessions, completed],
+    "days": {"yyyy-MM-dd": [seconds, sessions, completed]},
+    "weeks": {"yyyy-Www": [...]},          # ISO weeks
+    "subjects": {"<subject>": [...]}
+}
+
+day(), week(), subject() and total() are dict lookups, however long
+the history gets. A session counts on the (local) day and week it
+started. log_bytes makes a crash between the append and the rollup
+update harmless: lines past it are counted on the next load. A torn
+last line (no newline, at the end of the file) is cut off before the
+next append; a malformed line anywhere else is skipped and its byte
+offset kept in "skipped", which summary and verify report.
+
+    python session_log.py summary
+    python session_log.py verify      # compare with a full replay
+    python session_log.py rebuild
+"""
+
+import os
+import sys
+import json
+import datetime
+
+from data_manager import DATA_DIR, load_json, save_json
+
+LOG_PATH = os.path.join(DATA_DIR, "focus_sessions.jsonl")
+ROLLUPS_NAME = "focus_stats.json"
+EMPTY = (0, 0, 0)
+
+
+def day_key(moment):
+    return datetime.datetime.fromtimestamp(moment).strftime("%Y-%m-%d")
+
+
+def week_key(day):
+    """
+    ISO week ("2024-W05") of a date, datetime or "yyyy-MM-dd".
+    """
+    if isinstance(day, str):
+        day = datetime.datetime.strptime(day, "%Y-%m-%d")
+    return day.strftime("%G-W%V")
+
+
+def _empty_rollups():
+    return {
+        "version": 1,
+        "log_bytes": 0,
+        "total": list(EMPTY),
+        "days": {},
+        "weeks": {},
+        "subjects": {},
+        "skipped": [],
+    }
+
+
+def _add(bucket, seconds, completed):
+    bucket[0] += seconds
+    bucket[1] += 1
+    bucket[2] += 1 if completed else 0
+
+
+def _count(rollups, session):
+    start, seconds, _, completed, subject = session
+    _add(rollups["total"], seconds, completed)
+    key = day_key(start)
+    for group, name in (
+        ("days", key),
+        ("weeks", week_key(key)),
+        ("subjects", subject),
+    ):
+        _add(rollups[group].setdefault(name, list(EMPTY)), seconds, completed)
+
+
+def _parse(line):
+    try:
+        start, seconds, planned, completed, subject = json.loads(line.decode("utf-8"))
+    except (ValueError, TypeError):
+        return None
+    numbers = (start, seconds, planned)
+    if not all(isinstance(n, (int, float)) for n in numbers) or not (
+        subject is None or isinstance(subject, str)
+    ):
+        return None
+    return (start, seconds, planned, bool(completed), subject or "")
+
+
+def _read_sessions(path, offset=0):
+    """
+    (sessions, end offset, [offsets of malformed lines]) for the
+    newline-terminated lines of the log from offset on. Malformed lines
+    are skipped; an unterminated fragment at the end is left out.
+    """
+    sessions = []
+    skipped = []
+    end = offset
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return sessions, end, skipped
+    with f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # torn write, only ever the last line
+            session = _parse(line)
+            if session is None:
+                skipped.append(end)
+            else:
+                sessions.append(session)
+            end += len(line)
+    return sessions, end, skipped
+
+
+class SessionLog:
+    def __init__(self, path=LOG_PATH):
+        self.path = path
+
+    # ---------- rollups ----------
+
+    def _rollups(self):
+        rollups = load_json(ROLLUPS_NAME, None)
+        if not isinstance(rollups, dict) or rollups.get("version") != 1:
+            return self.rebuild()
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size < rollups["log_bytes"]:
+            return self.rebuild()  # log replaced or cut short by hand
+        if size > rollups["log_bytes"]:
+            self._catch_up(rollups)
+        return rollups
+
+    def _catch_up(self, rollups):
+        sessions, end, skipped = _read_sessions(self.path, rollups["log_bytes"])
+        if end == rollups["log_bytes"]:
+            return  # nothing but a torn last line
+        for session in sessions:
+            _count(rollups, session)
+        rollups.setdefault("skipped", []).extend(skipped)
+        rollups["log_bytes"] = end
+        save_json(ROLLUPS_NAME, rollups)
+
+    def rebuild(self):
+        """
+        Recount everything from the log. O(log size); only needed when
+        the rollups are missing or don't match the log.
+        """
+        rollups = _empty_rollups()
+        self._catch_up(rollups)
+        save_json(ROLLUPS_NAME, rollups)
+        return rollups
+
+    # ---------- queries ----------
+
+    def total(self):
+        """
+        (seconds, sessions, completed) over the whole history.
+        """
+        return tuple(self._rollups()["total"])
+
+    def day(self, day=None):
+        """
+        (seconds, sessions, completed) for a date or "yyyy-MM-dd"
+        (today by default).
+        """
+        if day is None:
+            day = datetime.date.today()
+        if not isinstance(day, str):
+            day = day.strftime("%Y-%m-%d")
+        return tuple(self._rollups()["days"].get(day, EMPTY))
+
+    def week(self, day=None):
+        """
+        Same, for the ISO week containing day.
+        """
+        key = week_key(day or datetime.date.today())
+        return tuple(self._rollups()["weeks"].get(key, EMPTY))
+
+    def subject(self, subject):
+        return tuple(self._rollups()["subjects"].get(subject or "", EMPTY))
+
+    def subjects(self):
+        """
+        {subject: (seconds, sessions, completed)}; "" is untagged.
+        """
+        return {
+            name: tuple(bucket)
+            for name, bucket in self._rollups()["subjects"].items()
+        }
+
+    def skipped(self):
+        """
+        Byte offsets of log lines that couldn't be read and weren't counted.
+        """
+        return list(self._rollups().get("skipped", ()))
+
+    @property
+    def rev(self):
+        """
+        Goes up with every session, for views that redraw on change.
+        """
+        return self._rollups()["log_bytes"]
+
+    # ---------- recording ----------
+
+    def record(self, start, seconds, planned, completed, subject=None):
+        """
+        Append one session and count it in the rollups.
+        """
+        rollups = self._rollups()
+        session = (
+            int(start),
+            int(round(seconds)),
+            int(planned),
+            bool(completed),
+            subject or "",
+        )
+        fields = [session[0], session[1], session[2], int(session[3]), session[4]]
+        line = json.dumps(fields, ensure_ascii=False, separators=(",", ":"))
+        line = line.encode("utf-8") + b"\n"
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "ab") as f:
+            if f.tell() > rollups["log_bytes"]:
+                # everything counted ends in a newline, so what's left
+                # past log_bytes is a torn write at the end of the file
+                f.truncate(rollups["log_bytes"])
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        _count(rollups, session)
+        rollups["log_bytes"] += len(line)
+        save_json(ROLLUPS_NAME, rollups)
+
+    def verify(self):
+        """
+        {key: (stored, actual)} for every rollup that differs from a
+        full replay of the log.
+        """
+        stored = self._rollups()
+        actual = _empty_rollups()
+        sessions = _read_sessions(self.path)[0]
+        for session in sessions:
+            _count(actual, session)
+        drift = {}
+        if stored["total"] != actual["total"]:
+            drift["total"] = (stored["total"], actual["total"])
+        for group in ("days", "weeks", "subjects"):
+            for name in sorted(set(stored[group]) | set(actual[group])):
+                a = stored[group].get(name, list(EMPTY))
+                b = actual[group].get(name, list(EMPTY))
+                if a != b:
+                    drift[u"{0}[{1}]".format(group, name)] = (a, b)
+        return drift
+
+
+def format_duration(seconds):
+    """
+    "1h 05m" / "25m".
+    """
+    minutes = int(seconds) // 60
+    if minutes < 60:
+        return u"{0}m".format(minutes)
+    return u"{0}h {1:02d}m".format(minutes // 60, minutes % 60)
+
+
+_log = None
+
+
+def get_session_log():
+    global _log
+    if _log is None:
+        _log = SessionLog()
+    return _log
+
+
+def _print_skipped(log):
+    skipped = log.skipped()
+    if skipped:
+        print(u"{0} unreadable lines skipped, at bytes {1}".format(
+            len(skipped), ", ".join(str(offset) for offset in skipped)
+        ))
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] not in ("summary", "verify", "rebuild"):
+        print("usage: python session_log.py summary|verify|rebuild")
+        return 2
+    log = get_session_log()
+    if argv[1] == "rebuild":
+        log.rebuild()
+    elif argv[1] == "verify":
+        drift = log.verify()
+        if not drift:
+            print("Rollups match the log.")
+            _print_skipped(log)
+            return 0
+        for key, (stored, actual) in sorted(drift.items()):
+            print(u"{0}: stored {1}, actual {2}".format(key, stored, actual))
+        return 1
+    for label, (seconds, sessions, completed) in (
+        ("Today", log.day()),
+        ("This week", log.week()),
+        ("All time", log.total()),
+    ):
+        print(u"{0}: {1} in {2} sessions ({3} completed)".format(
+            label, format_duration(seconds), sessions, completed
+        ))
+    for name, (seconds, sessions, _) in sorted(log.subjects().items()):
+        print(u"  {0}: {1} in {2} sessions".format(
+            name or "(untagged)", format_duration(seconds), sessions
+        ))
+    _print_skipped(log)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,651 @@
+"""
+SQLite storage backend.
+
+All logical stores live in data/study_helper.db with one table (or a
+small group of tables) per store. The repositories below implement the
+same API as the JSON ones in repositories.py, but every edit is a
+single-row statement instead of a whole-document rewrite.
+
+Switch an existing workspace over with:
+
+    python sqlite_backend.py migrate
+"""
+
+import os
+import sys
+import json
+import sqlite3
+
+import data_manager
+from data_manager import (
+    load_json,
+    load_users,
+    load_storage_config,
+    save_storage_config,
+)
+
+DB_NAME = "study_helper.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS todos (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_todos_done_priority ON todos(done, priority);
+
+CREATE TABLE IF NOT EXISTS flashcards (
+    id INTEGER PRIMARY KEY,
+    front TEXT NOT NULL,
+    back TEXT NOT NULL,
+    known INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_flashcards_known ON flashcards(known);
+
+CREATE TABLE IF NOT EXISTS note_subjects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    complete INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS note_units (
+    id INTEGER PRIMARY KEY,
+    subject_id INTEGER NOT NULL REFERENCES note_subjects(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    content TEXT NOT NULL DEFAULT '',
+    UNIQUE (subject_id, name)
+);
+
+CREATE TABLE IF NOT EXISTS resource_subjects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS resource_units (
+    id INTEGER PRIMARY KEY,
+    subject_id INTEGER NOT NULL REFERENCES resource_subjects(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    UNIQUE (subject_id, name)
+);
+
+CREATE TABLE IF NOT EXISTS resource_links (
+    id INTEGER PRIMARY KEY,
+    unit_id INTEGER NOT NULL REFERENCES resource_units(id) ON DELETE CASCADE,
+    url TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_resource_links_unit ON resource_links(unit_id);
+
+CREATE TABLE IF NOT EXISTS schedule (
+    id INTEGER PRIMARY KEY,
+    day TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_schedule_day ON schedule(day);
+"""
+
+_conn = None
+
+
+def db_path():
+    return os.path.join(data_manager.DATA_DIR, DB_NAME)
+
+
+def connect():
+    """
+    Shared connection for the process, created (with the schema) on
+    first use.
+    """
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(db_path())
+        _conn.row_factory = sqlite3.Row
+        _conn.execute("PRAGMA foreign_keys = ON")
+        _conn.execute("PRAGMA journal_mode = WAL")
+        _conn.executescript(SCHEMA)
+    return _conn
+
+
+def close():
+    global _conn
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+
+# -------------------------------------------------------------------
+# SETTINGS
+# -------------------------------------------------------------------
+
+
+def load_settings(default):
+    conn = connect()
+    rows = conn.execute("SELECT key, value FROM settings").fetchall()
+    if not rows:
+        return dict(default)
+    return {row["key"]: json.loads(row["value"]) for row in rows}
+
+
+def save_settings(settings):
+    conn = connect()
+    with conn:
+        conn.executemany(
+            "INSERT INTO settings (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            [(k, json.dumps(v, ensure_ascii=False)) for k, v in settings.items()],
+        )
+
+
+# ================= REPOSITORIES =================
+
+
+class SqliteListRepository:
+    """
+    todos / flashcards. Known fields map to columns; anything else a
+    record carries is kept as JSON in the "extra" column. Records carry
+    their row "id".
+    """
+
+    def __init__(self, table, columns, booleans=()):
+        self.table = table
+        self.columns = list(columns)
+        self.booleans = set(booleans)
+
+    def _to_record(self, row):
+        rec = {"id": row["id"]}
+        for col in self.columns:
+            value = row[col]
+            rec[col] = bool(value) if col in self.booleans else value
+        if row["extra"]:
+            rec.update(json.loads(row["extra"]))
+        return rec
+
+    def _split(self, record):
+        values = []
+        for col in self.columns:
+            value = record.get(col, False if col in self.booleans else "")
+            values.append(int(bool(value)) if col in self.booleans else value)
+        extra = {
+            k: v for k, v in record.items() if k != "id" and k not in self.columns
+        }
+        return values, (json.dumps(extra, ensure_ascii=False) if extra else None)
+
+    def all(self):
+        rows = connect().execute(
+            "SELECT * FROM {0} ORDER BY id".format(self.table)
+        ).fetchall()
+        return [self._to_record(r) for r in rows]
+
+    def get(self, record_id):
+        row = connect().execute(
+            "SELECT * FROM {0} WHERE id = ?".format(self.table), (record_id,)
+        ).fetchone()
+        return self._to_record(row) if row else None
+
+    def add(self, record):
+        values, extra = self._split(record)
+        conn = connect()
+        with conn:
+            cur = conn.execute(
+                "INSERT INTO {0} ({1}, extra) VALUES ({2}, ?)".format(
+                    self.table,
+                    ", ".join(self.columns),
+                    ", ".join("?" for _ in self.columns),
+                ),
+                values + [extra],
+            )
+        rec = dict(record)
+        rec["id"] = cur.lastrowid
+        return rec
+
+    def add_many(self, records):
+        sql = "INSERT INTO {0} ({1}, extra) VALUES ({2}, ?)".format(
+            self.table,
+            ", ".join(self.columns),
+            ", ".join("?" for _ in self.columns),
+        )
+        conn = connect()
+        added = []
+        with conn:
+            for record in records:
+                values, extra = self._split(record)
+                cur = conn.execute(sql, values + [extra])
+                rec = dict(record)
+                rec["id"] = cur.lastrowid
+                added.append(rec)
+        return added
+
+    def update(self, record, **fields):
+        """
+        Change fields of record; False if it is no longer stored.
+        """
+        record.update(fields)
+        values, extra = self._split(record)
+        conn = connect()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE {0} SET {1}, extra = ? WHERE id = ?".format(
+                    self.table, ", ".join(c + " = ?" for c in self.columns)
+                ),
+                values + [extra, record["id"]],
+            )
+        return cursor.rowcount > 0
+
+    def delete(self, record):
+        conn = connect()
+        with conn:
+            conn.execute(
+                "DELETE FROM {0} WHERE id = ?".format(self.table), (record["id"],)
+            )
+
+
+class SqliteUsersRepository:
+    def get_password(self, username):
+        row = connect().execute(
+            "SELECT password FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return row["password"] if row else None
+
+    def add_user(self, username, password):
+        conn = connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO users (username, password) VALUES (?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET password = excluded.password",
+                (username, password),
+            )
+
+    def delete_user(self, username):
+        conn = connect()
+        with conn:
+            conn.execute("DELETE FROM users WHERE username = ?", (username,))
+
+
+class SqliteNotesRepository:
+    def _subject_id(self, name):
+        row = connect().execute(
+            "SELECT id FROM note_subjects WHERE name = ?", (name,)
+        ).fetchone()
+        return row["id"] if row else None
+
+    def subjects(self):
+        rows = connect().execute(
+            "SELECT name, complete FROM note_subjects ORDER BY id"
+        ).fetchall()
+        return [(r["name"], bool(r["complete"])) for r in rows]
+
+    def has_subject(self, name):
+        return self._subject_id(name) is not None
+
+    def add_subject(self, name):
+        conn = connect()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO note_subjects (name, complete) VALUES (?, 0)",
+                (name,),
+            )
+
+    def delete_subject(self, name):
+        conn = connect()
+        with conn:
+            conn.execute("DELETE FROM note_subjects WHERE name = ?", (name,))
+
+    def set_complete(self, name, complete):
+        conn = connect()
+        with conn:
+            conn.execute(
+                "UPDATE note_subjects SET complete = ? WHERE name = ?",
+                (int(bool(complete)), name),
+            )
+
+    def completion(self):
+        row = connect().execute(
+            "SELECT COALESCE(SUM(complete), 0) AS done, COUNT(*) AS total "
+            "FROM note_subjects"
+        ).fetchone()
+        return row["done"], row["total"]
+
+    def units(self, subject):
+        rows = connect().execute(
+            "SELECT u.name FROM note_units u JOIN note_subjects s "
+            "ON u.subject_id = s.id WHERE s.name = ? ORDER BY u.id",
+            (subject,),
+        ).fetchall()
+        return [r["name"] for r in rows]
+
+    def add_unit(self, subject, unit):
+        sid = self._subject_id(subject)
+        if sid is None:
+            return
+        conn = connect()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO note_units (subject_id, name, content) "
+                "VALUES (?, ?, '')",
+                (sid, unit),
+            )
+
+    def delete_unit(self, subject, unit):
+        sid = self._subject_id(subject)
+        conn = connect()
+        with conn:
+            conn.execute(
+                "DELETE FROM note_units WHERE subject_id = ? AND name = ?",
+                (sid, unit),
+            )
+
+    def unit_content(self, subject, unit):
+        row = connect().execute(
+            "SELECT u.content FROM note_units u JOIN note_subjects s "
+            "ON u.subject_id = s.id WHERE s.name = ? AND u.name = ?",
+            (subject, unit),
+        ).fetchone()
+        return row["content"] if row else ""
+
+    def save_unit(self, subject, unit, content):
+        sid = self._subject_id(subject)
+        if sid is None:
+            return
+        conn = connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO note_units (subject_id, name, content) VALUES (?, ?, ?) "
+                "ON CONFLICT(subject_id, name) DO UPDATE SET content = excluded.content",
+                (sid, unit, content),
+            )
+
+
+class SqliteResourcesRepository:
+    def _subject_id(self, name):
+        row = connect().execute(
+            "SELECT id FROM resource_subjects WHERE name = ?", (name,)
+        ).fetchone()
+        return row["id"] if row else None
+
+    def _unit_id(self, subject, unit):
+        row = connect().execute(
+            "SELECT u.id FROM resource_units u JOIN resource_subjects s "
+            "ON u.subject_id = s.id WHERE s.name = ? AND u.name = ?",
+            (subject, unit),
+        ).fetchone()
+        return row["id"] if row else None
+
+    def subjects(self):
+        rows = connect().execute(
+            "SELECT name FROM resource_subjects ORDER BY name"
+        ).fetchall()
+        return [r["name"] for r in rows]
+
+    def has_subject(self, name):
+        return self._subject_id(name) is not None
+
+    def add_subject(self, name):
+        conn = connect()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO resource_subjects (name) VALUES (?)", (name,)
+            )
+
+    def units(self, subject):
+        rows = connect().execute(
+            "SELECT u.name FROM resource_units u JOIN resource_subjects s "
+            "ON u.subject_id = s.id WHERE s.name = ? ORDER BY u.id",
+            (subject,),
+        ).fetchall()
+        return [r["name"] for r in rows]
+
+    def add_unit(self, subject, unit):
+        sid = self._subject_id(subject)
+        if sid is None:
+            return
+        conn = connect()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO resource_units (subject_id, name) VALUES (?, ?)",
+                (sid, unit),
+            )
+
+    def links(self, subject, unit):
+        uid = self._unit_id(subject, unit)
+        if uid is None:
+            return []
+        rows = connect().execute(
+            "SELECT url FROM resource_links WHERE unit_id = ? ORDER BY id", (uid,)
+        ).fetchall()
+        return [r["url"] for r in rows]
+
+    def add_link(self, subject, unit, url):
+        uid = self._unit_id(subject, unit)
+        if uid is None:
+            self.add_unit(subject, unit)
+            uid = self._unit_id(subject, unit)
+            if uid is None:
+                return
+        conn = connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO resource_links (unit_id, url) VALUES (?, ?)", (uid, url)
+            )
+
+    def set_links(self, subject, unit, urls):
+        uid = self._unit_id(subject, unit)
+        if uid is None:
+            return
+        conn = connect()
+        with conn:
+            conn.execute("DELETE FROM resource_links WHERE unit_id = ?", (uid,))
+            conn.executemany(
+                "INSERT INTO resource_links (unit_id, url) VALUES (?, ?)",
+                [(uid, url) for url in urls],
+            )
+
+
+class SqliteScheduleRepository:
+    def entries(self, day):
+        rows = connect().execute(
+            "SELECT entry FROM schedule WHERE day = ? ORDER BY id", (day,)
+        ).fetchall()
+        return [r["entry"] for r in rows]
+
+    def legacy(self):
+        return self.entries("__all__")
+
+    def day_counts(self):
+        rows = connect().execute(
+            "SELECT day, COUNT(*) AS n FROM schedule "
+            "WHERE substr(day, 1, 2) != '__' GROUP BY day"
+        ).fetchall()
+        return {r["day"]: r["n"] for r in rows}
+
+    def add_entry(self, day, text):
+        conn = connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO schedule (day, entry) VALUES (?, ?)", (day, text)
+            )
+
+    def add_entries(self, pairs):
+        conn = connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO schedule (day, entry) VALUES (?, ?)", list(pairs)
+            )
+
+
+def build_repository(store):
+    if store == "users":
+        return SqliteUsersRepository()
+    if store == "todos":
+        return SqliteListRepository(
+            "todos", ["text", "priority", "done"], booleans=["done"]
+        )
+    if store == "flashcards":
+        return SqliteListRepository(
+            "flashcards", ["front", "back", "known"], booleans=["known"]
+        )
+    if store == "notes":
+        return SqliteNotesRepository()
+    if store == "resources":
+        return SqliteResourcesRepository()
+    if store == "schedule":
+        return SqliteScheduleRepository()
+    raise KeyError(store)
+
+
+# -------------------------------------------------------------------
+# JSON → SQLite migration
+# -------------------------------------------------------------------
+
+
+def migrate_from_json(force=False):
+    """
+    Copy every JSON store into study_helper.db in one transaction and
+    switch data/storage.json to the sqlite backend.
+
+    Refuses to run over a database that already holds data unless
+    force=True, in which case the tables are emptied first. The JSON
+    files are left untouched, so switching "backend" back to "json"
+    returns to the pre-migration state.
+    """
+    # Imported here: repositories imports data_manager, which imports us lazily
+    from repositories import (
+        get_repository,
+        normalize_schedule_data,
+        normalize_resources_data,
+    )
+
+    conn = connect()
+    tables = [
+        "users",
+        "settings",
+        "todos",
+        "flashcards",
+        "note_units",
+        "note_subjects",
+        "resource_links",
+        "resource_units",
+        "resource_subjects",
+        "schedule",
+    ]
+    existing = sum(
+        conn.execute("SELECT COUNT(*) FROM {0}".format(t)).fetchone()[0]
+        for t in tables
+    )
+    if existing and not force:
+        raise RuntimeError(
+            "{0} already contains data; pass force=True to overwrite.".format(
+                DB_NAME
+            )
+        )
+
+    users = load_users()
+    settings = load_json("settings.json", {})
+    # Through the json repositories so a journal tail / sharded notes
+    # are read the same way the app reads them
+    todos = get_repository("todos", "json").all()
+    cards = get_repository("flashcards", "json").all()
+    notes = get_repository("notes", "json")
+    resources = normalize_resources_data(load_json("resources.json", {"subjects": {}}))
+    schedule = normalize_schedule_data(load_json("schedule.json", {}))
+
+    todo_repo = build_repository("todos")
+    card_repo = build_repository("flashcards")
+
+    counts = {}
+    with conn:
+        for t in tables:
+            conn.execute("DELETE FROM {0}".format(t))
+
+        conn.executemany(
+            "INSERT INTO users (username, password) VALUES (?, ?)",
+            list(users.items()),
+        )
+        conn.executemany(
+            "INSERT INTO settings (key, value) VALUES (?, ?)",
+            [(k, json.dumps(v, ensure_ascii=False)) for k, v in settings.items()],
+        )
+
+        for repo, records in ((todo_repo, todos), (card_repo, cards)):
+            rows = []
+            for rec in records:
+                values, extra = repo._split(rec)
+                rows.append(values + [extra])
+            conn.executemany(
+                "INSERT INTO {0} ({1}, extra) VALUES ({2}, ?)".format(
+                    repo.table,
+                    ", ".join(repo.columns),
+                    ", ".join("?" for _ in repo.columns),
+                ),
+                rows,
+            )
+            counts[repo.table] = len(rows)
+
+        subjects = notes.subjects()
+        for name, complete in subjects:
+            cur = conn.execute(
+                "INSERT INTO note_subjects (name, complete) VALUES (?, ?)",
+                (name, int(bool(complete))),
+            )
+            for unit in notes.units(name):
+                conn.execute(
+                    "INSERT INTO note_units (subject_id, name, content) "
+                    "VALUES (?, ?, ?)",
+                    (cur.lastrowid, unit, notes.unit_content(name, unit)),
+                )
+        counts["notes"] = len(subjects)
+
+        link_count = 0
+        for name, info in resources["subjects"].items():
+            cur = conn.execute(
+                "INSERT INTO resource_subjects (name) VALUES (?)", (name,)
+            )
+            for unit, links in (info.get("units") or {}).items():
+                ucur = conn.execute(
+                    "INSERT INTO resource_units (subject_id, name) VALUES (?, ?)",
+                    (cur.lastrowid, unit),
+                )
+                conn.executemany(
+                    "INSERT INTO resource_links (unit_id, url) VALUES (?, ?)",
+                    [(ucur.lastrowid, url) for url in links],
+                )
+                link_count += len(links)
+        counts["links"] = link_count
+
+        rows = []
+        for day, entries in schedule.items():
+            for entry in entries:
+                rows.append((day, entry))
+        conn.executemany("INSERT INTO schedule (day, entry) VALUES (?, ?)", rows)
+        counts["schedule"] = len(rows)
+
+    config = load_storage_config()
+    config["backend"] = "sqlite"
+    save_storage_config(config)
+    return counts
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] not in ("migrate",):
+        print("usage: python sqlite_backend.py migrate [--force]")
+        return 2
+    counts = migrate_from_json(force="--force" in argv[2:])
+    for store, n in sorted(counts.items()):
+        print("{0}: {1}".format(store, n))
+    print("Backend switched to sqlite ({0}).".format(db_path()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,278 @@
+"""
+Spaced repetition for flashcards (SM-2).
+
+Each card carries its own schedule, stored on the card record:
+
+    "reps"      successful reviews in a row
+    "interval"  days until the next review
+    "ease"      SM-2 ease factor (>= 1.3, starts at 2.5)
+    "due"       unix time of the next review
+    "lapses"    times the card was forgotten
+
+"known" is kept as "interval of KNOWN_DAYS or more", so the dashboard
+counters keep working.
+
+ReviewQueue keeps a min-heap of (due, card id), so picking the next due
+card is O(log n) instead of a scan over the deck. Rescheduling pushes a
+new entry and leaves the old one behind; stale entries are recognised
+(and dropped) when they reach the top. due_count() keeps the set of due
+cards and a second heap of the ones not due yet, so the count shown
+after every answer doesn't walk the backlog. The heap is saved to
+data/flashcards_queue.json together with the flashcards version from
+stats.json; on the next start it is reused as-is if no card changed in
+between, and rebuilt from the cards otherwise. The same check runs while
+the app is up, so cards added or deleted elsewhere (e.g. a bulk import)
+show up in the queue; the flashcards page itself goes through the queue
+(add_card, delete_card, review) and never triggers a rebuild.
+"""
+
+import time
+import heapq
+import atexit
+
+from data_manager import load_json, save_json, get_backend
+from repositories import get_repository
+from stats import get_stats
+
+QUEUE_NAME = "flashcards_queue.json"
+
+START_EASE = 2.5
+MIN_EASE = 1.3
+KNOWN_DAYS = 21
+RELEARN_SECONDS = 10 * 60
+DAY = 24 * 60 * 60
+
+# Answer buttons → SM-2 grades
+GRADES = {"again": 1, "hard": 3, "good": 4, "easy": 5}
+
+
+def schedule(card, grade, now=None):
+    """
+    Fields to update on card after answering it with grade (0-5).
+    """
+    now = int(now if now is not None else time.time())
+    reps = card.get("reps", 0)
+    interval = card.get("interval", 0)
+    ease = card.get("ease", START_EASE)
+    lapses = card.get("lapses", 0)
+
+    if grade < 3:
+        reps = 0
+        interval = 0
+        lapses += 1
+        due = now + RELEARN_SECONDS
+    else:
+        reps += 1
+        if reps == 1:
+            interval = 1
+        elif reps == 2:
+            interval = 6
+        else:
+            interval = max(interval + 1, int(round(interval * ease)))
+        due = now + interval * DAY
+
+    ease = max(MIN_EASE, ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+    return {
+        "reps": reps,
+        "interval": interval,
+        "ease": round(ease, 3),
+        "due": due,
+        "lapses": lapses,
+        "known": interval >= KNOWN_DAYS,
+    }
+
+
+class ReviewQueue:
+    def __init__(self, repo):
+        self.repo = repo
+        self._heap = None
+        self._legacy_due = None
+        self._dirty = False
+        self._version = None  # flashcards version the heap matches
+        # due_count() state: ids of cards due by _counted_at, and a heap of
+        # the entries that weren't due yet (None until the first count)
+        self._due_ids = None
+        self._upcoming = None
+        self._counted_at = None
+        atexit.register(self.save)
+
+    # ---------- persistence ----------
+
+    def _cards_version(self):
+        return get_stats()["versions"]["flashcards"]
+
+    def _load(self):
+        saved = load_json(QUEUE_NAME, None)
+        if (
+            isinstance(saved, dict)
+            and saved.get("version") == 1
+            and saved.get("source") == get_backend()
+            and saved.get("cards_version") == self._cards_version()
+            and isinstance(saved.get("heap"), list)
+        ):
+            # saved in heap order, so no heapify needed
+            self._heap = [tuple(entry) for entry in saved["heap"]]
+            self._legacy_due = saved.get("legacy_due")
+            self._due_ids = None
+        else:
+            self.rebuild(saved)
+
+    def rebuild(self, saved=None):
+        """
+        Build the heap from the card records: O(n).
+        """
+        if isinstance(saved, dict) and saved.get("legacy_due"):
+            self._legacy_due = saved["legacy_due"]
+        else:
+            # Cards marked "known" before scheduling existed come back
+            # after KNOWN_DAYS instead of all at once.
+            self._legacy_due = int(time.time()) + KNOWN_DAYS * DAY
+        self._heap = [(self.card_due(card), card["id"]) for card in self.repo.all()]
+        heapq.heapify(self._heap)
+        self._dirty = True
+        self._due_ids = None
+
+    def save(self):
+        if self._heap is None or not self._dirty:
+            return
+        save_json(QUEUE_NAME, {
+            "version": 1,
+            "source": get_backend(),
+            "cards_version": self._cards_version(),
+            "legacy_due": self._legacy_due,
+            "heap": [list(entry) for entry in self._heap],
+        })
+        self._dirty = False
+
+    def _entries(self):
+        version = self._cards_version()
+        if self._heap is None:
+            self._load()
+        elif version != self._version:
+            # cards changed without going through the queue
+            self.rebuild({"legacy_due": self._legacy_due})
+        self._version = version
+        return self._heap
+
+    def _changed(self):
+        # our own edit; the heap already accounts for it
+        self._version = self._cards_version()
+
+    # ---------- queries ----------
+
+    def card_due(self, card):
+        due = card.get("due")
+        if due is not None:
+            return due
+        if card.get("known"):
+            return self._legacy_due
+        return 0  # new card
+
+    def _valid(self, entry):
+        card = self.repo.get(entry[1])
+        if card is None or self.card_due(card) != entry[0]:
+            return None
+        return card
+
+    def _top(self):
+        heap = self._entries()
+        while heap:
+            card = self._valid(heap[0])
+            if card is not None:
+                return heap[0][0], card
+            heapq.heappop(heap)
+            self._dirty = True
+        return None, None
+
+    def next_due(self, now=None):
+        """
+        The card that is due soonest, if it is due by now; else None.
+        """
+        now = time.time() if now is None else now
+        due, card = self._top()
+        if card is None or due > now:
+            return None
+        return card
+
+    def next_due_time(self):
+        """
+        When the earliest card comes due (unix time), or None.
+        """
+        due, _ = self._top()
+        return due
+
+    def due_count(self, now=None):
+        """
+        Number of cards due by now. The count is kept up to date by
+        _push() and delete_card(); here only the cards that came due
+        since the last call are added, O(log n) each.
+        """
+        now = time.time() if now is None else now
+        heap = self._entries()
+        if self._due_ids is None or now < self._counted_at:
+            self._due_ids = set()
+            self._upcoming = list(heap)  # already in heap order
+        upcoming = self._upcoming
+        while upcoming and upcoming[0][0] <= now:
+            entry = heapq.heappop(upcoming)
+            if self._valid(entry) is not None:
+                self._due_ids.add(entry[1])
+        self._counted_at = now
+        return len(self._due_ids)
+
+    # ---------- changes ----------
+
+    def _push(self, card):
+        heap = self._heap
+        entry = (self.card_due(card), card["id"])
+        heapq.heappush(heap, entry)
+        self._dirty = True
+        if self._due_ids is not None:
+            self._due_ids.discard(entry[1])
+            if entry[0] <= self._counted_at:
+                self._due_ids.add(entry[1])
+            else:
+                heapq.heappush(self._upcoming, entry)
+        # stale entries pile up with every review; drop them now and then
+        if len(heap) > 2 * get_stats()["cards_total"] + 64:
+            self.rebuild({"legacy_due": self._legacy_due})
+
+    def review(self, card, answer, now=None):
+        """
+        Record an answer ("again", "hard", "good" or "easy") for card.
+        """
+        self._entries()
+        self.repo.update(card, **schedule(card, GRADES[answer], now))
+        self._push(card)
+        self._changed()
+
+    def add_card(self, record):
+        self._entries()
+        card = self.repo.add(record)
+        self._push(card)
+        self._changed()
+        return card
+
+    def delete_card(self, card):
+        self._entries()
+        self.repo.delete(card)
+        # its heap entry is dropped when it reaches the top
+        self._dirty = True
+        if self._due_ids is not None:
+            self._due_ids.discard(card["id"])
+        self._changed()
+
+
+_queues = {}
+
+
+def get_review_queue():
+    """
+    The shared queue over the current flashcards repository.
+    """
+    repo = get_repository("flashcards")
+    queue = _queues.get(id(repo))
+    if queue is None or queue.repo is not repo:
+        queue = ReviewQueue(repo)
+        _queues[id(repo)] = queue
+    return queue
@@ -0,0 +1,291 @@
+"""
+Running counters for the dashboard.
+
+Instead of scanning every task, card and folder each time the dashboard
+is shown, the repositories are wrapped so each mutation adjusts a few
+counters, persisted in data/stats.json:
+
+{
+    "tasks_total": int, "tasks_done": int,
+    "cards_total": int, "cards_known": int,
+    "folders_total": int, "folders_complete": int,
+    "schedule_counts": {"yyyy-MM-dd": int, ...},
+    "versions": {"todos": int, "flashcards": int, "notes": int, "schedule": int}
+}
+
+"versions" go up on every change to a store, so views can tell whether
+they need to redraw anything.
+
+Check for drift (e.g. after editing a JSON file by hand) with:
+
+    python stats.py verify      # report only, exit code 1 on drift
+    python stats.py rebuild     # recompute from scratch
+"""
+
+import sys
+
+from data_manager import load_json, save_json
+from repositories import RepositoryWrapper
+
+STATS_NAME = "stats.json"
+
+COUNTERS = (
+    "tasks_total",
+    "tasks_done",
+    "cards_total",
+    "cards_known",
+    "folders_total",
+    "folders_complete",
+)
+VERSIONED = ("todos", "flashcards", "notes", "schedule")
+
+
+def _empty_stats():
+    stats = {key: 0 for key in COUNTERS}
+    stats["schedule_counts"] = {}
+    stats["versions"] = {store: 0 for store in VERSIONED}
+    return stats
+
+
+def compute_stats():
+    """
+    Full recount from the repositories. O(n); only used to build the
+    counters the first time and by verify/rebuild.
+    """
+    from repositories import get_repository
+
+    def raw(store):
+        # bypass the counting wrapper, which would ask us for the counters
+        repo = get_repository(store)
+        return getattr(repo, "inner", repo)
+
+    stats = _empty_stats()
+    todos = raw("todos").all()
+    stats["tasks_total"] = len(todos)
+    stats["tasks_done"] = sum(1 for t in todos if t.get("done"))
+
+    cards = raw("flashcards").all()
+    stats["cards_total"] = len(cards)
+    stats["cards_known"] = sum(1 for c in cards if c.get("known"))
+
+    done, total = raw("notes").completion()
+    stats["folders_total"] = total
+    stats["folders_complete"] = done
+
+    stats["schedule_counts"] = raw("schedule").day_counts()
+    return stats
+
+
+def get_stats():
+    """
+    Current counters, built from scratch only if stats.json is missing
+    or unreadable.
+    """
+    stats = load_json(STATS_NAME, None)
+    if not isinstance(stats, dict) or any(k not in stats for k in COUNTERS):
+        stats = compute_stats()
+        save_json(STATS_NAME, stats)
+    stats.setdefault("schedule_counts", {})
+    versions = stats.setdefault("versions", {})
+    for store in VERSIONED:
+        versions.setdefault(store, 0)
+    return stats
+
+
+def _bump(store, **deltas):
+    stats = get_stats()
+    for key, delta in deltas.items():
+        stats[key] = max(0, stats.get(key, 0) + delta)
+    stats["versions"][store] += 1
+    save_json(STATS_NAME, stats)
+
+
+def _bump_day(day, delta):
+    _bump_days({day: delta})
+
+
+def _bump_days(deltas):
+    stats = get_stats()
+    counts = stats["schedule_counts"]
+    for day, delta in deltas.items():
+        n = counts.get(day, 0) + delta
+        if n > 0:
+            counts[day] = n
+        else:
+            counts.pop(day, None)
+    stats["versions"]["schedule"] += 1
+    save_json(STATS_NAME, stats)
+
+
+def verify():
+    """
+    Compare the stored counters with a full recount.
+    Returns {key: (stored, actual)} for every counter that drifted.
+    """
+    stored = get_stats()
+    actual = compute_stats()
+    drift = {}
+    for key in COUNTERS:
+        if stored.get(key) != actual[key]:
+            drift[key] = (stored.get(key), actual[key])
+    days = set(stored["schedule_counts"]) | set(actual["schedule_counts"])
+    for day in sorted(days):
+        a = stored["schedule_counts"].get(day, 0)
+        b = actual["schedule_counts"].get(day, 0)
+        if a != b:
+            drift["schedule_counts[{0}]".format(day)] = (a, b)
+    return drift
+
+
+def rebuild():
+    stats = compute_stats()
+    old = load_json(STATS_NAME, None)
+    if isinstance(old, dict) and isinstance(old.get("versions"), dict):
+        # keep versions moving forward so open views still redraw
+        stats["versions"] = {
+            store: old["versions"].get(store, 0) + 1 for store in VERSIONED
+        }
+    save_json(STATS_NAME, stats)
+    return stats
+
+
+# ================= COUNTING WRAPPERS =================
+
+
+def _before_change():
+    # The counters must exist before a change, not after: built from
+    # the stores afterwards, they would already include it and _bump
+    # would count it twice
+    get_stats()
+
+
+class CountingListRepository(RepositoryWrapper):
+    """
+    todos / flashcards: keeps <prefix>_total and the count of records
+    whose flag (done / known) is set.
+    """
+
+    def __init__(self, inner, store, prefix, flag, flag_counter):
+        super().__init__(inner)
+        self.store = store
+        self.total_key = prefix + "_total"
+        self.flag = flag
+        self.flag_key = prefix + "_" + flag_counter
+
+    def add(self, record):
+        _before_change()
+        rec = self.inner.add(record)
+        flagged = int(bool(rec.get(self.flag)))
+        _bump(self.store, **{self.total_key: 1, self.flag_key: flagged})
+        return rec
+
+    def add_many(self, records):
+        _before_change()
+        added = self.inner.add_many(records)
+        flagged = sum(1 for rec in added if rec.get(self.flag))
+        _bump(self.store, **{self.total_key: len(added), self.flag_key: flagged})
+        return added
+
+    def update(self, record, **fields):
+        _before_change()
+        before = bool(record.get(self.flag))
+        if not self.inner.update(record, **fields):
+            return False  # not stored (any more): nothing to count
+        after = bool(record.get(self.flag))
+        _bump(self.store, **{self.flag_key: int(after) - int(before)})
+        return True
+
+    def delete(self, record):
+        _before_change()
+        self.inner.delete(record)
+        flagged = int(bool(record.get(self.flag)))
+        _bump(self.store, **{self.total_key: -1, self.flag_key: -flagged})
+
+
+class CountingNotesRepository(RepositoryWrapper):
+    def _complete(self, name):
+        _before_change()
+        for subject, complete in self.inner.subjects():
+            if subject == name:
+                return complete
+        return None
+
+    def add_subject(self, name):
+        before = self._complete(name)
+        self.inner.add_subject(name)
+        if before is None:
+            _bump("notes", folders_total=1)
+        else:
+            _bump("notes", folders_complete=-int(before))
+
+    def delete_subject(self, name):
+        before = self._complete(name)
+        self.inner.delete_subject(name)
+        if before is not None:
+            _bump("notes", folders_total=-1, folders_complete=-int(before))
+
+    def set_complete(self, name, complete):
+        before = self._complete(name)
+        self.inner.set_complete(name, complete)
+        if before is not None:
+            _bump("notes", folders_complete=int(bool(complete)) - int(before))
+
+    def completion(self):
+        stats = get_stats()
+        return stats["folders_complete"], stats["folders_total"]
+
+
+class CountingScheduleRepository(RepositoryWrapper):
+    def add_entry(self, day, text):
+        _before_change()
+        self.inner.add_entry(day, text)
+        if not day.startswith("__"):
+            _bump_day(day, 1)
+
+    def add_entries(self, pairs):
+        _before_change()
+        pairs = list(pairs)
+        self.inner.add_entries(pairs)
+        deltas = {}
+        for day, _ in pairs:
+            if not day.startswith("__"):
+                deltas[day] = deltas.get(day, 0) + 1
+        if deltas:
+            _bump_days(deltas)
+
+    def day_count(self, day):
+        return get_stats()["schedule_counts"].get(day, 0)
+
+
+def wrap_repository(store, repo):
+    if store == "todos":
+        return CountingListRepository(repo, "todos", "tasks", "done", "done")
+    if store == "flashcards":
+        return CountingListRepository(repo, "flashcards", "cards", "known", "known")
+    if store == "notes":
+        return CountingNotesRepository(repo)
+    if store == "schedule":
+        return CountingScheduleRepository(repo)
+    return repo
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] not in ("verify", "rebuild"):
+        print("usage: python stats.py verify|rebuild")
+        return 2
+    if argv[1] == "rebuild":
+        stats = rebuild()
+        for key in COUNTERS:
+            print("{0}: {1}".format(key, stats[key]))
+        return 0
+    drift = verify()
+    if not drift:
+        print("Counters match the data.")
+        return 0
+    for key, (stored, actual) in sorted(drift.items()):
+        print("{0}: stored {1}, actual {2}".format(key, stored, actual))
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
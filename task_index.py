@@ -0,0 +1,206 @@
+"""
+Bucketed index over the todos repository.
+
+Each task gets a sequence number in list order and is filed under two
+buckets: (done, None) and (done, priority). A bucket is a sorted list of
+sequence numbers, so every filter the To-Do page offers ("pending, High
+only", "done, all priorities", ...) is already sitting in one bucket and
+keeps the same order as the underlying list.
+
+Mutations go through the index, which updates the repository and the
+affected buckets and tells listeners exactly which bucket positions
+changed:
+
+    listener(key, "insert", pos, seq)
+    listener(key, "remove", pos, seq)
+    listener(key, "change", pos, seq)
+    listener(None, "reset", None, None)
+
+diff_rows() turns a filter switch into the few row removals/insertions
+between two buckets. Nothing in here needs Qt; see todo_model.py for the
+list models built on top and bench_todos.py for numbers.
+"""
+
+import bisect
+import weakref
+
+from repositories import get_repository
+
+PRIORITIES = ("High", "Medium", "Low")
+
+# A filter switch that differs in more places than this is cheaper to show
+# as a model reset (uniform item sizes) than as many small row signals.
+MAX_DIFF_OPS = 64
+
+
+def bucket_keys(task):
+    done = bool(task.get("done"))
+    return ((done, None), (done, task.get("priority", "Low")))
+
+
+def diff_rows(old, new, limit=None):
+    """
+    Operations that turn the sorted list old into the sorted list new,
+    in the order they have to be applied:
+
+        ("remove", pos, count)
+        ("insert", pos, [seq, ...])
+
+    Returns None as soon as more than limit operations would be needed,
+    so a hopeless diff costs next to nothing.
+    """
+    ops = []
+    i = j = pos = 0
+    n_old, n_new = len(old), len(new)
+    while i < n_old or j < n_new:
+        if j >= n_new or (i < n_old and old[i] < new[j]):
+            start = i
+            while i < n_old and (j >= n_new or old[i] < new[j]):
+                i += 1
+            ops.append(("remove", pos, i - start))
+        elif i >= n_old or new[j] < old[i]:
+            start = j
+            while j < n_new and (i >= n_old or new[j] < old[i]):
+                j += 1
+            ops.append(("insert", pos, new[start:j]))
+            pos += j - start
+        else:
+            i += 1
+            j += 1
+            pos += 1
+            continue
+        if limit is not None and len(ops) > limit:
+            return None
+    return ops
+
+
+class TaskIndex:
+    def __init__(self, repo):
+        self.repo = repo
+        self._listeners = []
+        self._load()
+
+    def _load(self):
+        self._by_seq = {}
+        self._seq_of = {}
+        self._buckets = {}
+        self._next_seq = 0
+        for task in self.repo.all():
+            seq = self._new_seq(task)
+            for key in bucket_keys(task):
+                # list order = seq order, so plain appends stay sorted
+                self._buckets.setdefault(key, []).append(seq)
+
+    def _new_seq(self, task):
+        seq = self._next_seq
+        self._next_seq += 1
+        self._by_seq[seq] = task
+        self._seq_of[task["id"]] = seq
+        return seq
+
+    # ---------- listeners ----------
+
+    def add_listener(self, callback):
+        """
+        Bound methods are held weakly, so a closed page's model doesn't
+        keep receiving updates.
+        """
+        if hasattr(callback, "__self__"):
+            self._listeners.append(weakref.WeakMethod(callback))
+        else:
+            self._listeners.append(lambda: callback)
+
+    def _notify(self, key, op, pos, seq):
+        alive = []
+        for ref in self._listeners:
+            callback = ref()
+            if callback is not None:
+                callback(key, op, pos, seq)
+                alive.append(ref)
+        self._listeners = alive
+
+    def _insert(self, key, seq):
+        bucket = self._buckets.setdefault(key, [])
+        pos = bisect.bisect_left(bucket, seq)
+        bucket.insert(pos, seq)
+        self._notify(key, "insert", pos, seq)
+
+    def _remove(self, key, seq):
+        bucket = self._buckets[key]
+        pos = bisect.bisect_left(bucket, seq)
+        del bucket[pos]
+        self._notify(key, "remove", pos, seq)
+
+    # ---------- queries ----------
+
+    def bucket(self, done, priority=None):
+        """
+        Sorted sequence numbers of the tasks matching the filter
+        (priority None = all). Treat as read-only.
+        """
+        return self._buckets.get((bool(done), priority), [])
+
+    def count(self, done, priority=None):
+        return len(self.bucket(done, priority))
+
+    def task(self, seq):
+        return self._by_seq[seq]
+
+    def get(self, task_id):
+        seq = self._seq_of.get(task_id)
+        return None if seq is None else self._by_seq[seq]
+
+    # ---------- edits ----------
+
+    def reload(self):
+        self._load()
+        self._notify(None, "reset", None, None)
+
+    def add(self, text, priority):
+        task = self.repo.add({"text": text, "priority": priority, "done": False})
+        seq = self._new_seq(task)
+        for key in bucket_keys(task):
+            self._insert(key, seq)
+        return task["id"]
+
+    def update(self, task_id, **fields):
+        seq = self._seq_of.get(task_id)
+        if seq is None:
+            return
+        task = self._by_seq[seq]
+        before = bucket_keys(task)
+        self.repo.update(task, **fields)
+        after = bucket_keys(task)
+        for key in before:
+            if key not in after:
+                self._remove(key, seq)
+        for key in after:
+            if key in before:
+                bucket = self._buckets[key]
+                self._notify(key, "change", bisect.bisect_left(bucket, seq), seq)
+            else:
+                self._insert(key, seq)
+
+    def delete(self, task_id):
+        seq = self._seq_of.pop(task_id, None)
+        if seq is None:
+            return
+        task = self._by_seq.pop(seq)
+        for key in bucket_keys(task):
+            self._remove(key, seq)
+        self.repo.delete(task)
+
+
+_indexes = {}
+
+
+def get_task_index():
+    """
+    The shared index over the current todos repository.
+    """
+    repo = get_repository("todos")
+    index = _indexes.get(id(repo))
+    if index is None or index.repo is not repo:
+        index = TaskIndex(repo)
+        _indexes[id(repo)] = index
+    return index
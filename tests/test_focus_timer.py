@@ -0,0 +1,98 @@
+"""
+Focus timer accuracy and wakeups, played through bench_timer's
+simulated event loop (no Qt, no real waiting):
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bench_timer  # noqa: E402
+from focus_timer import Countdown, MAX_HIDDEN_WAIT_MS  # noqa: E402
+
+MINUTES = 50
+SECONDS = MINUTES * 60
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _session(stalls=10, stall_seconds=3.0, suspend=120.0, hidden=0.5, seed=1):
+    """
+    (late, worst display error, wakeups) of one 50-minute session with
+    the deadline-based timer, set up like bench_timer.main.
+    """
+    rnd = random.Random(seed)
+    stalls = sorted((rnd.uniform(0, SECONDS), stall_seconds) for _ in range(stalls))
+    suspend_at = SECONDS * 0.4 if suspend else None
+    hidden_from = SECONDS * (1 - hidden)
+    loop = bench_timer.SimLoop(stalls, suspend_at, suspend)
+    return bench_timer.run_new(loop, SECONDS, lambda now: now >= hidden_from, rnd)
+
+
+class CountdownTest(unittest.TestCase):
+    def test_time_comes_from_the_clock(self):
+        clock = FakeClock()
+        countdown = Countdown(60, clock=clock)
+        countdown.start()
+        clock.now = 10.25
+        self.assertEqual(countdown.display_seconds(), 50)
+        countdown.pause()
+        clock.now = 100.0
+        self.assertAlmostEqual(countdown.remaining(), 49.75)
+        countdown.start()
+        clock.now = 150.0
+        self.assertTrue(countdown.finished())
+        self.assertEqual(countdown.display_seconds(), 0)
+
+    def test_wakeups_follow_the_displayed_second(self):
+        clock = FakeClock()
+        countdown = Countdown(60, clock=clock)
+        countdown.start()
+        clock.now = 0.4
+        # next change at 0.6 s from now, plus the coarse-timer slack
+        self.assertGreaterEqual(countdown.next_wakeup_ms(), 600)
+        self.assertLess(countdown.next_wakeup_ms(), 700)
+        self.assertEqual(countdown.deadline_ms(), MAX_HIDDEN_WAIT_MS)
+        clock.now = 40.4
+        self.assertEqual(countdown.deadline_ms(), 19600)
+
+
+class FiftyMinuteSessionTest(unittest.TestCase):
+    def test_ends_on_time_despite_stalls_and_suspend(self):
+        late, worst, _ = _session()
+        self.assertGreaterEqual(late, 0.0)
+        self.assertLess(late, 1.0)
+        self.assertLess(worst, 1.0)
+
+    def test_hidden_page_wakes_rarely(self):
+        _, _, wakeups = _session(hidden=0.5)
+        hidden_seconds = SECONDS * 0.5
+        cap = hidden_seconds / (MAX_HIDDEN_WAIT_MS / 1000.0) + 3
+        self.assertLessEqual(wakeups["hidden"], cap)
+
+    def test_shown_page_wakes_about_once_a_second(self):
+        _, _, wakeups = _session(hidden=0.0, stalls=0, suspend=0.0)
+        self.assertLessEqual(wakeups["shown"], SECONDS * 1.05)
+
+    def test_old_tick_timer_fell_behind(self):
+        # what the deadline fixes: the suspended time is lost
+        rnd = random.Random(1)
+        stalls = sorted((rnd.uniform(0, SECONDS), 3.0) for _ in range(10))
+        loop = bench_timer.SimLoop(stalls, SECONDS * 0.4, 120.0)
+        late, _, _ = bench_timer.run_old(loop, SECONDS, lambda now: False)
+        self.assertGreater(late, 60.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+"""
+LinkMetaFetcher against a stand-in HTTP server on localhost. No network
+access needed:
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import atexit
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A scratch data folder, set before data_manager is imported. Removed
+# at exit after data_manager's own atexit flush (handlers run LIFO).
+DATA_DIR = tempfile.mkdtemp(prefix="study-helper-test-")
+os.environ["STUDY_HELPER_DATA_DIR"] = DATA_DIR
+atexit.register(shutil.rmtree, DATA_DIR, True)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_manager  # noqa: E402
+import link_meta  # noqa: E402
+
+PAGE = (
+    b"<html><head><title> Stand-in  page </title>"
+    b'<link rel="icon" href="/icon.png"></head><body>hi</body></html>'
+)
+ICON = b"\x89PNG\r\n\x1a\n" + b"\0" * 32
+ETAG = '"v1"'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+        if self.path.startswith("/slow"):
+            time.sleep(server.delay)
+        if self.path == "/icon.png":
+            self._send(200, ICON, "image/png")
+        elif self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+        else:
+            self._send(200, PAGE, "text/html; charset=utf-8", ETAG)
+
+    def _send(self, status, body, content_type, etag=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LinkMetaFetcherTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        cls.server.hits = {}
+        cls.server.lock = threading.Lock()
+        cls.server.delay = 0.3
+        cls.base = "http://127.0.0.1:{0}".format(cls.server.server_address[1])
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.hits.clear()
+        for name in os.listdir(DATA_DIR):
+            path = os.path.join(DATA_DIR, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        data_manager.clear_cache()
+        self.fetcher = link_meta.LinkMetaFetcher(max_workers=2, timeout=5)
+
+    def tearDown(self):
+        self.fetcher.close()
+
+    def _request(self, url):
+        """
+        request() and wait for its callback; returns the new entry.
+        """
+        done = threading.Event()
+        got = {}
+
+        def callback(url, entry):
+            got["entry"] = entry
+            done.set()
+
+        self.fetcher.request(url, callback)
+        self.assertTrue(done.wait(10), "no callback")
+        return got["entry"]
+
+    def test_fetches_title_type_and_icon(self):
+        entry = self._request(self.base + "/page.html")
+        self.assertEqual(entry["title"], "Stand-in page")
+        self.assertEqual(entry["content_type"], "text/html")
+        self.assertEqual(entry["etag"], ETAG)
+        with open(link_meta.icon_path(entry), "rb") as f:
+            self.assertEqual(f.read(), ICON)
+
+    def test_fresh_entry_is_not_fetched_again(self):
+        url = self.base + "/page.html"
+        self._request(url)
+        entry = self.fetcher.request(url, lambda *args: self.fail("refetched"))
+        self.assertEqual(entry["title"], "Stand-in page")
+        self.assertEqual(self.server.hits["/page.html"], 1)
+
+    def test_stale_entry_is_revalidated_with_304(self):
+        url = self.base + "/page.html"
+        self._request(url)
+        with self.fetcher._lock:
+            self.fetcher._entries()[url]["fetched"] -= link_meta.FRESH_SECONDS + 1
+        entry = self._request(url)
+        self.assertEqual(entry["status"], 304)
+        self.assertEqual(entry["title"], "Stand-in page")  # kept from before
+        self.assertTrue(self.fetcher.is_fresh(entry))
+        self.assertEqual(self.server.hits["/page.html"], 2)
+
+    def test_failures_expire_sooner(self):
+        now = time.time()
+        failed = {"error": "HTTP 500", "fetched": now - link_meta.RETRY_SECONDS - 1}
+        ok = {"error": "", "fetched": now - link_meta.RETRY_SECONDS - 1}
+        self.assertFalse(self.fetcher.is_fresh(failed, now))
+        self.assertTrue(self.fetcher.is_fresh(ok, now))
+
+    def test_one_request_per_url_in_flight(self):
+        url = self.base + "/slow/page.html"
+        calls = []
+        done = threading.Semaphore(0)
+
+        def callback(url, entry):
+            calls.append(entry)
+            done.release()
+
+        for _ in range(5):
+            self.fetcher.request(url, callback)
+        for _ in range(5):
+            self.assertTrue(done.acquire(timeout=10))
+        self.assertEqual(self.server.hits["/slow/page.html"], 1)
+        self.assertEqual(len(calls), 5)
+        self.assertEqual(self.fetcher.in_flight(), 0)
+
+    def test_close_drops_queued_lookups(self):
+        fetcher = link_meta.LinkMetaFetcher(max_workers=1, timeout=5)
+        for i in range(10):
+            fetcher.request(self.base + "/slow/{0}".format(i))
+        started = time.time()
+        fetcher.close()
+        fetcher._pool.shutdown(wait=True)  # only the running lookup is left
+        self.assertLess(time.time() - started, 3 * self.server.delay + 1)
+        self.assertLessEqual(len([p for p in self.server.hits if "slow" in p]), 2)
+        self.assertIsNone(fetcher.request(self.base + "/page.html"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Focus-session log and the Timer page's subject picker:
+
+    python -m unittest discover tests
+
+The Timer page tests need PyQt5 (run offscreen) and are skipped without it.
+"""
+
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+import unittest
+
+# A scratch data folder, unless another test module already set one up
+# before data_manager was imported.
+if "data_manager" not in sys.modules:
+    os.environ["STUDY_HELPER_DATA_DIR"] = tempfile.mkdtemp(prefix="study-helper-test-")
+    atexit.register(shutil.rmtree, os.environ["STUDY_HELPER_DATA_DIR"], True)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_manager  # noqa: E402
+import session_log  # noqa: E402
+from repositories import get_repository  # noqa: E402
+
+try:
+    from PyQt5.QtWidgets import QApplication
+except ImportError:
+    QApplication = None
+
+DATA_DIR = data_manager.DATA_DIR
+START = 1700000000  # a fixed unix time
+
+
+def _clear_data_dir():
+    for name in os.listdir(DATA_DIR):
+        path = os.path.join(DATA_DIR, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    data_manager.clear_cache()
+
+
+class SessionLogTest(unittest.TestCase):
+    def setUp(self):
+        _clear_data_dir()
+        self.log = session_log.SessionLog()
+
+    def test_sessions_count_per_subject(self):
+        self.log.record(START, 1500, 1500, True, "Maths")
+        self.log.record(START + 3600, 600, 1500, False, "Maths")
+        self.log.record(START + 7200, 900, 900, True)
+        self.assertEqual(self.log.subject("Maths"), (2100, 2, 1))
+        self.assertEqual(self.log.subject(None), (900, 1, 1))
+        self.assertEqual(set(self.log.subjects()), {"Maths", ""})
+        self.assertEqual(self.log.total(), (3000, 3, 2))
+        self.assertEqual(self.log.day(session_log.day_key(START)), (2100, 2, 1))
+        self.assertEqual(self.log.verify(), {})
+
+    def test_rollups_are_rebuilt_from_the_log(self):
+        self.log.record(START, 1500, 1500, True, "History")
+        os.remove(os.path.join(DATA_DIR, session_log.ROLLUPS_NAME))
+        data_manager.clear_cache()
+        self.assertEqual(self.log.subject("History"), (1500, 1, 1))
+
+    def test_torn_last_line_is_cut_before_the_next_append(self):
+        self.log.record(START, 1500, 1500, True, "Maths")
+        with open(self.log.path, "ab") as f:
+            f.write(b'[1700000100, 3')
+        self.log.record(START + 3600, 600, 600, True, "Maths")
+        self.assertEqual(self.log.subject("Maths"), (2100, 2, 2))
+        self.assertEqual(self.log.skipped(), [])
+        self.assertEqual(self.log.verify(), {})
+
+
+@unittest.skipIf(QApplication is None, "PyQt5 is not installed")
+class TimerPageSubjectsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        _clear_data_dir()
+        notes = get_repository("notes")
+        notes.add_subject("Maths")
+        notes.add_subject("History")
+        from pages import TimerPage
+
+        self.page = TimerPage(None, standalone=True)
+
+    def tearDown(self):
+        self.page.timer.stop()
+        self.page.deleteLater()
+
+    def test_subject_list_has_the_notes_subjects(self):
+        combo = self.page.subject_combo
+        names = [combo.itemData(i) for i in range(combo.count())]
+        self.assertEqual(names[0], None)  # "No subject"
+        self.assertEqual(sorted(names[1:]), ["History", "Maths"])
+        self.assertEqual(combo.itemText(combo.findData("Maths")), "Maths")
+
+    def test_refresh_keeps_the_selected_subject(self):
+        combo = self.page.subject_combo
+        combo.setCurrentIndex(combo.findData("History"))
+        get_repository("notes").add_subject("Biology")
+        self.page.refresh_subjects()
+        self.assertEqual(combo.currentData(), "History")
+        self.assertNotEqual(combo.findData("Biology"), -1)
+
+    def test_session_is_logged_under_the_selected_subject(self):
+        combo = self.page.subject_combo
+        combo.setCurrentIndex(combo.findData("Maths"))
+        self.page.minutes_input.setText("1")
+        self.page.start_timer()
+        self.page.timer.stop()
+        self.page._end_session(completed=True)
+        self.assertEqual(self.page.sessions.subject("Maths")[1:], (1, 1))
+        self.assertEqual(self.page.sessions.subject(None), (0, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
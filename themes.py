@@ -1,4 +1,11 @@
 # Pastel + dark themes, with button colors included.
+#
+# Every widget is styled from this one window-level sheet: widgets that
+# need something special get an objectName (setObjectName("pageTitle"))
+# instead of their own inline setStyleSheet(), so a theme switch only
+# polishes one sheet. Sheets are cached per (theme, dark, font).
+
+from PyQt5.QtGui import QColor, QPalette
 
 BASE_WIDGETS = """
 QMainWindow {{
@@ -31,7 +38,7 @@ QLineEdit, QTextEdit, QComboBox {{
     padding: 6px 10px;
 }}
 
-QListWidget {{
+QListWidget, QListView {{
     background-color: {card_bg};
     color: {fg};
     border-radius: 10px;
@@ -56,6 +63,86 @@ QProgressBar::chunk {{
     border-radius: 100px;
     background-color: {accent};
 }}
+
+/* ---------- named widgets (replaces per-widget inline styles) ---------- */
+
+QLabel#windowTitle {{
+    font-size: 18px;
+    font-weight: 600;
+}}
+QLabel#pageTitle {{
+    font-size: 22px;
+    font-weight: 600;
+    margin-bottom: 8px;
+}}
+QLabel#dashboardTitle {{
+    font-size: 24px;
+    font-weight: 600;
+}}
+QLabel#loginTitle {{
+    font-size: 26px;
+    font-weight: 600;
+    margin-bottom: 10px;
+}}
+QLabel#cardTitle {{
+    font-size: 16px;
+    font-weight: 600;
+    margin-bottom: 6px;
+}}
+QLabel#mutedLabel {{
+    color: {muted};
+}}
+QLabel#userLabel {{
+    margin-left: 12px;
+    color: {muted};
+}}
+
+QFrame#card {{
+    border-radius: 18px;
+    padding: 18px;
+}}
+QLabel#flashcard {{
+    border-radius: 18px;
+    padding: 18px;
+    font-size: 18px;
+}}
+QLabel#timerDisplay {{
+    font-size: 72px;
+    font-weight: 600;
+    padding: 24px 32px;
+    border-radius: 22px;
+    background-color: rgba(0, 0, 0, 0.06);
+    letter-spacing: 6px;
+}}
+
+QListWidget#compactList, QListView#compactList {{
+    font-size: 13px;
+}}
+QListWidget#doneList, QListView#doneList {{
+    font-size: 13px;
+    color: {muted};
+}}
+QTextEdit#noteEditor {{
+    font-size: 16px;
+}}
+
+QPushButton#smallButton {{
+    font-size: 12px;
+    padding: 4px 10px;
+}}
+QPushButton#darkToggle {{
+    border-radius: 12px;
+    padding: 4px;
+}}
+QPushButton#navButton {{
+    border-radius: 10px;
+    padding: 8px 10px;
+}}
+QPushButton#popoutButton {{
+    border: none;
+    padding: 0;
+    background-color: transparent;
+}}
 """
 
 LIGHT_THEMES = {
@@ -200,10 +287,56 @@ THEME_NAMES = list(LIGHT_THEMES.keys())
 DEFAULT_FONT = "Avenir"
 
 
-def build_stylesheet(theme_name, dark, font=None):
+MUTED_LIGHT = "#777777"
+MUTED_DARK = "#9a9a9a"
+
+_stylesheets = {}
+
+
+def theme_colors(theme_name, dark):
     base = DARK_THEMES if dark else LIGHT_THEMES
     if theme_name not in base:
         theme_name = "Pink"
-    t = base[theme_name].copy()
-    t["font"] = font or DEFAULT_FONT
-    return BASE_WIDGETS.format(**t)
+    return base[theme_name]
+
+
+def build_stylesheet(theme_name, dark, font=None):
+    key = (theme_name, bool(dark), font or DEFAULT_FONT)
+    sheet = _stylesheets.get(key)
+    if sheet is None:
+        t = theme_colors(theme_name, dark).copy()
+        t["font"] = key[2]
+        t["muted"] = MUTED_DARK if dark else MUTED_LIGHT
+        sheet = BASE_WIDGETS.format(**t)
+        _stylesheets[key] = sheet
+    return sheet
+
+
+def precompile_stylesheets(font=None):
+    """
+    Fill the cache for every theme in light and dark mode, so later
+    switches never format a sheet.
+    """
+    for name in THEME_NAMES:
+        for dark in (False, True):
+            build_stylesheet(name, dark, font)
+
+
+def build_palette(theme_name, dark):
+    """
+    QPalette matching a theme, for custom-painted widgets (e.g. the
+    dashboard rings) and anything the sheet doesn't cover.
+    """
+    t = theme_colors(theme_name, dark)
+    pal = QPalette()
+    pal.setColor(QPalette.Window, QColor(t["bg"]))
+    pal.setColor(QPalette.WindowText, QColor(t["fg"]))
+    pal.setColor(QPalette.Base, QColor(t["card_bg"]))
+    pal.setColor(QPalette.AlternateBase, QColor(t["bg"]))
+    pal.setColor(QPalette.Text, QColor(t["fg"]))
+    pal.setColor(QPalette.Button, QColor(t["button_bg"]))
+    pal.setColor(QPalette.ButtonText, QColor(t["button_fg"]))
+    pal.setColor(QPalette.Highlight, QColor(t["accent"]))
+    pal.setColor(QPalette.HighlightedText, QColor(t["fg"]))
+    pal.setColor(QPalette.Mid, QColor(t["border"]))
+    return pal
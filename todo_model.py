@@ -0,0 +1,120 @@
+"""
+Qt models for the To-Do page.
+
+Each of the two lists (pending, done) is a TodoBucketModel showing one
+bucket of the shared task_index.TaskIndex. A change to one task arrives
+as an insert/remove/change at a known bucket position and becomes a
+single rowsInserted / rowsRemoved / dataChanged; nothing is rescanned.
+Switching the priority filter swaps to another bucket and applies only
+the rows that differ (see task_index.diff_rows).
+
+Tasks are addressed by their stable "id" (see repositories.new_record_id),
+never by their label, so two tasks with the same text can't be mixed up.
+"""
+
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+from PyQt5.QtGui import QColor
+
+from task_index import diff_rows, MAX_DIFF_OPS
+
+PRIORITY_COLORS = {
+    "High": QColor("#ff6b6b"),
+    "Medium": QColor("#ffb347"),
+    "Low": QColor("#6bd36b"),
+}
+DONE_COLOR = QColor("#888888")
+
+# Extra item roles
+RecordRole = Qt.UserRole
+PriorityRole = Qt.UserRole + 1
+DoneRole = Qt.UserRole + 2
+IdRole = Qt.UserRole + 3
+
+
+def task_label(task):
+    return u"[{0}] {1}".format(task.get("priority", "Low"), task.get("text", ""))
+
+
+class TodoBucketModel(QAbstractListModel):
+    def __init__(self, index, done, parent=None):
+        super().__init__(parent)
+        self.task_index = index
+        self.key = (bool(done), None)
+        self._rows = list(index.bucket(*self.key))
+        index.add_listener(self._on_index_change)
+
+    # ---------- Qt model API ----------
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        task = self.task_index.task(self._rows[index.row()])
+        if role == Qt.DisplayRole:
+            return task_label(task)
+        if role == Qt.ForegroundRole:
+            if task.get("done"):
+                return DONE_COLOR
+            return PRIORITY_COLORS.get(task.get("priority"), PRIORITY_COLORS["Low"])
+        if role == RecordRole:
+            return task
+        if role == PriorityRole:
+            return task.get("priority", "Low")
+        if role == DoneRole:
+            return bool(task.get("done"))
+        if role == IdRole:
+            return task["id"]
+        return None
+
+    def task_id(self, index):
+        return self.data(index, IdRole)
+
+    # ---------- filter ----------
+
+    def set_priority(self, priority):
+        key = (self.key[0], None if priority in (None, "All") else priority)
+        if key == self.key:
+            return
+        self.key = key
+        new_rows = self.task_index.bucket(*key)
+        ops = diff_rows(self._rows, new_rows, MAX_DIFF_OPS)
+        if ops is None:
+            self.beginResetModel()
+            self._rows = list(new_rows)
+            self.endResetModel()
+            return
+        for op, pos, arg in ops:
+            if op == "remove":
+                self.beginRemoveRows(QModelIndex(), pos, pos + arg - 1)
+                del self._rows[pos:pos + arg]
+                self.endRemoveRows()
+            else:
+                self.beginInsertRows(QModelIndex(), pos, pos + len(arg) - 1)
+                self._rows[pos:pos] = arg
+                self.endInsertRows()
+
+    # ---------- index updates ----------
+
+    def _on_index_change(self, key, op, pos, seq):
+        if op == "reset":
+            self.beginResetModel()
+            self._rows = list(self.task_index.bucket(*self.key))
+            self.endResetModel()
+            return
+        if key != self.key:
+            return
+        if op == "insert":
+            self.beginInsertRows(QModelIndex(), pos, pos)
+            self._rows.insert(pos, seq)
+            self.endInsertRows()
+        elif op == "remove":
+            self.beginRemoveRows(QModelIndex(), pos, pos)
+            del self._rows[pos]
+            self.endRemoveRows()
+        elif op == "change":
+            index = self.index(pos)
+            self.dataChanged.emit(index, index)